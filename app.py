@@ -1,37 +1,47 @@
-# Use eventlet for better WebSocket support
+from dotenv import load_dotenv
+import hmac
+import os
+
+# Load environment variables FIRST
+load_dotenv()
 
+# Pick the serving mode before anything opens a socket. 'threading' pins an
+# OS thread per connection; 'gevent' runs handlers as greenlets on one event
+# loop, and monkey patching makes PyMongo calls yield instead of block.
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
 
-from flask import Flask, render_template, request, jsonify
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import Flask, Response, request, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
-from dotenv import load_dotenv
-import os
 from datetime import datetime
 from bson import ObjectId
+import jwt
 import cloudinary
 import cloudinary.uploader
 
-# Load environment variables FIRST
-load_dotenv()
-
-# Initialize database connection
-from utils.db import init_db, get_db
+# Database connection is opened lazily on first use
+from utils.db import configure_db, get_db, db_breaker, defer_write, change_watcher, DatabaseUnavailable
+from pymongo.errors import ConnectionFailure
+from utils.json_provider import MongoJSONProvider
+from utils.etag import bump_version, get_etag_stats
+from utils.assets import init_assets, render_shell
+from utils.compression import init_compression, get_compression_stats, POLLING_COMPRESSION_MIN_BYTES
+from utils.metrics import init_metrics, instrument_socketio, register_collector, render_metrics
+from utils.validation import extract_mentions
+from utils.admission import init_admission
+from utils.ratelimit import identify, init_rate_limits, forget_client
+from utils.reminders import init_reminders
+from utils.workspace_stats import init_workspace_stats, touch_activity
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/syncspace')
 
-# Try to initialize database (will work even if already initialized)
-try:
-    init_db(MONGO_URI)
-    db = get_db()
-    print("✓ Database ready")
-except RuntimeError:
-    db = get_db()
-    print("✓ Database already initialized")
-except Exception as e:
-    print(f"✗ Database error: {e}")
-    db = None
-
-# Import routes after DB init
+configure_db(MONGO_URI)
+
+# Import routes
 from routes.auth_routes import auth_bp
 from routes.workspace_routes import workspace_bp
 from routes.project_routes import project_bp
@@ -40,9 +50,11 @@ from routes.document_routes import document_bp
 from routes.chat_routes import chat_bp
 from routes.file_routes import file_bp
 from routes.notification_routes import notification_bp
+from routes.admin_routes import admin_bp
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = MongoJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
@@ -53,20 +65,56 @@ cloudinary.config(
     api_secret=os.getenv('CLOUDINARY_API_SECRET', '')
 )
 
+# Fingerprinted static assets (built by `python -m utils.assets`)
+init_assets(app)
+
+# gzip/brotli for API responses, thresholded deflate for websocket frames
+init_compression(app)
+
+# Request latency histograms and in-flight gauge for /metrics
+init_metrics(app)
+
 # Initialize extensions
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Initialize Socket.IO with eventlet (FIXED)
+# Initialize Socket.IO in the configured serving mode
 socketio = SocketIO(
     app, 
     cors_allowed_origins="*",
-    async_mode='threading',
+    async_mode=ASYNC_MODE,
     logger=False,
     engineio_logger=False,
     ping_timeout=60,
-    ping_interval=25
+    ping_interval=25,
+    http_compression=True,
+    compression_threshold=POLLING_COMPRESSION_MIN_BYTES
 )
 
+# Per-event handler timing and emitted bytes; must wrap socketio.on before the handlers below
+instrument_socketio(socketio)
+
+# Registered before admission so requests refused for an open circuit never take a slot
+@app.before_request
+def fail_fast_without_database():
+    '''Answer API calls with 503 while the database circuit is open'''
+    if request.path.startswith('/api/') and not db_breaker.allow():
+        return database_unavailable(None)
+
+# Per-class API concurrency limits and socket event shedding under load
+init_admission(app, socketio)
+
+# Token buckets per socket and per user for chat, edit, cursor and typing events
+init_rate_limits(socketio)
+
+# Due-date reminders, fired by whichever worker holds the scheduler lease
+init_reminders(socketio)
+
+# Nightly reconciliation of the incrementally kept workspace summaries
+init_workspace_stats()
+
+# Change stream that invalidates the in-process user/membership caches on every worker
+change_watcher.start()
+
 # Register ALL blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(workspace_bp, url_prefix='/api/workspace')
@@ -76,41 +124,56 @@ app.register_blueprint(document_bp, url_prefix='/api/document')
 app.register_blueprint(chat_bp, url_prefix='/api/chat')
 app.register_blueprint(file_bp, url_prefix='/api/files')
 app.register_blueprint(notification_bp, url_prefix='/api/notifications')
+app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
 # Store active users
 active_users = {}
 
 # ==================== HTML ROUTES ====================
 
+# Page shells are rendered once and cached; IDs are read from the URL client-side
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_shell('index.html')
 
 @app.route('/dashboard')
 def dashboard():
-    return render_template('dashboard.html')
+    return render_shell('dashboard.html')
 
 @app.route('/workspace/<workspace_id>')
 def workspace(workspace_id):
-    return render_template('workspace.html', workspace_id=workspace_id)
+    return render_shell('workspace.html')
 
 @app.route('/document/<document_id>')
 def document_page(document_id):
-    return render_template('document_editor.html', document_id=document_id)
+    return render_shell('document_editor.html')
 
 @app.route('/login')
 def login():
-    return render_template('login.html')
+    return render_shell('login.html')
 
 @app.route('/register')
 def register():
-    return render_template('register.html')
+    return render_shell('register.html')
 
 # ==================== SOCKET.IO EVENTS ====================
 
+def socket_user(auth):
+    '''User id from the JWT a client sends when connecting (auth payload or ?token=)'''
+    token = auth.get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key'), algorithms=['HS256'])['user_id']
+    except Exception:
+        return None
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     '''Handle client connection'''
+    identify(request.sid, socket_user(auth))
     print(f'✓ Client connected: {request.sid}')
     emit('connected', {'data': 'Connected to SyncSpace', 'sid': request.sid})
 
@@ -118,6 +181,7 @@ def handle_connect():
 def handle_disconnect():
     '''Handle client disconnection'''
     print(f'✗ Client disconnected: {request.sid}')
+    forget_client(request.sid)
     
     for workspace_id, users in list(active_users.items()):
         if request.sid in users:
@@ -140,7 +204,7 @@ def handle_user_online(data):
     
     if user_id:
         try:
-            db = get_db()
+            db = get_db(write='ephemeral')
             db.users.update_one(
                 {'_id': ObjectId(user_id)},
                 {'$set': {'status': 'online', 'last_seen': datetime.now()}}
@@ -157,7 +221,7 @@ def handle_user_offline(data):
     
     if user_id:
         try:
-            db = get_db()
+            db = get_db(write='ephemeral')
             db.users.update_one(
                 {'_id': ObjectId(user_id)},
                 {'$set': {'status': 'offline', 'last_seen': datetime.now()}}
@@ -226,11 +290,12 @@ def handle_join_document(data):
     join_room(document_id)
     
     try:
-        db = get_db()
+        db = get_db(write='ephemeral')
         db.documents.update_one(
             {'_id': ObjectId(document_id)},
             {'$addToSet': {'active_users': {'user_id': user_id, 'username': username}}}
         )
+        bump_version('document', document_id)
     except Exception as e:
         print(f"Error updating document: {e}")
     
@@ -250,11 +315,12 @@ def handle_leave_document(data):
     leave_room(document_id)
     
     try:
-        db = get_db()
+        db = get_db(write='ephemeral')
         db.documents.update_one(
             {'_id': ObjectId(document_id)},
             {'$pull': {'active_users': {'user_id': user_id}}}
         )
+        bump_version('document', document_id)
     except Exception as e:
         print(f"Error updating document: {e}")
     
@@ -332,16 +398,22 @@ def handle_chat_message(data):
     message = data.get('message')
     
     timestamp = datetime.now()
+    chat_message = {
+        '_id': ObjectId(),
+        'workspace_id': workspace_id,
+        'user_id': user_id,
+        'username': username,
+        'message': message,
+        'timestamp': timestamp
+    }
     
     try:
-        db = get_db()
-        db.chat_messages.insert_one({
-            'workspace_id': workspace_id,
-            'user_id': user_id,
-            'username': username,
-            'message': message,
-            'timestamp': timestamp
-        })
+        db = get_db(write='standard')
+        db.chat_messages.insert_one(chat_message)
+        touch_activity(db, workspace_id)
+    except (DatabaseUnavailable, ConnectionFailure):
+        # Still broadcast; the message is saved once the database is back
+        defer_write('chat_messages', chat_message)
     except Exception as e:
         print(f"Error saving message: {e}")
     
@@ -352,30 +424,28 @@ def handle_chat_message(data):
         'timestamp': timestamp.isoformat()
     }, room=workspace_id)
     
-    if '@' in message:
-        words = message.split()
-        for word in words:
-            if word.startswith('@'):
-                mentioned_username = word[1:]
-                try:
-                    db = get_db()
-                    mentioned_user = db.users.find_one({'name': mentioned_username})
-                    if mentioned_user:
-                        db.notifications.insert_one({
-                            'user_id': str(mentioned_user['_id']),
-                            'message': f'{username} mentioned you in chat',
-                            'type': 'mention',
-                            'workspace_id': workspace_id,
-                            'read': False,
-                            'created_at': datetime.now()
-                        })
-                        
-                        emit('live_notification', {
-                            'message': f'{username} mentioned you in chat',
-                            'type': 'mention'
-                        }, room=f"user_{str(mentioned_user['_id'])}")
-                except Exception as e:
-                    print(f"Error handling mention: {e}")
+    if db_breaker.allow():
+        for mentioned_username in extract_mentions(message):
+            try:
+                db = get_db()
+                mentioned_user = db.users.find_one({'name': mentioned_username})
+                if mentioned_user:
+                    db.notifications.insert_one({
+                        'user_id': str(mentioned_user['_id']),
+                        'message': f'{username} mentioned you in chat',
+                        'type': 'mention',
+                        'workspace_id': workspace_id,
+                        'read': False,
+                        'created_at': datetime.now()
+                    })
+                    bump_version('notifications', str(mentioned_user['_id']))
+                    
+                    emit('live_notification', {
+                        'message': f'{username} mentioned you in chat',
+                        'type': 'mention'
+                    }, room=f"user_{str(mentioned_user['_id'])}")
+            except Exception as e:
+                print(f"Error handling mention: {e}")
 
 @socketio.on('typing_start')
 def handle_typing_start(data):
@@ -418,6 +488,7 @@ def handle_task_assigned(data):
             'read': False,
             'created_at': datetime.now()
         })
+        bump_version('notifications', assigned_to)
     except Exception as e:
         print(f"Error creating notification: {e}")
     
@@ -448,6 +519,13 @@ def handle_unsubscribe_notifications(data):
 
 # ==================== ERROR HANDLERS ====================
 
+@app.errorhandler(DatabaseUnavailable)
+def database_unavailable(error):
+    response = jsonify({'error': 'Database temporarily unavailable'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(db_breaker.retry_after())
+    return response
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
@@ -466,9 +544,47 @@ def file_too_large(error):
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'database': db_breaker.snapshot(),
+        'change_watcher': 'following' if change_watcher.active else 'inactive',
+        'etag': get_etag_stats(),
+        'compression': get_compression_stats()
     }), 200
 
+@register_collector
+def _collect_cache_stats():
+    etag = get_etag_stats()
+    compression = get_compression_stats()
+    return [
+        ('etag_requests_total', 'counter', 'Conditional GETs by resource kind and outcome', [
+            ({'kind': kind, 'outcome': outcome}, count)
+            for kind, counts in etag.items() for outcome, count in counts.items()
+        ]),
+        ('compression_bytes_in_total', 'counter', 'Bytes before compression', [
+            ({'channel': channel}, stats['bytes_in']) for channel, stats in compression.items()
+        ]),
+        ('compression_bytes_out_total', 'counter', 'Bytes after compression', [
+            ({'channel': channel}, stats['bytes_out']) for channel, stats in compression.items()
+        ]),
+        ('compression_cpu_seconds_total', 'counter', 'CPU time spent compressing', [
+            ({'channel': channel}, round(stats['cpu_seconds'], 6)) for channel, stats in compression.items()
+        ])
+    ]
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+@app.route('/metrics')
+def metrics():
+    # Scrapers authenticate with METRICS_TOKEN; without one only a local,
+    # unproxied scraper (e.g. a sidecar) is served
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES or 'X-Forwarded-For' in request.headers:
+        return jsonify({'error': 'Not found'}), 404
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # ==================== MAIN ====================
 
 if __name__ == '__main__':
@@ -482,7 +598,7 @@ if __name__ == '__main__':
     print(f"🚀 SyncSpace Server Starting...")
     print(f"{'='*60}")
     print(f"📍 Port: {port}")
-    print(f"🔌 Socket.IO: Enabled (threading mode)")  # Changed from eventlet
+    print(f"🔌 Socket.IO: Enabled ({ASYNC_MODE} mode)")
     print(f"☁️  Cloudinary: Configured")
     print(f"🗄️  MongoDB Atlas: Connected")
     print(f"🐍 Python Version: 3.13")
@@ -0,0 +1,188 @@
+'''Concurrent Socket.IO connections per worker: threading vs. gevent
+
+Starts gunicorn with gunicorn.conf.py in each serving mode, opens a batch of
+idle websocket clients plus a smaller set of active ones, and reports worker
+RSS, OS thread count and round-trip latency for the active clients.
+
+    python benchmarks/bench_connections.py --idle 500 --active 50
+    python benchmarks/bench_connections.py --modes gevent --output bench.json
+
+MONGO_URI must point at a reachable MongoDB, exactly as for the app itself.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import simple_websocket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_status(pid):
+    '''Return (rss_kb, threads) for a process from /proc'''
+    rss_kb, threads = 0, 0
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+            elif line.startswith('Threads:'):
+                threads = int(line.split()[1])
+    return rss_kb, threads
+
+
+def worker_pid(master_pid):
+    '''Find the single gunicorn worker forked by the master'''
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as children:
+        pids = children.read().split()
+    return int(pids[0]) if pids else master_pid
+
+
+def connect(url, auth=None):
+    '''Open a websocket and complete the Engine.IO and Socket.IO handshakes'''
+    ws = simple_websocket.Client(url)
+    ws.receive(timeout=10)       # Engine.IO open packet
+    ws.send('40' + (json.dumps(auth) if auth else ''))  # Socket.IO connect
+    while True:
+        packet = ws.receive(timeout=10)
+        if packet and packet.startswith('40'):
+            return ws
+
+
+def wait_for(ws, event, timeout=10):
+    '''Read packets until the named event arrives, answering pings on the way'''
+    deadline = time.time() + timeout
+    prefix = f'42["{event}"'
+    while time.time() < deadline:
+        packet = ws.receive(timeout=deadline - time.time())
+        if packet is None:
+            break
+        if packet == '2':
+            ws.send('3')
+        elif packet.startswith(prefix):
+            return True
+    return False
+
+
+def active_client(url, index, duration, interval, latencies, errors):
+    '''Join a private workspace room repeatedly and time the broadcast echo'''
+    try:
+        ws = connect(url)
+    except Exception:
+        errors.append(index)
+        return
+
+    payload = json.dumps(['join_workspace', {
+        'workspace_id': f'bench-{index}',
+        'username': f'bench-user-{index}',
+        'user_id': f'bench-{index}'
+    }])
+
+    stop_at = time.time() + duration
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        ws.send('42' + payload)
+        if wait_for(ws, 'user_joined'):
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(index)
+        time.sleep(interval)
+
+    ws.close()
+
+
+def run_mode(mode, args):
+    port = args.port
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, PORT=str(port))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    try:
+        time.sleep(args.startup_wait)
+        pid = worker_pid(server.pid)
+        url = f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket'
+        baseline_rss, baseline_threads = read_status(pid)
+
+        idle = []
+        failed_idle = 0
+        for _ in range(args.idle):
+            try:
+                idle.append(connect(url))
+            except Exception:
+                failed_idle += 1
+
+        idle_rss, idle_threads = read_status(pid)
+
+        latencies, errors = [], []
+        workers = [
+            threading.Thread(
+                target=active_client,
+                args=(url, i, args.duration, args.interval, latencies, errors)
+            )
+            for i in range(args.active)
+        ]
+        for worker in workers:
+            worker.start()
+        time.sleep(args.duration / 2)
+        active_rss, active_threads = read_status(pid)
+        for worker in workers:
+            worker.join()
+
+        for ws in idle:
+            ws.close()
+
+        latencies.sort()
+        return {
+            'mode': mode,
+            'idle_connections': len(idle),
+            'failed_idle_connections': failed_idle,
+            'active_connections': args.active,
+            'rss_kb': {'baseline': baseline_rss, 'idle': idle_rss, 'active': active_rss},
+            'threads': {'baseline': baseline_threads, 'idle': idle_threads, 'active': active_threads},
+            'rss_kb_per_idle_connection': round((idle_rss - baseline_rss) / max(len(idle), 1), 2),
+            'round_trips': len(latencies),
+            'errors': len(errors),
+            'latency_ms': {
+                'p50': round(statistics.median(latencies), 2) if latencies else None,
+                'p95': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+                'p99': round(latencies[int(len(latencies) * 0.99) - 1], 2) if latencies else None
+            },
+            'throughput_per_sec': round(len(latencies) / args.duration, 1)
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--idle', type=int, default=200)
+    parser.add_argument('--active', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--startup-wait', type=float, default=5.0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = [run_mode(mode.strip(), args) for mode in args.modes.split(',')]
+    report = json.dumps(results, indent=2)
+    print(report)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+
+
+if __name__ == '__main__':
+    main()
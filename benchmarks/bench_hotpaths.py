@@ -0,0 +1,392 @@
+'''Microbenchmarks for request hot paths, checked against a stored baseline
+
+Covers the per-blueprint verify_token copies, token_required, JSON
+serialization of kanban/file listings (buffered and streamed),
+sanitize_input, chat mention parsing and list_projects. Handlers that
+query MongoDB run against an in-memory fixture seeded to --size, so the
+numbers isolate Python-side cost and the query count per call.
+
+For each benchmark: ops/sec (best of --repeat timed rounds) and the peak
+bytes allocated during one call (tracemalloc). Raw ops/sec only means
+something on the machine that produced it, so speed is also expressed
+relative to a fixed reference workload timed around each benchmark
+(relative_speed = ops/sec ÷ reference ops/sec); that ratio, the
+allocations and the query counts are what the baseline stores. A run
+fails (exit 1) when relative speed drops, or allocations grow, by more
+than --tolerance (or BENCH_TOLERANCE) against
+benchmarks/baselines/hotpaths.json.
+
+    python benchmarks/bench_hotpaths.py                    # compare to baseline
+    python benchmarks/bench_hotpaths.py --only verify_token --size 2000
+    python benchmarks/bench_hotpaths.py --update-baseline  # after an intended change
+
+Relative speed still shifts somewhat between CPU generations and Python
+builds; loosen --tolerance on noisy CI hosts rather than editing the baseline.
+'''
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SECRET_KEY', 'bench-secret')
+os.environ.setdefault('QUERY_PROFILER', 'false')
+
+import jwt
+from bson import ObjectId
+from flask import Flask
+
+from utils.json_provider import MongoJSONProvider
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'hotpaths.json')
+
+BLUEPRINT_MODULES = ['auth', 'chat', 'document', 'file', 'kanban', 'notification', 'project', 'workspace']
+
+
+# ==================== FIXTURES ====================
+
+def _matches(doc, query):
+    for field, expected in query.items():
+        value = doc
+        for part in field.split('.'):
+            if isinstance(value, list):
+                value = [item.get(part) for item in value if isinstance(item, dict)]
+            else:
+                value = value.get(part) if isinstance(value, dict) else None
+        candidates = value if isinstance(value, list) else [value]
+        if isinstance(expected, dict) and '$in' in expected:
+            if not any(candidate in expected['$in'] for candidate in candidates):
+                return False
+        elif expected not in candidates:
+            return False
+    return True
+
+
+class FixtureCursor(list):
+    def sort(self, key, direction=1):
+        super().sort(key=lambda doc: doc.get(key) or 0, reverse=direction == -1)
+        return self
+
+    def limit(self, count):
+        return FixtureCursor(self[:count])
+
+    def batch_size(self, count):
+        return self
+
+
+class FixtureCollection:
+    '''Just enough of the pymongo Collection API for the benchmarked handlers'''
+
+    def __init__(self, db, docs):
+        self.db = db
+        self.docs = docs
+
+    def find(self, query=None, projection=None):
+        self.db.queries += 1
+        return FixtureCursor(doc for doc in self.docs if _matches(doc, query or {}))
+
+    def find_one(self, query=None, projection=None):
+        self.db.queries += 1
+        return next((doc for doc in self.docs if _matches(doc, query or {})), None)
+
+    def count_documents(self, query):
+        self.db.queries += 1
+        return sum(1 for doc in self.docs if _matches(doc, query))
+
+
+class FixtureDB:
+    def __init__(self, collections):
+        self.queries = 0
+        self._collections = {name: FixtureCollection(self, docs) for name, docs in collections.items()}
+
+    def __getattr__(self, name):
+        return self._collections.setdefault(name, FixtureCollection(self, []))
+
+
+def seed(size):
+    '''Users, workspaces, projects, tasks and files scaled by size (≈ task count)'''
+    now = datetime.now()
+    user_id = ObjectId()
+    user = {'_id': user_id, 'email': 'bench@example.com', 'name': 'bench', 'role': 'member'}
+
+    workspaces = [{
+        '_id': ObjectId(),
+        'name': f'Workspace {w}',
+        'members': [{'user_id': str(user_id), 'role': 'member'}] + [
+            {'user_id': str(ObjectId()), 'role': 'member'} for _ in range(5)
+        ],
+        'created_at': now
+    } for w in range(max(1, size // 500))]
+
+    projects = [{
+        '_id': ObjectId(),
+        'name': f'Project {p}',
+        'workspace_id': str(workspaces[p % len(workspaces)]['_id']),
+        'created_at': now - timedelta(minutes=p)
+    } for p in range(max(1, size // 50))]
+
+    statuses = ['todo', 'in_progress', 'review', 'done']
+    tasks = [{
+        '_id': ObjectId(),
+        'title': f'Task {i}',
+        'description': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+        'status': statuses[i % 4],
+        'priority': 'medium',
+        'workspace_id': projects[i % len(projects)]['workspace_id'],
+        'project_id': str(projects[i % len(projects)]['_id']),
+        'assigned_to': str(user_id) if i % 3 == 0 else None,
+        'tags': ['backend', 'urgent'],
+        'due_date': now + timedelta(days=i % 30),
+        'created_by': str(user_id),
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now
+    } for i in range(size)]
+
+    files = [{
+        '_id': ObjectId(),
+        'name': f'file-{i}.pdf',
+        'url': f'https://res.cloudinary.com/demo/raw/upload/v1/syncspace/file-{i}.pdf',
+        'public_id': f'syncspace/file-{i}',
+        'size': 1024 * i,
+        'format': 'pdf',
+        'workspace_id': str(workspaces[0]['_id']),
+        'uploaded_by': str(user_id),
+        'uploaded_at': now - timedelta(minutes=i)
+    } for i in range(size)]
+
+    return FixtureDB({
+        'users': [user],
+        'workspaces': workspaces,
+        'projects': projects,
+        'tasks': tasks,
+        'files': files
+    }), user
+
+
+# ==================== BENCHMARKS ====================
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    '''Register setup(ctx) → zero-argument callable timed by the runner'''
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _token(user):
+    return jwt.encode(
+        {'user_id': str(user['_id']), 'email': user['email'], 'exp': datetime.utcnow() + timedelta(days=1)},
+        os.environ['SECRET_KEY'], algorithm='HS256'
+    )
+
+
+def _register_verify_token(module_name):
+    @benchmark(f'verify_token[{module_name}]')
+    def setup(ctx):
+        module = __import__(f'routes.{module_name}_routes', fromlist=['verify_token'])
+        ctx.request({'Authorization': f"Bearer {_token(ctx.user)}"})
+        return module.verify_token
+
+
+for _module_name in BLUEPRINT_MODULES:
+    _register_verify_token(_module_name)
+
+
+@benchmark('token_required')
+def bench_token_required(ctx):
+    from utils import auth
+    auth.SECRET_KEY = os.environ['SECRET_KEY']
+    auth.get_db = lambda *args, **kwargs: ctx.db
+    ctx.request({'Authorization': f"Bearer {_token(ctx.user)}"})
+    return auth.token_required(lambda: None)
+
+
+@benchmark('serialize_kanban')
+def bench_serialize_kanban(ctx):
+    from routes.kanban_routes import BOARDS
+    tasks = list(ctx.db.tasks.docs)
+    return lambda: ctx.app.json.response({'boards': BOARDS, 'tasks': tasks}).get_data()
+
+
+@benchmark('serialize_files_stream')
+def bench_serialize_files_stream(ctx):
+    from utils.streaming import iter_json_array
+    files = ctx.db.files.docs
+    return lambda: b''.join(iter_json_array(FixtureCursor(files)))
+
+
+@benchmark('sanitize_input')
+def bench_sanitize_input(ctx):
+    from utils.validation import sanitize_input
+    paragraph = '<p>Some <strong>rich</strong> text with a <a href="https://example.com" onclick="x()">link</a>'
+    text = (paragraph + '<script>alert(1)</script></p>\n') * max(1, ctx.size // 100)
+    return lambda: sanitize_input(text)
+
+
+@benchmark('extract_mentions')
+def bench_extract_mentions(ctx):
+    from utils.validation import extract_mentions
+    message = ' '.join(f'@user{i} said something about the release' for i in range(20))
+    return lambda: extract_mentions(message)
+
+
+@benchmark('list_projects')
+def bench_list_projects(ctx):
+    from routes import project_routes
+    project_routes.get_db = lambda *args, **kwargs: ctx.db
+    ctx.request({'Authorization': f"Bearer {_token(ctx.user)}"})
+    return project_routes.list_projects
+
+
+# ==================== RUNNER ====================
+
+def reference_workload():
+    '''Fixed mix of dict building, JSON and sorting that the speed ratios are relative to'''
+    items = [{'id': i, 'name': f'item-{i % 97}', 'tags': ['a', 'b', str(i)]} for i in range(200)]
+    return lambda: sorted(json.loads(json.dumps(items)), key=lambda item: (item['name'], item['id']))
+
+
+def reference_speed(repeat):
+    '''Best ops/sec of the reference workload on this machine, right now'''
+    timer = timeit.Timer(reference_workload())
+    number, _ = timer.autorange()
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+
+class Context:
+    def __init__(self, size):
+        self.size = size
+        self.db, self.user = seed(size)
+        self.app = Flask(__name__)
+        self.app.json = MongoJSONProvider(self.app)
+        self._request = None
+        self.request({})
+
+    def request(self, headers):
+        if self._request is not None:
+            self._request.pop()
+        self._request = self.app.test_request_context('/', headers=headers)
+        self._request.push()
+
+    def close(self):
+        if self._request is not None:
+            self._request.pop()
+            self._request = None
+
+
+def measure(name, setup, size, repeat):
+    ctx = Context(size)
+    try:
+        func = setup(ctx)
+        func()  # warm caches and lazy imports
+
+        ctx.db.queries = 0
+        func()
+        queries = ctx.db.queries
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+    finally:
+        ctx.close()
+
+    return {
+        'ops_per_sec': round(1 / best, 1),
+        'us_per_op': round(best * 1e6, 2),
+        'alloc_peak_bytes': peak,
+        'queries_per_op': queries
+    }
+
+
+def check(results, baseline, tolerance):
+    '''Return regression messages for results worse than the baseline'''
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if 'relative_speed' in before and result['relative_speed'] < before['relative_speed'] * (1 - tolerance):
+            regressions.append(f"{name}: {before['relative_speed']} → {result['relative_speed']} × reference speed")
+        if result['alloc_peak_bytes'] > before['alloc_peak_bytes'] * (1 + tolerance) + 1024:
+            regressions.append(f"{name}: {before['alloc_peak_bytes']} → {result['alloc_peak_bytes']} peak bytes")
+        if result['queries_per_op'] > before.get('queries_per_op', result['queries_per_op']):
+            regressions.append(f"{name}: {before['queries_per_op']} → {result['queries_per_op']} queries per call")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='fixture size (tasks/files)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='run benchmarks whose name contains this text')
+    parser.add_argument('--tolerance', type=float, default=float(os.getenv('BENCH_TOLERANCE', 0.25)),
+                        help='allowed slowdown/alloc growth (0.25 = 25%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.only or args.only in name]
+    results = {}
+    for name in names:
+        # Timed right around each benchmark so clock and load changes during the run cancel out
+        reference = reference_speed(args.repeat)
+        results[name] = measure(name, BENCHMARKS[name], args.size, args.repeat)
+        reference = max(reference, reference_speed(args.repeat))
+        results[name]['relative_speed'] = round(results[name]['ops_per_sec'] / reference, 4)
+        result = results[name]
+        print(f"{name:32} {result['ops_per_sec']:>12,.1f} ops/s {result['us_per_op']:>12,.2f} µs "
+              f"{result['relative_speed']:>10.4f} × ref "
+              f"{result['alloc_peak_bytes']:>12,} B peak {result['queries_per_op']:>5} queries")
+
+    if args.update_baseline:
+        # Absolute timings are only meaningful on this machine; keep them out of the shared file
+        results = {
+            name: {key: value for key, value in result.items() if key not in ('ops_per_sec', 'us_per_op')}
+            for name, result in results.items()
+        }
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                stored = json.load(baseline_file)
+        stored.setdefault('sizes', {})[str(args.size)] = {**stored.get('sizes', {}).get(str(args.size), {}), **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(stored, baseline_file, indent=2, sort_keys=True)
+        print(f"\nBaseline for size {args.size} written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print('\nNo baseline yet; run with --update-baseline to create one')
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file).get('sizes', {}).get(str(args.size))
+    if not baseline:
+        print(f'\nNo baseline for size {args.size}; run with --update-baseline to create one')
+        return
+
+    regressions = check(results, baseline, args.tolerance)
+    if regressions:
+        print('\nRegressions:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+    print('\nNo regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
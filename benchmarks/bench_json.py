@@ -0,0 +1,103 @@
+'''Serialization cost of a 5,000-task kanban board
+
+Compares the old per-route conversion loop plus Flask's default provider
+against handing raw Mongo documents to MongoJSONProvider (orjson and stdlib
+fallback). No database needed; documents are generated in memory.
+
+    python benchmarks/bench_json.py --tasks 5000 --repeat 20
+'''
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_provider
+from utils.json_provider import MongoJSONProvider
+
+BOARDS = [
+    {'id': 'todo', 'title': 'To Do', 'color': 'bg-gray-100'},
+    {'id': 'in_progress', 'title': 'In Progress', 'color': 'bg-blue-100'},
+    {'id': 'review', 'title': 'Review', 'color': 'bg-yellow-100'},
+    {'id': 'done', 'title': 'Done', 'color': 'bg-green-100'}
+]
+
+
+def make_tasks(count):
+    now = datetime.now()
+    statuses = ['todo', 'in_progress', 'review', 'done']
+    return [{
+        '_id': ObjectId(),
+        'title': f'Task {i}',
+        'description': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+        'status': statuses[i % 4],
+        'priority': 'medium',
+        'workspace_id': '65f0c0ffee0000000000abcd',
+        'project_id': None,
+        'assigned_to': ['65f0c0ffee0000000000aaaa', '65f0c0ffee0000000000bbbb'],
+        'created_by': '65f0c0ffee0000000000aaaa',
+        'created_at': now - timedelta(minutes=i),
+        'due_date': now + timedelta(days=i % 30) if i % 3 else None
+    } for i in range(count)]
+
+
+def legacy(app, tasks):
+    '''What get_kanban did before: copy-convert every task, then jsonify'''
+    with app.app_context():
+        converted = []
+        for task in tasks:
+            task = dict(task)
+            task['_id'] = str(task['_id'])
+            if 'created_at' in task:
+                task['created_at'] = task['created_at'].isoformat()
+            if 'due_date' in task and task['due_date']:
+                task['due_date'] = task['due_date'].isoformat()
+            converted.append(task)
+        return jsonify({'boards': BOARDS, 'tasks': converted}).get_data()
+
+
+def raw(app, tasks):
+    '''Raw cursor documents straight into the provider'''
+    with app.app_context():
+        return jsonify({'boards': BOARDS, 'tasks': tasks}).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+
+    legacy_app = Flask('legacy')
+    provider_app = Flask('provider')
+    provider_app.json = MongoJSONProvider(provider_app)
+
+    cases = [('legacy loop + default provider', lambda: legacy(legacy_app, tasks))]
+    if json_provider.orjson is not None:
+        cases.append(('MongoJSONProvider (orjson)', lambda: raw(provider_app, tasks)))
+
+    def stdlib_case():
+        saved, json_provider.orjson = json_provider.orjson, None
+        try:
+            return raw(provider_app, tasks)
+        finally:
+            json_provider.orjson = saved
+    cases.append(('MongoJSONProvider (stdlib)', stdlib_case))
+
+    print(f'{args.tasks} tasks, best of {args.repeat} runs')
+    baseline = None
+    for name, func in cases:
+        size = len(func())
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat)) * 1000
+        baseline = baseline or best
+        print(f'  {name:<34} {best:8.2f} ms  {size / 1024:8.1f} KB  x{baseline / best:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''Cold-start time of `import app`
+
+Each run is a fresh interpreter so nothing is cached between imports. The
+default MONGO_URI points at a port nobody listens on: startup must not wait
+for the database, so the numbers should not change when Mongo is down.
+
+    python benchmarks/bench_startup.py --runs 10
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    'import time; started = time.perf_counter(); import app; '
+    'print("__IMPORT_SECONDS__", time.perf_counter() - started)'
+)
+
+
+def time_import(env):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    ).stdout
+    for line in output.splitlines():
+        if line.startswith('__IMPORT_SECONDS__'):
+            return float(line.split()[1])
+    raise RuntimeError(f'import app failed:\n{output}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:1/syncspace')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri)
+    timings = [time_import(env) for _ in range(args.runs)]
+
+    print(json.dumps({
+        'runs': args.runs,
+        'mongo_uri': args.mongo_uri,
+        'median_seconds': round(statistics.median(timings), 3),
+        'min_seconds': round(min(timings), 3),
+        'max_seconds': round(max(timings), 3)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,527 @@
+'''End-to-end Socket.IO load test driven by scenario files
+
+Starts the app under gunicorn (or targets a running server with --url),
+connects simulated users over websockets, has each join a workspace and a
+document, then replays a weighted mix of chat, kanban, typing, cursor and
+content events. Reported per event:
+
+    latency_ms   sender → server → sender round trip (events echoed to self)
+    fanout_ms    sender → every other member of the room
+    http_ms      request → response for mix entries served over HTTP
+    rate_limited `rate_limited` replies, i.e. events the server dropped
+    unanswered   events echoed to self whose echo never came back
+
+plus throughput, errors and worker RSS/threads sampled during the run.
+
+kanban_move calls PUT /api/kanban/task/<id>/move like the board does and,
+on success, emits kanban_update. It needs MongoDB (--mongo-uri or
+MONGO_URI): workspaces with the simulated users as members and
+tasks_per_workspace tasks are seeded before the run and removed after it.
+Tokens are signed with SECRET_KEY, which must match the server's.
+
+Results are written to benchmarks/results/<scenario>-<timestamp>.json;
+--compare prints the p95 change against an earlier result file.
+
+    python benchmarks/loadtest.py benchmarks/scenarios/workspace_mix.json
+    python benchmarks/loadtest.py benchmarks/scenarios/document_heavy.json --clients 200
+    python benchmarks/loadtest.py benchmarks/scenarios/kanban_board.json --mongo-uri mongodb://localhost/
+    python benchmarks/loadtest.py scenario.json --compare benchmarks/results/old.json
+
+Without a reachable MongoDB the database circuit opens and the run measures
+the realtime path alone (chat is still broadcast and queued for persistence);
+scenarios with kanban_move refuse to start.
+'''
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import jwt
+from bson import ObjectId
+from pymongo import MongoClient
+
+from bench_connections import ROOT, connect, read_status, worker_pid
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Event → (broadcast the server sends back, does the sender receive it too)
+EVENTS = {
+    'chat_message': ('new_message', True),
+    'kanban_update': ('kanban_changed', False),
+    'typing_start': ('user_typing', False),
+    'document_typing': ('user_typing_document', False),
+    'document_content_change': ('document_updated', False),
+    'document_cursor_position': ('cursor_position_update', False)
+}
+
+# HTTP mix entry → Socket.IO event the web client sends after a successful call
+HTTP_EVENTS = {
+    'kanban_move': 'kanban_update'
+}
+
+KANBAN_STATUSES = ('todo', 'in_progress', 'review', 'done')
+
+DEFAULT_SCENARIO = {
+    'name': 'default',
+    'clients': 20,
+    'workspaces': 4,
+    'documents_per_workspace': 1,
+    'duration': 20,
+    'ramp_up': 2,
+    'think_time_ms': [100, 400],
+    'tasks_per_workspace': 20,
+    'mix': {'chat_message': 1}
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2)
+    return {
+        'count': len(samples),
+        'p50': round(statistics.median(samples), 2),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(samples[-1], 2)
+    }
+
+
+def marker(client, seq):
+    '''Payload tag carrying the sender and send time through the broadcast'''
+    return f'lt|{client}|{seq}|{time.time()}'
+
+
+def read_marker(value):
+    if isinstance(value, dict):
+        value = value.get('marker')
+    if not isinstance(value, str) or not value.startswith('lt|'):
+        return None
+    _, client, _, sent_at = value.split('|')
+    return int(client), float(sent_at)
+
+
+def user_token(client):
+    return jwt.encode(
+        {'user_id': f'load-{client}', 'exp': datetime.utcnow() + timedelta(hours=1)},
+        os.getenv('SECRET_KEY', 'your-secret-key'),
+        algorithm='HS256'
+    )
+
+
+def seed(mongo_uri, scenario):
+    '''Create the run's workspaces and tasks; returns [(workspace_id, [task_id, ...]), ...]'''
+    db = MongoClient(mongo_uri)['syncspace']
+    now = datetime.now()
+    seeded = []
+    for workspace in range(scenario['workspaces']):
+        members = range(workspace, scenario['clients'], scenario['workspaces'])
+        workspace_id = str(db.workspaces.insert_one({
+            'name': f'load-ws-{workspace}',
+            'created_by': f'load-{workspace}',
+            'members': [{'user_id': f'load-{client}', 'role': 'member'} for client in members],
+            'created_at': now
+        }).inserted_id)
+        tasks = db.tasks.insert_many([
+            {
+                'title': f'load task {index}',
+                'description': '',
+                'status': 'todo',
+                'priority': 'medium',
+                'workspace_id': workspace_id,
+                'assigned_to': [],
+                'created_by': f'load-{workspace}',
+                'created_at': now,
+                'rank': None
+            }
+            for index in range(scenario['tasks_per_workspace'])
+        ])
+        seeded.append((workspace_id, [str(task_id) for task_id in tasks.inserted_ids]))
+    return seeded
+
+
+def unseed(mongo_uri, seeded):
+    db = MongoClient(mongo_uri)['syncspace']
+    workspace_ids = [workspace_id for workspace_id, _ in seeded]
+    db.workspaces.delete_many({'_id': {'$in': [ObjectId(workspace_id) for workspace_id in workspace_ids]}})
+    for collection in ('tasks', 'workspace_stats', 'activity_sequences'):
+        key = '_id' if collection != 'tasks' else 'workspace_id'
+        db[collection].delete_many({key: {'$in': workspace_ids}})
+
+
+def build_payload(event, client, workspace_id, document_id, tag):
+    username = f'load-user-{client}'
+    if event == 'chat_message':
+        return {'workspace_id': workspace_id, 'user_id': f'load-{client}', 'username': username, 'message': tag}
+    if event in ('kanban_update', 'typing_start'):
+        return {'workspace_id': workspace_id, 'username': username}
+    if event == 'document_typing':
+        return {'document_id': document_id, 'username': username}
+    if event == 'document_content_change':
+        return {'document_id': document_id, 'username': username, 'user_id': f'load-{client}', 'content': tag}
+    return {'document_id': document_id, 'username': username, 'user_id': f'load-{client}', 'position': {'marker': tag}}
+
+
+class SimulatedUser(threading.Thread):
+    '''One websocket client following the scenario's event mix'''
+
+    def __init__(self, index, url, base, scenario, stop_at, results, seeded=None):
+        super().__init__(daemon=True)
+        self.index = index
+        self.url = url
+        self.base = base
+        self.scenario = scenario
+        self.stop_at = stop_at
+        self.results = results
+        self.rng = random.Random(index)
+        workspace = index % scenario['workspaces']
+        self.workspace_id = f'load-ws-{workspace}'
+        self.task_ids = []
+        if seeded:
+            self.workspace_id, self.task_ids = seeded[workspace]
+        self.document_id = f'load-doc-{workspace}-{index % scenario["documents_per_workspace"]}'
+        self.token = user_token(index)
+
+    def handle(self, packet):
+        if packet == '2':
+            self.ws.send('3')
+            return
+        if not packet.startswith('42'):
+            return
+
+        received_at = time.time()
+        event, *args = json.loads(packet[2:])
+        self.results.record_received(event)
+        data = args[0] if args else {}
+        if not isinstance(data, dict):
+            return
+
+        if event == 'rate_limited':
+            self.results.record_rate_limited(data.get('event'))
+            return
+
+        tagged = read_marker(data.get('message') or data.get('content') or data.get('position'))
+        if tagged is None:
+            return
+
+        sender, sent_at = tagged
+        elapsed_ms = (received_at - sent_at) * 1000
+        if sender == self.index:
+            self.results.record('latency', event, elapsed_ms)
+        else:
+            self.results.record('fanout', event, elapsed_ms)
+
+    def drain(self, until):
+        while True:
+            remaining = until - time.time()
+            if remaining <= 0:
+                return
+            packet = self.ws.receive(timeout=remaining)
+            if packet is None:
+                return
+            self.handle(packet)
+
+    def move_task(self):
+        '''PUT a random task into a random column; True when the server accepted it'''
+        task_id = self.rng.choice(self.task_ids)
+        request = urllib.request.Request(
+            f'{self.base}/api/kanban/task/{task_id}/move',
+            data=json.dumps({'status': self.rng.choice(KANBAN_STATUSES)}).encode('utf-8'),
+            headers={'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'},
+            method='PUT'
+        )
+        started = time.time()
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            self.results.record_error('http')
+            return False
+
+        self.results.record('http', 'kanban_move', (time.time() - started) * 1000)
+        self.results.record_status('kanban_move', status)
+        return status == 200
+
+    def send(self, event, seq):
+        if event in HTTP_EVENTS:
+            self.results.record_sent(event)
+            if not self.move_task():
+                return
+            event = HTTP_EVENTS[event]
+
+        payload = build_payload(event, self.index, self.workspace_id, self.document_id, marker(self.index, seq))
+        self.ws.send('42' + json.dumps([event, payload]))
+        self.results.record_sent(event)
+
+    def run(self):
+        try:
+            self.ws = connect(self.url, {'token': self.token})
+        except Exception:
+            self.results.record_error('connect')
+            return
+
+        username = f'load-user-{self.index}'
+        self.ws.send('42' + json.dumps(['join_workspace', {
+            'workspace_id': self.workspace_id, 'username': username, 'user_id': f'load-{self.index}'
+        }]))
+        self.ws.send('42' + json.dumps(['join_document', {
+            'document_id': self.document_id, 'username': username, 'user_id': f'load-{self.index}'
+        }]))
+
+        events, weights = zip(*self.scenario['mix'].items())
+        low, high = self.scenario['think_time_ms']
+        seq = 0
+
+        try:
+            while time.time() < self.stop_at:
+                event = self.rng.choices(events, weights)[0]
+                seq += 1
+                self.send(event, seq)
+                self.drain(min(self.stop_at, time.time() + self.rng.uniform(low, high) / 1000))
+
+            # Collect broadcasts still in flight
+            self.drain(time.time() + 1.0)
+        except Exception:
+            self.results.record_error('socket')
+        finally:
+            self.ws.close()
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = {}
+        self.received = {}
+        self.samples = {'latency': {}, 'fanout': {}, 'http': {}}
+        self.statuses = {}
+        self.rate_limited = {}
+        self.errors = {}
+
+    def record_sent(self, event):
+        with self._lock:
+            self.sent[event] = self.sent.get(event, 0) + 1
+
+    def record_received(self, event):
+        with self._lock:
+            self.received[event] = self.received.get(event, 0) + 1
+
+    def record(self, kind, event, elapsed_ms):
+        with self._lock:
+            self.samples[kind].setdefault(event, []).append(elapsed_ms)
+
+    def record_status(self, event, status):
+        with self._lock:
+            counts = self.statuses.setdefault(event, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def record_rate_limited(self, event):
+        with self._lock:
+            self.rate_limited[event] = self.rate_limited.get(event, 0) + 1
+
+    def unanswered(self):
+        '''Self-echoed events sent but neither echoed back nor refused with rate_limited'''
+        with self._lock:
+            return {
+                event: self.sent.get(event, 0) - len(self.samples['latency'].get(broadcast, [])) - self.rate_limited.get(event, 0)
+                for event, (broadcast, echoed) in EVENTS.items()
+                if echoed and self.sent.get(event)
+            }
+
+    def record_error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+class MemorySampler(threading.Thread):
+    '''Poll the worker's RSS and thread count while the run lasts'''
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.is_set():
+            try:
+                self.samples.append(read_status(self.pid))
+            except FileNotFoundError:
+                return
+            self.done.wait(self.interval)
+
+    def summary(self):
+        if not self.samples:
+            return None
+        rss = [rss for rss, _ in self.samples]
+        threads = [threads for _, threads in self.samples]
+        return {
+            'rss_kb': {'start': rss[0], 'peak': max(rss), 'end': rss[-1]},
+            'threads': {'start': threads[0], 'peak': max(threads), 'end': threads[-1]}
+        }
+
+
+def start_server(args):
+    env = dict(os.environ, PORT=str(args.port), SOCKETIO_ASYNC_MODE=args.mode)
+    if args.mongo_uri:
+        env['MONGO_URI'] = args.mongo_uri
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    time.sleep(args.startup_wait)
+    return server
+
+
+def run(scenario, url, base, pid, seeded=None):
+    results = Results()
+    sampler = MemorySampler(pid) if pid else None
+    if sampler:
+        sampler.start()
+
+    started = time.time()
+    stop_at = started + scenario['ramp_up'] + scenario['duration']
+    users = []
+    for index in range(scenario['clients']):
+        user = SimulatedUser(index, url, base, scenario, stop_at, results, seeded)
+        user.start()
+        users.append(user)
+        time.sleep(scenario['ramp_up'] / max(scenario['clients'], 1))
+
+    for user in users:
+        user.join()
+    elapsed = time.time() - started
+
+    if sampler:
+        sampler.done.set()
+        sampler.join()
+
+    total_sent = sum(results.sent.values())
+    return {
+        'scenario': scenario['name'],
+        'started_at': datetime.fromtimestamp(started).isoformat(),
+        'config': scenario,
+        'elapsed_seconds': round(elapsed, 2),
+        'events_sent': results.sent,
+        'events_received': results.received,
+        'throughput_per_sec': round(total_sent / max(elapsed, 0.001), 1),
+        'latency_ms': {event: percentiles(samples) for event, samples in results.samples['latency'].items()},
+        'fanout_ms': {event: percentiles(samples) for event, samples in results.samples['fanout'].items()},
+        'http_ms': {event: percentiles(samples) for event, samples in results.samples['http'].items()},
+        'http_status': results.statuses,
+        'rate_limited': results.rate_limited,
+        'unanswered': results.unanswered(),
+        'errors': results.errors,
+        'server': sampler.summary() if sampler else None
+    }
+
+
+def compare(report, baseline_path):
+    '''Print p95 deltas against an earlier report'''
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('started_at')}):")
+    for kind in ('latency_ms', 'fanout_ms', 'http_ms'):
+        for event, stats in report[kind].items():
+            before = baseline.get(kind, {}).get(event, {}).get('p95')
+            if before and stats['p95'] is not None:
+                change = (stats['p95'] - before) / before * 100
+                print(f"  {kind[:-3]:8} {event:26} p95 {before:8.2f} → {stats['p95']:8.2f} ms ({change:+.1f}%)")
+    before = baseline.get('throughput_per_sec')
+    print(f"  throughput {before} → {report['throughput_per_sec']} events/s")
+
+
+def load_scenario(path, args):
+    scenario = dict(DEFAULT_SCENARIO)
+    if path:
+        with open(path) as scenario_file:
+            scenario.update(json.load(scenario_file))
+    for key in ('clients', 'workspaces', 'duration'):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+    unknown = set(scenario['mix']) - set(EVENTS) - set(HTTP_EVENTS)
+    if unknown:
+        raise SystemExit(f"Unknown events in mix: {', '.join(sorted(unknown))}")
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenario', nargs='?', help='scenario JSON file (defaults to a chat-only run)')
+    parser.add_argument('--clients', type=int)
+    parser.add_argument('--workspaces', type=int)
+    parser.add_argument('--duration', type=float)
+    parser.add_argument('--url', help='target a running server instead of starting one, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--pid', type=int, help='worker pid to sample when using --url')
+    parser.add_argument('--mode', default='threading', help='SOCKETIO_ASYNC_MODE for the spawned server')
+    parser.add_argument('--mongo-uri', help='MONGO_URI for the spawned server')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--startup-wait', type=float, default=5.0)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<scenario>-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier result file to diff against')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario, args)
+
+    mongo_uri = args.mongo_uri or os.getenv('MONGO_URI')
+    seeded = None
+    if set(scenario['mix']) & set(HTTP_EVENTS):
+        if not mongo_uri:
+            raise SystemExit('kanban_move needs MongoDB: pass --mongo-uri or set MONGO_URI')
+        seeded = seed(mongo_uri, scenario)
+
+    server = None
+    if args.url:
+        base, pid = args.url.rstrip('/'), args.pid
+    else:
+        server = start_server(args)
+        base, pid = f'http://127.0.0.1:{args.port}', worker_pid(server.pid)
+
+    url = base.replace('http', 'ws', 1) + '/socket.io/?EIO=4&transport=websocket'
+
+    try:
+        report = run(scenario, url, base, pid, seeded)
+        if server:
+            report['server_mode'] = args.mode
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        if seeded:
+            unseed(mongo_uri, seeded)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{scenario['name']}-{stamp}.json")
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(json.dumps({key: report[key] for key in (
+        'scenario', 'throughput_per_sec', 'latency_ms', 'fanout_ms', 'http_ms', 'http_status',
+        'rate_limited', 'unanswered', 'errors', 'server'
+    )}, indent=2))
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import os
+
+# Serving mode shared with app.py (SOCKETIO_ASYNC_MODE=threading|gevent)
+async_mode = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = 1  # Socket.IO rooms live in process memory
+
+if async_mode == 'gevent':
+    # One event loop per worker; each connection is a greenlet, not a thread
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('WORKER_CONNECTIONS', 5000))
+else:
+    worker_class = 'gthread'
+    threads = int(os.getenv('THREADS', 100))
@@ -0,0 +1,24 @@
+from flask import Blueprint, request, jsonify
+from utils.auth import admin_required
+from utils.db import get_query_report, query_profiler
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/query-report', methods=['GET'])
+@admin_required
+def query_report():
+    """Slow query shapes and index recommendations"""
+    try:
+        slow_only = request.args.get('slow') in ('1', 'true')
+        return jsonify(get_query_report(slow_only=slow_only)), 200
+        
+    except Exception as e:
+        print(f"Error building query report: {e}")
+        return jsonify({'error': 'Failed to build query report'}), 500
+
+@admin_bp.route('/query-report', methods=['DELETE'])
+@admin_required
+def reset_query_report():
+    """Clear collected query statistics"""
+    query_profiler.reset()
+    return jsonify({'message': 'Query statistics cleared'}), 200
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db
+from utils.concurrency import run_blocking
 from datetime import datetime, timedelta
 import bcrypt
 import jwt
@@ -24,7 +25,7 @@ def register():
             return jsonify({'error': 'Email already registered'}), 400
         
         # Hash password
-        hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
+        hashed_password = run_blocking(bcrypt.hashpw, data['password'].encode('utf-8'), bcrypt.gensalt())
         
         # Create user
         user = {
@@ -76,7 +77,7 @@ def login():
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user['password']):
+        if not run_blocking(bcrypt.checkpw, data['password'].encode('utf-8'), user['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Update last seen
@@ -28,7 +28,7 @@ def get_messages(workspace_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(read='secondary')
         
         # Get last 100 messages
         messages = list(db.chat_messages.find({
@@ -38,12 +38,6 @@ def get_messages(workspace_id):
         # Reverse to show oldest first
         messages.reverse()
         
-        # Convert ObjectId to string
-        for msg in messages:
-            msg['_id'] = str(msg['_id'])
-            if 'timestamp' in msg:
-                msg['timestamp'] = msg['timestamp'].isoformat()
-        
         return jsonify(messages), 200
         
     except Exception as e:
@@ -72,9 +66,7 @@ def send_message():
             'timestamp': datetime.now()
         }
         
-        result = db.chat_messages.insert_one(message)
-        message['_id'] = str(result.inserted_id)
-        message['timestamp'] = message['timestamp'].isoformat()
+        db.chat_messages.insert_one(message)
         
         return jsonify(message), 201
         
@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db
+from utils.streaming import stream_json_array, wants_stream
+from utils.etag import bump_version, check_etag, tag_response
+from utils.workspace_stats import record_documents, touch_activity
+from utils.activity import record_activity
+from utils.auth import is_workspace_member
 from bson import ObjectId
 from datetime import datetime
 import jwt
@@ -29,7 +34,7 @@ def create_document():
     
     try:
         data = request.get_json()
-        db = get_db()
+        db = get_db(write='standard')
         
         if not data.get('title') or not data.get('workspace_id'):
             return jsonify({'error': 'Title and workspace_id are required'}), 400
@@ -44,10 +49,9 @@ def create_document():
             'active_users': []
         }
         
-        result = db.documents.insert_one(document)
-        document['_id'] = str(result.inserted_id)
-        document['created_at'] = document['created_at'].isoformat()
-        document['updated_at'] = document['updated_at'].isoformat()
+        db.documents.insert_one(document)
+        record_documents(db, document['workspace_id'], 1)
+        record_activity(db, document['workspace_id'], user_id, 'document.created', 'document', document['_id'], title=document['title'])
         
         return jsonify(document), 201
         
@@ -65,18 +69,23 @@ def get_document(document_id):
     try:
         db = get_db()
         
-        document = db.documents.find_one({'_id': ObjectId(document_id)})
+        # Authorize on the workspace alone; the body is read after the version
+        found = db.documents.find_one({'_id': ObjectId(document_id)}, {'workspace_id': 1})
         
-        if not document:
+        if not found or not is_workspace_member(found.get('workspace_id'), user_id):
             return jsonify({'error': 'Document not found'}), 404
         
-        document['_id'] = str(document['_id'])
-        if 'created_at' in document:
-            document['created_at'] = document['created_at'].isoformat()
-        if 'updated_at' in document:
-            document['updated_at'] = document['updated_at'].isoformat()
+        not_modified, etag = check_etag('document', document_id)
+        if not_modified:
+            return not_modified
+        
+        document = db.documents.find_one({'_id': ObjectId(document_id)})
+        if not document:
+            return jsonify({'error': 'Document not found'}), 404
         
-        return jsonify(document), 200
+        response = jsonify(document)
+        tag_response(response, etag)
+        return response, 200
         
     except Exception as e:
         print(f"Error getting document: {e}")
@@ -91,7 +100,7 @@ def update_document(document_id):
     
     try:
         data = request.get_json()
-        db = get_db()
+        db = get_db(write='standard')
         
         update_data = {'updated_at': datetime.now()}
         
@@ -100,10 +109,18 @@ def update_document(document_id):
         if 'content' in data:
             update_data['content'] = data['content']
         
-        db.documents.update_one(
+        document = db.documents.find_one_and_update(
             {'_id': ObjectId(document_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'workspace_id': 1, 'title': 1}
         )
+        bump_version('document', document_id)
+        if document:
+            touch_activity(db, document.get('workspace_id'))
+            record_activity(
+                db, document.get('workspace_id'), user_id, 'document.updated', 'document', document_id,
+                title=update_data.get('title', document.get('title'))
+            )
         
         return jsonify({'message': 'Document updated successfully'}), 200
         
@@ -119,7 +136,7 @@ def delete_document(document_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(write='standard')
         
         document = db.documents.find_one({'_id': ObjectId(document_id)})
         
@@ -130,7 +147,11 @@ def delete_document(document_id):
         if document.get('created_by') != user_id:
             return jsonify({'error': 'Permission denied'}), 403
         
-        db.documents.delete_one({'_id': ObjectId(document_id)})
+        result = db.documents.delete_one({'_id': ObjectId(document_id)})
+        bump_version('document', document_id)
+        if result.deleted_count:
+            record_documents(db, document['workspace_id'], -1)
+            record_activity(db, document['workspace_id'], user_id, 'document.deleted', 'document', document_id, title=document.get('title'))
         
         return jsonify({'message': 'Document deleted successfully'}), 200
         
@@ -146,21 +167,16 @@ def get_workspace_documents(workspace_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(read='secondary')
         
-        documents = list(db.documents.find({
+        documents = db.documents.find({
             'workspace_id': workspace_id
-        }).sort('updated_at', -1))
+        }).sort('updated_at', -1)
         
-        # Convert ObjectId to string
-        for doc in documents:
-            doc['_id'] = str(doc['_id'])
-            if 'created_at' in doc:
-                doc['created_at'] = doc['created_at'].isoformat()
-            if 'updated_at' in doc:
-                doc['updated_at'] = doc['updated_at'].isoformat()
+        if wants_stream():
+            return stream_json_array(documents)
         
-        return jsonify(documents), 200
+        return jsonify(list(documents)), 200
         
     except Exception as e:
         print(f"Error getting documents: {e}")
@@ -1,10 +1,17 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db
+from utils.streaming import stream_json_array, wants_stream
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 import jwt
 import os
+import cloudinary.exceptions
 import cloudinary.uploader
+from utils.cloudinary_helper import describe_upload, get_upload_url, sign_upload_params, verify_upload_result, workspace_folder
+from utils.workspace_stats import record_files
+from utils.activity import record_activity
+from utils.validation import sanitize_filename
 
 file_bp = Blueprint('file', __name__)
 
@@ -45,7 +52,7 @@ def upload_file():
         # Upload to Cloudinary
         upload_result = cloudinary.uploader.upload(
             file,
-            folder=f"syncspace/{workspace_id}",
+            folder=workspace_folder(workspace_id),
             resource_type="auto"
         )
         
@@ -63,9 +70,9 @@ def upload_file():
             'uploaded_at': datetime.now()
         }
         
-        result = db.files.insert_one(file_data)
-        file_data['_id'] = str(result.inserted_id)
-        file_data['uploaded_at'] = file_data['uploaded_at'].isoformat()
+        db.files.insert_one(file_data)
+        record_files(db, workspace_id, 1, file_data['size'])
+        record_activity(db, workspace_id, user_id, 'file.uploaded', 'file', file_data['_id'], name=file_data['name'], size=file_data['size'])
         
         return jsonify(file_data), 201
         
@@ -73,6 +80,87 @@ def upload_file():
         print(f"Error uploading file: {e}")
         return jsonify({'error': 'Failed to upload file', 'details': str(e)}), 500
 
+@file_bp.route('/upload-intent', methods=['POST'])
+def upload_intent():
+    """Return signed parameters for uploading straight to storage"""
+    user_id = verify_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        data = request.get_json() or {}
+        workspace_id = data.get('workspace_id')
+
+        if not workspace_id:
+            return jsonify({'error': 'workspace_id is required'}), 400
+
+        params = sign_upload_params(workspace_folder(workspace_id))
+
+        return jsonify({
+            'upload_url': get_upload_url(),
+            'params': params
+        }), 200
+
+    except Exception as e:
+        print(f"Error creating upload intent: {e}")
+        return jsonify({'error': 'Failed to create upload intent'}), 500
+
+@file_bp.route('/commit', methods=['POST'])
+def commit_upload():
+    """Verify a direct upload and save its metadata"""
+    user_id = verify_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        data = request.get_json() or {}
+        workspace_id = data.get('workspace_id')
+        result = data.get('result') or {}
+
+        if not workspace_id:
+            return jsonify({'error': 'workspace_id is required'}), 400
+
+        valid, message = verify_upload_result(result, workspace_folder(workspace_id))
+        if not valid:
+            return jsonify({'error': message}), 400
+
+        # Everything but the signed public_id and version comes from storage
+        try:
+            stored = describe_upload(result['public_id'], result['version'], result.get('resource_type') or 'image')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except cloudinary.exceptions.NotFound:
+            return jsonify({'error': 'Upload not found in storage'}), 400
+
+        db = get_db()
+
+        file_data = {
+            'name': sanitize_filename(data.get('name') or result.get('original_filename') or result['public_id'].rsplit('/', 1)[-1]),
+            'url': stored['url'],
+            'public_id': result['public_id'],
+            'size': stored['size'],
+            'format': stored['format'],
+            'resource_type': stored['resource_type'],
+            'workspace_id': workspace_id,
+            'uploaded_by': user_id,
+            'uploaded_at': datetime.now()
+        }
+
+        # files.public_id is unique, so a replayed commit cannot insert twice
+        try:
+            db.files.insert_one(file_data)
+        except DuplicateKeyError:
+            return jsonify({'error': 'Upload already committed'}), 409
+
+        record_files(db, workspace_id, 1, file_data['size'])
+        record_activity(db, workspace_id, user_id, 'file.uploaded', 'file', file_data['_id'], name=file_data['name'], size=file_data['size'])
+
+        return jsonify(file_data), 201
+
+    except Exception as e:
+        print(f"Error committing upload: {e}")
+        return jsonify({'error': 'Failed to commit upload'}), 500
+
 @file_bp.route('/<workspace_id>', methods=['GET'])
 def get_files(workspace_id):
     """Get all files in a workspace"""
@@ -81,19 +169,16 @@ def get_files(workspace_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(read='secondary')
         
-        files = list(db.files.find({
+        files = db.files.find({
             'workspace_id': workspace_id
-        }).sort('uploaded_at', -1))
+        }).sort('uploaded_at', -1)
         
-        # Convert ObjectId to string
-        for file in files:
-            file['_id'] = str(file['_id'])
-            if 'uploaded_at' in file:
-                file['uploaded_at'] = file['uploaded_at'].isoformat()
+        if wants_stream():
+            return stream_json_array(files)
         
-        return jsonify(files), 200
+        return jsonify(list(files)), 200
         
     except Exception as e:
         print(f"Error getting files: {e}")
@@ -119,7 +204,10 @@ def delete_file(file_id):
         cloudinary.uploader.destroy(file['public_id'])
         
         # Delete from database
-        db.files.delete_one({'_id': ObjectId(file_id)})
+        result = db.files.delete_one({'_id': ObjectId(file_id)})
+        if result.deleted_count:
+            record_files(db, file['workspace_id'], -1, -file.get('size', 0))
+            record_activity(db, file['workspace_id'], user_id, 'file.deleted', 'file', file_id, name=file.get('name'))
         
         return jsonify({'message': 'File deleted successfully'}), 200
         
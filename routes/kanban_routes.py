@@ -1,5 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from utils.db import get_db
+from utils.streaming import stream_json_array, wants_stream
+from utils.etag import bump_version, check_etag, tag_response
+from utils.ranking import COLUMN_SORT, REBALANCE_LENGTH, place_card, rank_between, rebalance_column, schedule_rebalance
+from utils.task_query import DEFAULT_PAGE_SIZE, find_tasks
+from utils.reminders import task_changed
+from utils.workspace_stats import record_task_changes
+from utils.activity import record_activities, record_activity
+from utils.auth import is_workspace_member, member_workspace_ids
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 from datetime import datetime
 import jwt
@@ -7,6 +17,40 @@ import os
 
 kanban_bp = Blueprint('kanban', __name__)
 
+MAX_BULK_OPERATIONS = 200
+BULK_OPERATIONS = ('create', 'update', 'move', 'delete')
+# Activity action for each bulk op, matching the single-task routes
+BULK_ACTIVITY = {'create': 'created', 'update': 'updated', 'move': 'moved', 'delete': 'deleted'}
+
+# Board columns
+BOARDS = [
+    {'id': 'todo', 'title': 'To Do', 'color': 'bg-gray-100'},
+    {'id': 'in_progress', 'title': 'In Progress', 'color': 'bg-blue-100'},
+    {'id': 'review', 'title': 'Review', 'color': 'bg-yellow-100'},
+    {'id': 'done', 'title': 'Done', 'color': 'bg-green-100'}
+]
+
+def has_unranked(db, workspace_id, status):
+    """Whether a column still holds cards from before ranks existed"""
+    return db.tasks.find_one({'workspace_id': workspace_id, 'status': status, 'rank': None}, {'_id': 1}) is not None
+
+def ensure_ranked(db, workspace_id, status):
+    """Rank a column's unranked cards in the background; False until every card has a rank"""
+    if has_unranked(db, workspace_id, status):
+        schedule_rebalance(workspace_id, status, lambda: bump_version('kanban', workspace_id))
+        return False
+    return True
+
+def task_update_fields(data):
+    """Fields of a task update request that map onto the task document"""
+    update_data = {}
+    for field in ('title', 'description', 'status', 'priority', 'assigned_to'):
+        if field in data:
+            update_data[field] = data[field]
+    if 'due_date' in data:
+        update_data['due_date'] = datetime.fromisoformat(data['due_date']) if data['due_date'] else None
+    return update_data
+
 def verify_token():
     """Verify JWT token from request headers"""
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -28,33 +72,32 @@ def get_kanban(workspace_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
+        if not is_workspace_member(workspace_id, user_id):
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        not_modified, etag = check_etag('kanban', workspace_id)
+        if not_modified:
+            return not_modified
+        
         db = get_db()
         
-        # Get all tasks for this workspace
-        tasks = list(db.tasks.find({
+        # Get all tasks for this workspace, in column order
+        tasks = db.tasks.find({
             'workspace_id': workspace_id
-        }).sort('created_at', -1))
-        
-        # Convert ObjectId to string
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-            if 'created_at' in task:
-                task['created_at'] = task['created_at'].isoformat()
-            if 'due_date' in task and task['due_date']:
-                task['due_date'] = task['due_date'].isoformat()
-        
-        # Define board columns
-        boards = [
-            {'id': 'todo', 'title': 'To Do', 'color': 'bg-gray-100'},
-            {'id': 'in_progress', 'title': 'In Progress', 'color': 'bg-blue-100'},
-            {'id': 'review', 'title': 'Review', 'color': 'bg-yellow-100'},
-            {'id': 'done', 'title': 'Done', 'color': 'bg-green-100'}
-        ]
+        }).sort(COLUMN_SORT)
         
-        return jsonify({
-            'boards': boards,
-            'tasks': tasks
-        }), 200
+        if wants_stream():
+            prefix = b'{"boards":' + current_app.json.dumps_bytes(BOARDS) + b',"tasks":'
+            response = stream_json_array(tasks, prefix=prefix, suffix=b'}')
+            tag_response(response, etag)
+            return response
+        
+        response = jsonify({
+            'boards': BOARDS,
+            'tasks': list(tasks)
+        })
+        tag_response(response, etag)
+        return response, 200
         
     except Exception as e:
         print(f"Error getting kanban: {e}")
@@ -69,15 +112,18 @@ def create_task():
     
     try:
         data = request.get_json()
-        db = get_db()
+        db = get_db(write='standard')
         
         if not data.get('title') or not data.get('workspace_id'):
             return jsonify({'error': 'Title and workspace_id are required'}), 400
         
+        status = data.get('status', 'todo')
+        ensure_ranked(db, data['workspace_id'], status)
+        
         task = {
             'title': data['title'],
             'description': data.get('description', ''),
-            'status': data.get('status', 'todo'),
+            'status': status,
             'priority': data.get('priority', 'medium'),
             'workspace_id': data['workspace_id'],
             'project_id': data.get('project_id'),
@@ -87,11 +133,32 @@ def create_task():
             'due_date': datetime.fromisoformat(data['due_date']) if data.get('due_date') else None
         }
         
-        result = db.tasks.insert_one(task)
-        task['_id'] = str(result.inserted_id)
-        task['created_at'] = task['created_at'].isoformat()
-        if task.get('due_date'):
-            task['due_date'] = task['due_date'].isoformat()
+        def place():
+            # New cards go to the top of their column; unranked cards stay above until ranked
+            first = db.tasks.find_one(
+                {'workspace_id': task['workspace_id'], 'status': status, 'rank': {'$ne': None}, '_id': {'$ne': task.get('_id')}},
+                {'rank': 1},
+                sort=[('rank', 1)]
+            )
+            task['rank'] = rank_between(None, first['rank'] if first else None)
+            if '_id' in task:
+                db.tasks.update_one({'_id': task['_id']}, {'$set': {'rank': task['rank']}})
+            else:
+                db.tasks.insert_one(task)
+            return task
+        
+        # Even when a rebalance keeps overlapping, the card exists once place() ran
+        place_card(db, task['workspace_id'], status, place)
+        if '_id' not in task:
+            place()
+        bump_version('kanban', task['workspace_id'])
+        record_task_changes(db, task['workspace_id'], [(None, task)])
+        record_activity(db, task['workspace_id'], user_id, 'task.created', 'task', task['_id'], title=task['title'], status=status)
+        if task['due_date']:
+            task_changed(task['_id'])
+        
+        if len(task['rank']) > REBALANCE_LENGTH:
+            schedule_rebalance(task['workspace_id'], status, lambda: bump_version('kanban', task['workspace_id']))
         
         return jsonify(task), 201
         
@@ -108,27 +175,26 @@ def update_task(task_id):
     
     try:
         data = request.get_json()
-        db = get_db()
+        db = get_db(write='standard')
         
-        update_data = {}
-        if 'title' in data:
-            update_data['title'] = data['title']
-        if 'description' in data:
-            update_data['description'] = data['description']
-        if 'status' in data:
-            update_data['status'] = data['status']
-        if 'priority' in data:
-            update_data['priority'] = data['priority']
-        if 'assigned_to' in data:
-            update_data['assigned_to'] = data['assigned_to']
-        if 'due_date' in data:
-            update_data['due_date'] = datetime.fromisoformat(data['due_date']) if data['due_date'] else None
+        update_data = task_update_fields(data)
         
         if update_data:
-            db.tasks.update_one(
+            task = db.tasks.find_one_and_update(
                 {'_id': ObjectId(task_id)},
-                {'$set': update_data}
+                {'$set': update_data},
+                projection={'workspace_id': 1, 'title': 1, 'status': 1, 'priority': 1, 'due_date': 1}
             )
+            if task:
+                bump_version('kanban', task.get('workspace_id'))
+                record_activity(
+                    db, task.get('workspace_id'), user_id, 'task.updated', 'task', task_id,
+                    title=update_data.get('title', task.get('title')), fields=sorted(update_data)
+                )
+                if {'status', 'priority', 'due_date'} & update_data.keys():
+                    record_task_changes(db, task.get('workspace_id'), [(task, {**task, **update_data})])
+                if {'due_date', 'status', 'assigned_to'} & update_data.keys():
+                    task_changed(task_id)
         
         return jsonify({'message': 'Task updated successfully'}), 200
         
@@ -138,29 +204,330 @@ def update_task(task_id):
 
 @kanban_bp.route('/task/<task_id>/move', methods=['PUT'])
 def move_task(task_id):
-    """Move task to different column"""
+    """Move task to a column, optionally between two neighbouring cards
+
+    before_id is the card that ends up directly above, after_id the one
+    directly below; with neither, the card goes to the bottom of the column.
+    """
     user_id = verify_token()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
         data = request.get_json()
-        db = get_db()
+        db = get_db(write='standard')
         
-        if not data.get('status'):
+        status = data.get('status')
+        if not status:
             return jsonify({'error': 'Status is required'}), 400
         
-        db.tasks.update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': {'status': data['status']}}
+        # Only the workspace is read up front; the snapshot for the counters comes from the write
+        found = db.tasks.find_one({'_id': ObjectId(task_id)}, {'workspace_id': 1})
+        if not found:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        workspace_id = found['workspace_id']
+        column = {'workspace_id': workspace_id, 'status': status, '_id': {'$ne': found['_id']}}
+        before_id, after_id = data.get('before_id'), data.get('after_id')
+        moved = {}
+        
+        def place():
+            if before_id or after_id:
+                neighbour_ids = [ObjectId(i) for i in (before_id, after_id) if i]
+                ranks = {
+                    str(doc['_id']): doc['rank']
+                    for doc in db.tasks.find({**column, '_id': {'$in': neighbour_ids, '$ne': found['_id']}}, {'rank': 1})
+                }
+                if any(i and i not in ranks for i in (before_id, after_id)):
+                    return {'error': 'Neighbouring task not found in this column'}
+                if any(i and ranks[i] is None for i in (before_id, after_id)):
+                    # Placed next to unranked cards; retried once the column is ranked
+                    ensure_ranked(db, workspace_id, status)
+                    return None
+                before, after = ranks.get(before_id), ranks.get(after_id)
+                
+                # With one neighbour, the other bound is its adjacent card in the column
+                if after_id is None:
+                    below = db.tasks.find_one({**column, 'rank': {'$gt': before}}, {'rank': 1}, sort=[('rank', 1)])
+                    after = below['rank'] if below else None
+                elif before_id is None:
+                    above = db.tasks.find_one({**column, 'rank': {'$lt': after}}, {'rank': 1}, sort=[('rank', -1)])
+                    before = above['rank'] if above else None
+            else:
+                last = db.tasks.find_one(column, {'rank': 1}, sort=[('rank', -1)])
+                before, after = (last['rank'] if last else None), None
+            
+            try:
+                rank = rank_between(before, after)
+            except ValueError:
+                return {'error': 'Neighbouring tasks are out of order; reload the board'}
+            
+            previous = db.tasks.find_one_and_update(
+                {'_id': found['_id']},
+                {'$set': {'status': status, 'rank': rank}},
+                projection={'workspace_id': 1, 'title': 1, 'status': 1, 'priority': 1, 'due_date': 1}
+            )
+            if not previous:
+                return {'error': 'Task not found', 'code': 404}
+            # A retried placement returns this move's own first write
+            moved.setdefault('task', previous)
+            moved['rank'] = rank
+            return {'rank': rank}
+        
+        placed = place_card(db, workspace_id, status, place)
+        if 'task' not in moved:
+            if placed is None:
+                return jsonify({'error': 'The column is being reordered; try again'}), 409
+            return jsonify({'error': placed['error']}), placed.get('code', 409)
+        
+        # Once the card was written the move happened, even if a rebalance kept overlapping it
+        rank = moved['rank']
+        task = moved['task']
+        
+        bump_version('kanban', workspace_id)
+        
+        record_activity(
+            db, workspace_id, user_id, 'task.moved', 'task', task_id,
+            title=task.get('title'), status=status, previous_status=task.get('status')
         )
+        if status != task.get('status'):
+            record_task_changes(db, workspace_id, [(task, {**task, 'status': status})])
+        
+        # Completing a task (or reopening it) cancels or restores its reminders
+        if task.get('due_date') and 'done' in (status, task.get('status')) and status != task.get('status'):
+            task_changed(task_id)
         
-        return jsonify({'message': 'Task moved successfully'}), 200
+        if len(rank) > REBALANCE_LENGTH:
+            schedule_rebalance(workspace_id, status, lambda: bump_version('kanban', workspace_id))
+        
+        return jsonify({'message': 'Task moved successfully', 'status': status, 'rank': rank}), 200
         
     except Exception as e:
         print(f"Error moving task: {e}")
         return jsonify({'error': 'Failed to move task'}), 500
 
+def plan_bulk_operations(db, workspace_id, user_id, operations):
+    """Validate bulk operations against the board and turn them into write requests
+
+    Operations are applied in order to an in-memory copy of the affected
+    columns. The writes themselves run unordered, so each card may be
+    changed at most once per batch, and a card changed earlier in the batch
+    cannot serve as a later move's neighbour. Returns (requests, results, changes, errors);
+    requests, results and the (before, after) task snapshots in changes line
+    up, and nothing should be written if errors is not empty.
+    """
+    task_ids = set()
+    statuses = set()
+    errors = []
+    
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BULK_OPERATIONS:
+            errors.append({'index': index, 'error': f'op must be one of {", ".join(BULK_OPERATIONS)}'})
+            continue
+        
+        op = operation['op']
+        if op == 'create':
+            if not operation.get('title'):
+                errors.append({'index': index, 'error': 'Title is required'})
+            statuses.add(operation.get('status', 'todo'))
+            continue
+        
+        if not ObjectId.is_valid(operation.get('id')):
+            errors.append({'index': index, 'error': 'A valid task id is required'})
+            continue
+        task_ids.add(ObjectId(operation['id']))
+        
+        if op == 'move':
+            if not operation.get('status'):
+                errors.append({'index': index, 'error': 'Status is required'})
+            statuses.add(operation.get('status'))
+        elif op == 'update' and 'status' in operation:
+            statuses.add(operation['status'])
+    
+    if errors:
+        return [], [], [], errors
+    
+    # Bulk requests run on the bulk pool and can afford to rank legacy columns inline
+    for status in statuses:
+        if has_unranked(db, workspace_id, status):
+            rebalance_column(workspace_id, status)
+    
+    # Every referenced card, plus every card of the columns being changed
+    cards = {
+        str(doc['_id']): doc
+        for doc in db.tasks.find(
+            {'workspace_id': workspace_id, '$or': [{'_id': {'$in': list(task_ids)}}, {'status': {'$in': list(statuses)}}]},
+            {'status': 1, 'rank': 1, 'priority': 1, 'due_date': 1}
+        )
+    }
+    
+    def column_ranks(status, exclude=None):
+        return [
+            card['rank'] for task_id, card in cards.items()
+            if card['status'] == status and task_id != exclude and card.get('rank') is not None
+        ]
+    
+    requests, results, changes = [], [], []
+    changed = set()
+    for index, operation in enumerate(operations):
+        op = operation['op']
+        task_id = operation.get('id')
+        
+        # Unordered writes to one card could land in any order
+        referenced = {task_id, operation.get('before_id'), operation.get('after_id')} if op == 'move' else {task_id}
+        if changed & referenced:
+            errors.append({'index': index, 'error': 'Task is changed earlier in this batch; send it in a separate request'})
+            continue
+        if task_id:
+            changed.add(task_id)
+        
+        try:
+            if op == 'create':
+                status = operation.get('status', 'todo')
+                ranks = column_ranks(status)
+                task = {
+                    '_id': ObjectId(),
+                    'title': operation['title'],
+                    'description': operation.get('description', ''),
+                    'status': status,
+                    'rank': rank_between(None, min(ranks) if ranks else None),
+                    'priority': operation.get('priority', 'medium'),
+                    'workspace_id': workspace_id,
+                    'project_id': operation.get('project_id'),
+                    'assigned_to': operation.get('assigned_to', []),
+                    'created_by': user_id,
+                    'created_at': datetime.now(),
+                    'due_date': datetime.fromisoformat(operation['due_date']) if operation.get('due_date') else None
+                }
+                task_id = str(task['_id'])
+                cards[task_id] = {key: task[key] for key in ('status', 'rank', 'priority', 'due_date')}
+                requests.append(InsertOne(task))
+                changes.append((None, task))
+                results.append({'index': index, 'op': op, 'id': task_id, 'status': status, 'rank': task['rank']})
+                continue
+            
+            if task_id not in cards:
+                errors.append({'index': index, 'error': 'Task not found in this workspace'})
+                continue
+            
+            if op == 'delete':
+                changes.append((cards.pop(task_id), None))
+                requests.append(DeleteOne({'_id': ObjectId(task_id), 'workspace_id': workspace_id}))
+                results.append({'index': index, 'op': op, 'id': task_id})
+            
+            elif op == 'update':
+                update_data = task_update_fields(operation)
+                if not update_data:
+                    errors.append({'index': index, 'error': 'Nothing to update'})
+                    continue
+                previous = dict(cards[task_id])
+                cards[task_id].update({key: update_data[key] for key in ('status', 'priority', 'due_date') if key in update_data})
+                changes.append((previous, dict(cards[task_id])))
+                requests.append(UpdateOne({'_id': ObjectId(task_id), 'workspace_id': workspace_id}, {'$set': update_data}))
+                results.append({'index': index, 'op': op, 'id': task_id})
+            
+            else:
+                status = operation['status']
+                before_id, after_id = operation.get('before_id'), operation.get('after_id')
+                if before_id or after_id:
+                    neighbours = [cards.get(i) for i in (before_id, after_id) if i and i != task_id]
+                    if len(neighbours) != len([i for i in (before_id, after_id) if i]) or any(
+                        n is None or n['status'] != status or n.get('rank') is None for n in neighbours
+                    ):
+                        errors.append({'index': index, 'error': 'Neighbouring task not found in this column'})
+                        continue
+                    # With one neighbour, the other is its adjacent card in the column
+                    ranks = column_ranks(status, exclude=task_id)
+                    before = cards[before_id]['rank'] if before_id else max((r for r in ranks if r < cards[after_id]['rank']), default=None)
+                    after = cards[after_id]['rank'] if after_id else min((r for r in ranks if r > before), default=None)
+                else:
+                    ranks = column_ranks(status, exclude=task_id)
+                    before, after = (max(ranks) if ranks else None), None
+                
+                rank = rank_between(before, after)
+                previous = cards[task_id]
+                cards[task_id] = {**previous, 'status': status, 'rank': rank}
+                changes.append((previous, cards[task_id]))
+                requests.append(UpdateOne(
+                    {'_id': ObjectId(task_id), 'workspace_id': workspace_id},
+                    {'$set': {'status': status, 'rank': rank}}
+                ))
+                results.append({'index': index, 'op': op, 'id': task_id, 'status': status, 'rank': rank})
+        
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    
+    return requests, results, changes, errors
+
+@kanban_bp.route('/tasks/bulk', methods=['POST'])
+def bulk_tasks():
+    """Apply many create/update/move/delete operations in one round trip
+
+    The whole batch is validated first and rejected with per-item errors if
+    any operation is invalid; otherwise it runs as a single unordered
+    bulk_write and the workspace room gets one kanban_changed event.
+    """
+    user_id = verify_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        data = request.get_json() or {}
+        workspace_id = data.get('workspace_id')
+        operations = data.get('operations')
+        
+        if not workspace_id or not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'workspace_id and a list of operations are required'}), 400
+        if len(operations) > MAX_BULK_OPERATIONS:
+            return jsonify({'error': f'At most {MAX_BULK_OPERATIONS} operations per request'}), 400
+        
+        db = get_db(pool='bulk', write='standard')
+        
+        if not is_workspace_member(workspace_id, user_id):
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        requests, results, changes, errors = plan_bulk_operations(db, workspace_id, user_id, operations)
+        if errors:
+            return jsonify({'error': 'Invalid operations', 'errors': errors}), 400
+        
+        for result in results:
+            result['ok'] = True
+        try:
+            db.tasks.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                results[write_error['index']].update({'ok': False, 'error': write_error.get('errmsg')})
+        
+        failed = sum(1 for result in results if not result['ok'])
+        bump_version('kanban', workspace_id)
+        task_changed(*{result['id'] for result in results if result['ok']})
+        record_task_changes(db, workspace_id, [change for change, result in zip(changes, results) if result['ok']])
+        seq = record_activities(db, workspace_id, user_id, [
+            (f"task.{BULK_ACTIVITY[result['op']]}", 'task', result['id'], {'status': result['status']} if 'status' in result else None)
+            for result in results if result['ok']
+        ])
+        
+        for status in {result['status'] for result in results if result['ok'] and len(result.get('rank', '')) > REBALANCE_LENGTH}:
+            schedule_rebalance(workspace_id, status, lambda: bump_version('kanban', workspace_id))
+        
+        current_app.extensions['socketio'].emit('kanban_changed', {
+            'workspace_id': workspace_id,
+            'bulk': True,
+            'count': len(results) - failed,
+            'seq': seq,
+            'timestamp': datetime.now().isoformat()
+        }, room=workspace_id, skip_sid=data.get('socket_id'))
+        
+        return jsonify({
+            'results': results,
+            'succeeded': len(results) - failed,
+            'failed': failed
+        }), 200
+        
+    except Exception as e:
+        print(f"Error applying bulk task operations: {e}")
+        return jsonify({'error': 'Failed to apply bulk task operations'}), 500
+
 @kanban_bp.route('/task/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Delete a task"""
@@ -169,9 +536,18 @@ def delete_task(task_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(write='standard')
         
-        db.tasks.delete_one({'_id': ObjectId(task_id)})
+        task = db.tasks.find_one_and_delete(
+            {'_id': ObjectId(task_id)},
+            projection={'workspace_id': 1, 'title': 1, 'status': 1, 'priority': 1, 'due_date': 1}
+        )
+        if task:
+            bump_version('kanban', task.get('workspace_id'))
+            record_activity(db, task.get('workspace_id'), user_id, 'task.deleted', 'task', task_id, title=task.get('title'))
+            record_task_changes(db, task.get('workspace_id'), [(task, None)])
+            if task.get('due_date'):
+                task_changed(task_id)
         
         return jsonify({'message': 'Task deleted successfully'}), 200
         
@@ -179,36 +555,83 @@ def delete_task(task_id):
         print(f"Error deleting task: {e}")
         return jsonify({'error': 'Failed to delete task'}), 500
 
+def parse_task_filters(args, user_id):
+    """Task query filters from query-string arguments; 'me' stands for the caller"""
+    assignee = args.get('assignee')
+    return {
+        'assigned_to': user_id if assignee == 'me' else assignee,
+        'workspace_id': args.get('workspace_id'),
+        'status': args.get('status'),
+        'priority': args.get('priority'),
+        'due_from': datetime.fromisoformat(args['due_from']) if args.get('due_from') else None,
+        'due_to': datetime.fromisoformat(args['due_to']) if args.get('due_to') else None
+    }
+
+def run_task_query(db, user_id, filters):
+    """Run a task query limited to the caller's workspaces"""
+    if filters['workspace_id']:
+        if not is_workspace_member(filters['workspace_id'], user_id):
+            return None
+        member_workspaces = None
+    else:
+        member_workspaces = member_workspace_ids(user_id)
+    
+    return find_tasks(
+        db, filters,
+        sort=request.args.get('sort'),
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        member_workspaces=member_workspaces
+    )
+
+@kanban_bp.route('/tasks', methods=['GET'])
+def query_tasks():
+    """Query tasks across the caller's workspaces
+
+    Filters: assignee (a user id or 'me'), workspace_id, status, priority,
+    due_from / due_to (ISO dates). sort is 'created' or 'due'; pages continue
+    from next_cursor. Filter combinations without an index are rejected.
+    """
+    user_id = verify_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        filters = parse_task_filters(request.args, user_id)
+        db = get_db(read='secondary')
+        
+        page = run_task_query(db, user_id, filters)
+        if page is None:
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        return jsonify(page), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error querying tasks: {e}")
+        return jsonify({'error': 'Failed to query tasks'}), 500
+
 @kanban_bp.route('/my-tasks', methods=['GET'])
 def get_my_tasks():
-    """Get all tasks assigned to current user"""
+    """Get tasks assigned to current user, newest first, one page at a time"""
     user_id = verify_token()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        filters = parse_task_filters(request.args, user_id)
+        filters['assigned_to'] = user_id
+        db = get_db(read='secondary')
+        
+        page = run_task_query(db, user_id, filters)
+        if page is None:
+            return jsonify({'error': 'Workspace not found'}), 404
         
-        # Get all tasks where user is assigned
-        tasks = list(db.tasks.find({
-            '$or': [
-                {'assigned_to': user_id},
-                {'assigned_to': {'$elemMatch': {'$eq': user_id}}}
-            ]
-        }).sort('created_at', -1).limit(50))
-        
-        # Convert ObjectId to string
-        for task in tasks:
-            task['_id'] = str(task['_id'])
-            if 'workspace_id' in task:
-                task['workspace_id'] = str(task['workspace_id'])
-            if 'created_at' in task:
-                task['created_at'] = task['created_at'].isoformat()
-            if 'due_date' in task and task.get('due_date'):
-                task['due_date'] = task['due_date'].isoformat()
-        
-        return jsonify({'tasks': tasks}), 200
+        return jsonify({'tasks': page['tasks'], 'next_cursor': page['next_cursor']}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting my tasks: {e}")
         return jsonify({'error': 'Failed to get tasks'}), 500
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db
+from utils.etag import bump_version, check_etag, tag_response
 from bson import ObjectId
 from datetime import datetime
 import jwt
@@ -28,6 +29,10 @@ def get_notifications():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
+        not_modified, etag = check_etag('notifications', user_id)
+        if not_modified:
+            return not_modified
+        
         db = get_db()
         
         # Get all notifications for user
@@ -41,16 +46,12 @@ def get_notifications():
             'read': False
         })
         
-        # Convert ObjectId to string
-        for notif in notifications:
-            notif['_id'] = str(notif['_id'])
-            if 'created_at' in notif:
-                notif['created_at'] = notif['created_at'].isoformat()
-        
-        return jsonify({
+        response = jsonify({
             'notifications': notifications,
             'unread_count': unread_count
-        }), 200
+        })
+        tag_response(response, etag)
+        return response, 200
         
     except Exception as e:
         print(f"Error getting notifications: {e}")
@@ -64,12 +65,13 @@ def mark_notifications_read():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(pool='bulk')
         
         db.notifications.update_many(
             {'user_id': user_id, 'read': False},
             {'$set': {'read': True}}
         )
+        bump_version('notifications', user_id)
         
         return jsonify({'message': 'Notifications marked as read'}), 200
         
@@ -85,9 +87,10 @@ def clear_notifications():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(pool='bulk')
         
         db.notifications.delete_many({'user_id': user_id})
+        bump_version('notifications', user_id)
         
         return jsonify({'message': 'Notifications cleared'}), 200
         
@@ -118,6 +121,7 @@ def create_notification():
             notification['workspace_id'] = data.get('workspace_id')
         
         result = db.notifications.insert_one(notification)
+        bump_version('notifications', notification['user_id'])
         
         return jsonify({
             'message': 'Notification created',
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db
+from utils.activity import record_activity
 from bson import ObjectId
 from datetime import datetime
 import jwt
@@ -28,7 +29,7 @@ def list_projects():
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        db = get_db()
+        db = get_db(read='secondary')
         
         # Get workspaces where user is a member
         workspaces = list(db.workspaces.find({
@@ -42,11 +43,8 @@ def list_projects():
             'workspace_id': {'$in': workspace_ids}
         }).sort('created_at', -1))
         
-        # Convert ObjectId to string and add task count
+        # Add task count
         for project in projects:
-            project['_id'] = str(project['_id'])
-            project['workspace_id'] = str(project['workspace_id'])
-            
             # Count tasks in this project
             tasks_count = db.tasks.count_documents({
                 'project_id': str(project['_id'])
@@ -59,9 +57,6 @@ def list_projects():
                 'status': 'done'
             })
             project['progress'] = int((completed_tasks / tasks_count * 100) if tasks_count > 0 else 0)
-            
-            if 'created_at' in project:
-                project['created_at'] = project['created_at'].isoformat()
         
         return jsonify({'projects': projects}), 200
         
@@ -93,9 +88,8 @@ def create_project():
             'status': 'active'
         }
         
-        result = db.projects.insert_one(project)
-        project['_id'] = str(result.inserted_id)
-        project['created_at'] = project['created_at'].isoformat()
+        db.projects.insert_one(project)
+        record_activity(db, project['workspace_id'], user_id, 'project.created', 'project', project['_id'], name=project['name'])
         
         return jsonify(project), 201
         
@@ -118,12 +112,6 @@ def get_project(project_id):
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
-        project['_id'] = str(project['_id'])
-        project['workspace_id'] = str(project['workspace_id'])
-        
-        if 'created_at' in project:
-            project['created_at'] = project['created_at'].isoformat()
-        
         return jsonify(project), 200
         
     except Exception as e:
@@ -150,10 +138,16 @@ def update_project(project_id):
             update_data['status'] = data['status']
         
         if update_data:
-            db.projects.update_one(
+            project = db.projects.find_one_and_update(
                 {'_id': ObjectId(project_id)},
-                {'$set': update_data}
+                {'$set': update_data},
+                projection={'workspace_id': 1, 'name': 1}
             )
+            if project:
+                record_activity(
+                    db, project.get('workspace_id'), user_id, 'project.updated', 'project', project_id,
+                    name=update_data.get('name', project.get('name')), fields=sorted(update_data)
+                )
         
         return jsonify({'message': 'Project updated successfully'}), 200
         
@@ -177,6 +171,7 @@ def delete_project(project_id):
             return jsonify({'error': 'Project not found'}), 404
         
         db.projects.delete_one({'_id': ObjectId(project_id)})
+        record_activity(db, project.get('workspace_id'), user_id, 'project.deleted', 'project', project_id, name=project.get('name'))
         
         return jsonify({'message': 'Project deleted successfully'}), 200
         
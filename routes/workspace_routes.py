@@ -2,6 +2,11 @@ from flask import Blueprint, request, jsonify
 from bson import ObjectId
 from datetime import datetime
 from utils.db import get_db
+from utils.etag import bump_version, bump_versions, check_etag, tag_response
+from utils.search import MAX_PAGE, SEARCH_SOURCES, search_workspace
+from utils.workspace_stats import get_workspace_summary
+from utils.activity import ACTIVITY_PAGE_SIZE, get_activity, record_activity
+from utils.auth import invalidate_membership, is_workspace_member
 from functools import wraps
 import jwt
 import os
@@ -36,10 +41,6 @@ def list_workspaces():
             'members.user_id': current_user_id
         }))
         
-        # Convert ObjectId to string
-        for workspace in workspaces:
-            workspace['_id'] = str(workspace['_id'])
-        
         return jsonify({'workspaces': workspaces}), 200
         
     except Exception as e:
@@ -83,8 +84,9 @@ def create_workspace():
             ]
         }
         
-        result = db.workspaces.insert_one(workspace)
-        workspace['_id'] = str(result.inserted_id)
+        db.workspaces.insert_one(workspace)
+        invalidate_membership(str(workspace['_id']))
+        record_activity(db, str(workspace['_id']), current_user_id, 'workspace.created', 'workspace', workspace['_id'], name=name)
         
         return jsonify(workspace), 201
         
@@ -102,17 +104,26 @@ def get_workspace(workspace_id):
     try:
         db = get_db()
         
-        workspace = db.workspaces.find_one({
+        query = {
             '_id': ObjectId(workspace_id),
             'members.user_id': current_user_id
-        })
+        }
         
-        if not workspace:
+        # Authorize with a projected lookup; the body is read after the version
+        if not db.workspaces.find_one(query, {'_id': 1}):
             return jsonify({'error': 'Workspace not found'}), 404
         
-        workspace['_id'] = str(workspace['_id'])
+        not_modified, etag = check_etag('workspace', workspace_id)
+        if not_modified:
+            return not_modified
+        
+        workspace = db.workspaces.find_one(query)
+        if not workspace:
+            return jsonify({'error': 'Workspace not found'}), 404
         
-        return jsonify(workspace), 200
+        response = jsonify(workspace)
+        tag_response(response, etag)
+        return response, 200
         
     except Exception as e:
         print(f"Error getting workspace: {e}")
@@ -157,6 +168,11 @@ def update_workspace(workspace_id):
             {'_id': ObjectId(workspace_id)},
             {'$set': update_data}
         )
+        bump_version('workspace', workspace_id)
+        record_activity(
+            db, workspace_id, current_user_id, 'workspace.updated', 'workspace', workspace_id,
+            fields=sorted(key for key in update_data if key != 'updated_at')
+        )
         
         return jsonify({'message': 'Workspace updated successfully'}), 200
         
@@ -182,13 +198,22 @@ def delete_workspace(workspace_id):
         if workspace['created_by'] != current_user_id:
             return jsonify({'error': 'Only workspace owner can delete'}), 403
         
-        # Delete workspace and all related data
+        # Delete workspace and all related data; the cascade runs on the bulk pool
         db.workspaces.delete_one({'_id': ObjectId(workspace_id)})
-        db.projects.delete_many({'workspace_id': workspace_id})
-        db.tasks.delete_many({'workspace_id': workspace_id})
-        db.documents.delete_many({'workspace_id': workspace_id})
-        db.messages.delete_many({'workspace_id': workspace_id})
-        db.files.delete_many({'workspace_id': workspace_id})
+        invalidate_membership(workspace_id)
+        bulk_db = get_db(pool='bulk')
+        bulk_db.projects.delete_many({'workspace_id': workspace_id})
+        bulk_db.tasks.delete_many({'workspace_id': workspace_id})
+        document_ids = [str(document['_id']) for document in bulk_db.documents.find({'workspace_id': workspace_id}, {'_id': 1})]
+        bulk_db.documents.delete_many({'workspace_id': workspace_id})
+        bulk_db.messages.delete_many({'workspace_id': workspace_id})
+        bulk_db.files.delete_many({'workspace_id': workspace_id})
+        bulk_db.workspace_stats.delete_one({'_id': workspace_id})
+        bulk_db.kanban_columns.delete_many({'workspace_id': workspace_id})
+        bump_version('workspace', workspace_id)
+        bump_version('kanban', workspace_id)
+        bump_versions('document', document_ids)
+        record_activity(db, workspace_id, current_user_id, 'workspace.deleted', 'workspace', workspace_id, name=workspace.get('name'))
         
         return jsonify({'message': 'Workspace deleted successfully'}), 200
         
@@ -196,6 +221,91 @@ def delete_workspace(workspace_id):
         print(f"Error deleting workspace: {e}")
         return jsonify({'error': 'Failed to delete workspace'}), 500
 
+# ==================== SUMMARY ====================
+
+@workspace_bp.route('/<workspace_id>/summary', methods=['GET'])
+def get_summary(workspace_id):
+    """Task, document and file counts for a workspace from its stats document"""
+    current_user_id = verify_token()
+    if not current_user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        db = get_db()
+        
+        if not is_workspace_member(workspace_id, current_user_id):
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        return jsonify(get_workspace_summary(db, workspace_id)), 200
+        
+    except Exception as e:
+        print(f"Error getting workspace summary: {e}")
+        return jsonify({'error': 'Failed to get workspace summary'}), 500
+
+# ==================== ACTIVITY ====================
+
+@workspace_bp.route('/<workspace_id>/activity', methods=['GET'])
+def get_workspace_activity(workspace_id):
+    """Activity events after a sequence number, oldest first"""
+    current_user_id = verify_token()
+    if not current_user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        after = int(request.args.get('after', 0))
+        limit = int(request.args.get('limit', ACTIVITY_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+    
+    try:
+        db = get_db()
+        
+        if not is_workspace_member(workspace_id, current_user_id):
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        return jsonify(get_activity(db, workspace_id, after, limit)), 200
+        
+    except Exception as e:
+        print(f"Error getting workspace activity: {e}")
+        return jsonify({'error': 'Failed to get workspace activity'}), 500
+
+# ==================== SEARCH ====================
+
+@workspace_bp.route('/<workspace_id>/search', methods=['GET'])
+def search(workspace_id):
+    """Search documents, tasks, chat and files in a workspace"""
+    current_user_id = verify_token()
+    if not current_user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    
+    kinds = [kind for kind in request.args.get('types', '').split(',') if kind]
+    if any(kind not in SEARCH_SOURCES for kind in kinds):
+        return jsonify({'error': f"types must be among: {', '.join(SEARCH_SOURCES)}"}), 400
+    
+    try:
+        page = int(request.args.get('page', 1))
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'page and limit must be integers'}), 400
+    if not 1 <= page <= MAX_PAGE:
+        return jsonify({'error': f'page must be between 1 and {MAX_PAGE}'}), 400
+    
+    try:
+        db = get_db()
+        
+        if not is_workspace_member(workspace_id, current_user_id):
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        return jsonify(search_workspace(db, workspace_id, query, kinds or None, page, limit)), 200
+        
+    except Exception as e:
+        print(f"Error searching workspace: {e}")
+        return jsonify({'error': 'Search failed'}), 500
+
 # ==================== MEMBER MANAGEMENT ====================
 
 @workspace_bp.route('/<workspace_id>/members', methods=['POST'])
@@ -261,6 +371,9 @@ def add_member(workspace_id):
                 '$set': {'updated_at': datetime.utcnow()}
             }
         )
+        bump_version('workspace', workspace_id)
+        invalidate_membership(workspace_id)
+        record_activity(db, workspace_id, current_user_id, 'member.added', 'user', new_user_id, name=new_member['name'], role=role)
         
         return jsonify({
             'message': 'Member added successfully',
@@ -321,6 +434,9 @@ def remove_member(workspace_id, user_id):
                 '$set': {'updated_at': datetime.utcnow()}
             }
         )
+        bump_version('workspace', workspace_id)
+        invalidate_membership(workspace_id)
+        record_activity(db, workspace_id, current_user_id, 'member.removed', 'user', user_id, name=target_member.get('name'))
         
         return jsonify({'message': 'Member removed successfully'}), 200
         
@@ -370,6 +486,9 @@ def update_member_role(workspace_id, user_id):
                 }
             }
         )
+        bump_version('workspace', workspace_id)
+        invalidate_membership(workspace_id)
+        record_activity(db, workspace_id, current_user_id, 'member.role_changed', 'user', user_id, role=new_role)
         
         return jsonify({'message': 'Member role updated successfully'}), 200
         
@@ -74,7 +74,9 @@ class KanbanManager {
         if (!container) return;
 
         container.innerHTML = this.boards.map(board => {
-            const boardTasks = this.tasks.filter(task => task.status === board.id);
+            const boardTasks = this.tasks
+                .filter(task => task.status === board.id)
+                .sort((a, b) => (a.rank || '') < (b.rank || '') ? -1 : (a.rank || '') > (b.rank || '') ? 1 : 0);
             
             return `
                 <div class="kanban-column bg-gray-50 rounded-lg p-4 min-w-80" data-status="${board.id}">
@@ -111,6 +113,7 @@ class KanbanManager {
         return `
             <div class="kanban-task bg-white rounded-lg p-4 shadow hover:shadow-md transition cursor-move ${priorityColors[task.priority] || priorityColors.medium}"
                  draggable="true"
+                 data-task-id="${task._id}"
                  ondragstart="kanbanManager.handleDragStart(event, '${task._id}')"
                  ondragend="kanbanManager.handleDragEnd(event)">
                 <h4 class="font-semibold text-gray-900 mb-2">${escapeHtml(task.title)}</h4>
@@ -171,12 +174,30 @@ class KanbanManager {
         event.currentTarget.classList.remove('kanban-drag-over');
     }
 
+    dropNeighbours(container, y) {
+        // Cards directly above and below the drop point, ignoring the dragged card
+        const cards = [...container.querySelectorAll('.kanban-task')]
+            .filter(card => card.dataset.taskId !== this.draggedTask);
+        const index = cards.findIndex(card => {
+            const box = card.getBoundingClientRect();
+            return y < box.top + box.height / 2;
+        });
+        const below = index === -1 ? null : cards[index];
+        const above = index === -1 ? cards[cards.length - 1] : cards[index - 1];
+        return {
+            before_id: above ? above.dataset.taskId : null,
+            after_id: below ? below.dataset.taskId : null
+        };
+    }
+
     async handleDrop(event, newStatus) {
         event.preventDefault();
         event.currentTarget.classList.remove('kanban-drag-over');
 
         if (!this.draggedTask) return;
 
+        const neighbours = this.dropNeighbours(event.currentTarget, event.clientY);
+
         try {
             const response = await fetch(`/api/kanban/task/${this.draggedTask}/move`, {
                 method: 'PUT',
@@ -184,14 +205,17 @@ class KanbanManager {
                     'Authorization': `Bearer ${localStorage.getItem('token')}`,
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ status: newStatus })
+                body: JSON.stringify({ status: newStatus, ...neighbours })
             });
 
             if (response.ok) {
+                const data = await response.json();
+
                 // Update local state
                 const task = this.tasks.find(t => t._id === this.draggedTask);
                 if (task) {
                     task.status = newStatus;
+                    task.rank = data.rank;
                 }
                 
                 this.renderKanbanBoard();
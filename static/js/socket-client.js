@@ -22,7 +22,9 @@ class SocketManager {
             reconnectionDelay: 1000,
             reconnectionDelayMax: 5000,
             reconnectionAttempts: this.maxReconnectAttempts,
-            timeout: 10000
+            timeout: 10000,
+            // Identifies the user for per-user rate limits
+            auth: (cb) => cb({ token: localStorage.getItem('token') })
         });
 
         // Connection successful
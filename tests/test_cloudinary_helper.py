@@ -0,0 +1,98 @@
+'''Direct-upload signing against a local stand-in for Cloudinary
+
+The stand-in signs its upload responses the way Cloudinary does, with a
+shared test secret, so no account or network access is needed.
+'''
+import cloudinary
+import cloudinary.api
+import cloudinary.utils
+import pytest
+from utils.cloudinary_helper import describe_upload, sign_upload_params, verify_upload_result, workspace_folder
+
+SECRET = 'test-secret'
+FOLDER = workspace_folder('ws1')
+
+
+def stand_in_upload(params, secret=SECRET):
+    '''Accept an upload the way storage would and return its signed result'''
+    signed = {key: value for key, value in params.items() if key not in ('signature', 'api_key')}
+    if cloudinary.utils.api_sign_request(signed, secret) != params['signature']:
+        raise ValueError('Invalid signature')
+
+    public_id = f"{params['folder']}/report"
+    version = 1700000000
+    return {
+        'public_id': public_id,
+        'version': version,
+        'signature': cloudinary.utils.api_sign_request({'public_id': public_id, 'version': version}, secret),
+        'bytes': 1024
+    }
+
+
+def test_signed_params_are_scoped_to_the_folder():
+    params = sign_upload_params(FOLDER, api_secret=SECRET, timestamp=1700000000)
+
+    assert params['folder'] == FOLDER
+    assert params['timestamp'] == 1700000000
+    assert stand_in_upload(params)['public_id'].startswith(FOLDER + '/')
+
+
+def test_tampered_params_are_rejected_by_storage():
+    params = sign_upload_params(FOLDER, api_secret=SECRET)
+    params['folder'] = workspace_folder('other')
+
+    with pytest.raises(ValueError):
+        stand_in_upload(params)
+
+
+def test_result_from_storage_verifies():
+    result = stand_in_upload(sign_upload_params(FOLDER, api_secret=SECRET))
+
+    assert verify_upload_result(result, FOLDER, api_secret=SECRET) == (True, 'Valid upload')
+
+
+def test_forged_result_is_rejected():
+    result = stand_in_upload(sign_upload_params(FOLDER, api_secret=SECRET))
+    result['public_id'] = f'{FOLDER}/other'
+
+    assert verify_upload_result(result, FOLDER, api_secret=SECRET) == (False, 'Invalid upload signature')
+
+
+def test_result_signed_with_another_secret_is_rejected():
+    result = stand_in_upload(sign_upload_params(FOLDER, api_secret='other-secret'), secret='other-secret')
+
+    assert verify_upload_result(result, FOLDER, api_secret=SECRET)[0] is False
+
+
+def test_result_from_another_workspace_is_rejected():
+    other = workspace_folder('ws2')
+    result = stand_in_upload(sign_upload_params(other, api_secret=SECRET))
+
+    assert verify_upload_result(result, FOLDER, api_secret=SECRET) == (False, 'Upload does not belong to this workspace')
+
+
+def test_incomplete_result_is_rejected():
+    assert verify_upload_result({'public_id': f'{FOLDER}/report'}, FOLDER, api_secret=SECRET)[0] is False
+
+
+def test_described_upload_comes_from_storage_not_the_client(monkeypatch):
+    result = stand_in_upload(sign_upload_params(FOLDER, api_secret=SECRET))
+    result.update({'secure_url': 'javascript:alert(1)', 'bytes': 1})
+    monkeypatch.setattr(cloudinary.api, 'resource', lambda public_id, resource_type: {
+        'public_id': public_id, 'resource_type': 'image', 'format': 'png', 'bytes': 2048
+    })
+    cloudinary.config(cloud_name='demo')
+
+    stored = describe_upload(result['public_id'], result['version'])
+
+    assert stored == {
+        'url': f"https://res.cloudinary.com/demo/image/upload/v{result['version']}/{result['public_id']}.png",
+        'size': 2048,
+        'format': 'png',
+        'resource_type': 'image'
+    }
+
+
+def test_unknown_resource_type_is_rejected():
+    with pytest.raises(ValueError):
+        describe_upload(f'{FOLDER}/report', 1700000000, resource_type='script')
@@ -0,0 +1,197 @@
+'''Append-only workspace activity stream
+
+Mutating routes append one compact event per change: who (actor_id) did
+what (action, e.g. task.moved) to which target, with a few fields of
+context. Each workspace numbers its events 1, 2, 3… through a counter in
+activity_sequences, so a client that remembers the last seq it saw asks
+for exactly what it missed instead of refetching the board.
+
+Events live in a capped collection (COLLECTION_SPECS in utils/db.py):
+appends never need an index rebuild or a cleanup job, the oldest events
+fall off once ACTIVITY_CAP_MB is reached, and a tailable cursor can follow
+new events as they land (tail_activity, or `python -m utils.activity`).
+
+Sequence numbers are reserved before the events are inserted, so a later
+event can land before an earlier one. Readers only ever move past a gap
+once it is ACTIVITY_GAP_GRACE old; until then the missing events count
+as in flight. A reader whose position has already been evicted gets
+truncated=True and should fall back to a full refetch.
+
+    ACTIVITY_CAP_MB  (256)
+'''
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pymongo import CursorType, ReturnDocument
+
+ACTIVITY_CAP_BYTES = int(os.getenv('ACTIVITY_CAP_MB', 256)) * 1024 * 1024
+ACTIVITY_PAGE_SIZE = 100
+MAX_ACTIVITY_PAGE_SIZE = 500
+# How long a reserved sequence number may stay missing before it counts as lost
+ACTIVITY_GAP_GRACE = timedelta(seconds=5)
+
+
+def activity_collection_spec():
+    '''COLLECTION_SPECS entry for the capped activity collection'''
+    return ('activity', {'capped': True, 'size': ACTIVITY_CAP_BYTES})
+
+
+def activity_index_specs():
+    '''INDEX_SPECS entries: per-workspace sequence lookups'''
+    return [('activity', [('workspace_id', 1), ('seq', 1)], {'unique': True})]
+
+
+def record_activities(db, workspace_id, actor_id, events):
+    '''Append (action, target_type, target_id, data) events; returns the last seq
+
+    One counter update reserves a block of sequence numbers for all events,
+    then they are inserted together. Failures are logged, never raised: the
+    change itself has already been made.
+    '''
+    if not workspace_id or not events:
+        return None
+
+    try:
+        now = datetime.now()
+        counter = db.activity_sequences.find_one_and_update(
+            {'_id': workspace_id},
+            {'$inc': {'seq': len(events)}, '$set': {'reserved_at': now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first = counter['seq'] - len(events) + 1
+
+        db.activity.insert_many([
+            {
+                'workspace_id': workspace_id,
+                'seq': first + offset,
+                'action': action,
+                'actor_id': actor_id,
+                'target_type': target_type,
+                'target_id': str(target_id) if target_id is not None else None,
+                'data': data or {},
+                'created_at': now
+            }
+            for offset, (action, target_type, target_id, data) in enumerate(events)
+        ])
+        return counter['seq']
+
+    except Exception as e:
+        print(f"⚠️ Could not record activity for workspace {workspace_id}: {e}")
+        return None
+
+
+def record_activity(db, workspace_id, actor_id, action, target_type=None, target_id=None, **data):
+    '''Append one event; see record_activities'''
+    return record_activities(db, workspace_id, actor_id, [(action, target_type, target_id, data)])
+
+
+def get_activity(db, workspace_id, after=0, limit=ACTIVITY_PAGE_SIZE):
+    '''Events with seq > after, oldest first, through the (workspace_id, seq) index
+
+    Only the run of events continuing from ``after`` is returned; the page
+    stops at a gap that is still within ACTIVITY_GAP_GRACE.
+    '''
+    limit = max(1, min(limit, MAX_ACTIVITY_PAGE_SIZE))
+    events = list(
+        db.activity.find({'workspace_id': workspace_id, 'seq': {'$gt': after}}, {'_id': 0})
+        .sort('seq', 1)
+        .limit(limit + 1)
+    )
+
+    now = datetime.now()
+    page, position, truncated, in_flight = [], after, False, False
+    for event in events[:limit]:
+        if event['seq'] != position + 1:
+            if now - event['created_at'] < ACTIVITY_GAP_GRACE:
+                in_flight = True
+                break
+            # The next event is gone; past a reader's position that means evicted
+            truncated = truncated or position == after
+        page.append(event)
+        position = event['seq']
+
+    if not events:
+        # Either the next events are still being inserted or everything after `after` is gone
+        counter = db.activity_sequences.find_one({'_id': workspace_id})
+        if counter and counter['seq'] > after:
+            reserved_at = counter.get('reserved_at')
+            in_flight = reserved_at is not None and now - reserved_at < ACTIVITY_GAP_GRACE
+            truncated = not in_flight
+
+    return {
+        'events': page,
+        'next_after': position,
+        'has_more': not in_flight and len(events) > limit,
+        'truncated': truncated
+    }
+
+
+def _release(pending, after):
+    '''Pop the held-back events that continue from seq ``after``, skipping gaps past the grace period'''
+    ready = []
+    while pending:
+        seq = min(pending)
+        if seq != after + 1 and datetime.now() - pending[seq]['created_at'] < ACTIVITY_GAP_GRACE:
+            break
+        ready.append(pending.pop(seq))
+        after = seq
+    return ready, after
+
+
+def tail_activity(db, workspace_id=None, after=None, idle_wait=1.0):
+    '''Yield events as they are appended, following the capped collection
+
+    The tailable cursor reads the collection in insertion order, bounded
+    only by creation time so it always starts on an event and stays open
+    while nothing new arrives; the workspace is filtered here. One
+    workspace's events are held back and yielded in seq order. after is the
+    last seq seen when following one workspace (default: its newest event);
+    the whole stream starts a few seconds before its newest event. The
+    cursor is reopened from the last event whenever the server drops it.
+    '''
+    if workspace_id and after is None:
+        newest = db.activity.find_one({'workspace_id': workspace_id}, {'seq': 1}, sort=[('seq', -1)])
+        after = newest['seq'] if newest else 0
+
+    since = None
+    pending = {}
+    seen = {}
+    while True:
+        if since is None:
+            newest = db.activity.find_one({}, {'created_at': 1}, sort=[('$natural', -1)])
+            since = newest['created_at'] - ACTIVITY_GAP_GRACE if newest else None
+
+        query = {'created_at': {'$gte': since}} if since else {}
+        cursor = db.activity.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+        while cursor.alive:
+            for event in cursor:
+                # Reopening rewinds by the grace period, since insertion order only roughly follows created_at
+                rewind = event['created_at'] - ACTIVITY_GAP_GRACE
+                since = max(since, rewind) if since else rewind
+                if workspace_id:
+                    if event['workspace_id'] == workspace_id and event['seq'] > after:
+                        pending[event['seq']] = event
+                        ready, after = _release(pending, after)
+                        yield from ready
+                elif event['_id'] not in seen:
+                    seen[event['_id']] = event['created_at']
+                    yield event
+
+            # The await timed out: release gaps that have aged out, forget events nothing can repeat
+            if workspace_id:
+                ready, after = _release(pending, after)
+                yield from ready
+            seen = {event_id: created_at for event_id, created_at in seen.items() if since is None or created_at >= since}
+        time.sleep(idle_wait)
+
+
+if __name__ == '__main__':
+    from utils.db import get_db
+
+    workspace = sys.argv[1] if len(sys.argv) > 1 else None
+    for event in tail_activity(get_db(), workspace):
+        event.pop('_id', None)
+        print(json.dumps(event, default=str), flush=True)
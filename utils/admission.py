@@ -0,0 +1,219 @@
+'''Admission control for API requests and load shedding for socket events
+
+Every /api/ request is classified (read, write, auth, heavy) and must take a
+slot from its class before the handler runs. A class that is full queues
+the request for at most its queue budget; past that, or when too many are
+already waiting, the request is answered at once with 503 and Retry-After
+instead of holding a worker thread until the client gives up. Cheap reads
+therefore never wait behind workspace deletes or uploads.
+
+Socket events are shed by priority while the worker is under pressure
+(admitted + queued requests relative to the thread pool, or to the
+admission limits under gevent): cursor and typing
+updates go first, presence next; chat, kanban and document content are
+always handled.
+
+    ADMISSION_ENABLED          (true)
+    ADMISSION_<CLASS>_LIMIT    concurrent requests per class
+    ADMISSION_<CLASS>_QUEUE_MS longest a request may wait for a slot
+    SHED_LOW_PRIORITY_AT       (0.75) pressure above which cursor/typing events are dropped
+    SHED_PRESENCE_AT           (0.9)  pressure above which presence events are dropped
+'''
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import g, jsonify, request
+from utils.metrics import Counter, Histogram, WORKER_CONCURRENCY, register_collector
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SHED_LOW_PRIORITY_AT = float(os.getenv('SHED_LOW_PRIORITY_AT', 0.75))
+SHED_PRESENCE_AT = float(os.getenv('SHED_PRESENCE_AT', 0.9))
+
+# Endpoints that hold a thread for long or fan out into many writes
+HEAVY_ENDPOINTS = {
+    'workspace.delete_workspace',
+    'file.upload_file',
+    'file.delete_file',
+    'notification.clear_notifications',
+    'notification.mark_notifications_read',
+    'kanban.bulk_tasks'
+}
+# bcrypt keeps these busy for hundreds of milliseconds
+AUTH_ENDPOINTS = {'auth.login', 'auth.register'}
+
+LOW_PRIORITY_EVENTS = {
+    'document_cursor_position', 'document_typing', 'document_stop_typing', 'typing_start', 'typing_stop'
+}
+PRESENCE_EVENTS = {'user_online', 'user_offline'}
+
+admission_decisions = Counter('admission_requests_total', 'API requests by class and admission outcome', ('class', 'outcome'))
+admission_wait = Histogram(
+    'admission_queue_wait_seconds', 'Time admitted requests waited for a slot', ('class',),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+)
+socketio_events_shed = Counter('socketio_events_shed_total', 'Socket.IO events dropped under load', ('event',))
+
+
+class AdmissionClass:
+    '''A concurrency limit with a bounded, time-limited wait queue'''
+
+    def __init__(self, name, limit, queue_ms, max_waiting):
+        self.name = name
+        self.limit = int(os.getenv(f'ADMISSION_{name.upper()}_LIMIT', limit))
+        self.queue_seconds = int(os.getenv(f'ADMISSION_{name.upper()}_QUEUE_MS', queue_ms)) / 1000
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Take a slot; returns seconds waited, or None when the request must be rejected'''
+        if self._slots.acquire(blocking=False):
+            waited = 0.0
+        else:
+            with self._lock:
+                if self.waiting >= self.max_waiting:
+                    return None
+                self.waiting += 1
+
+            started = time.perf_counter()
+            try:
+                admitted = self._slots.acquire(timeout=self.queue_seconds)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not admitted:
+                return None
+            waited = time.perf_counter() - started
+
+        with self._lock:
+            self.in_flight += 1
+        return waited
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+ADMISSION_CLASSES = {
+    'read': AdmissionClass('read', limit=60, queue_ms=250, max_waiting=100),
+    'write': AdmissionClass('write', limit=30, queue_ms=500, max_waiting=50),
+    'auth': AdmissionClass('auth', limit=8, queue_ms=1000, max_waiting=20),
+    'heavy': AdmissionClass('heavy', limit=4, queue_ms=2000, max_waiting=8)
+}
+
+
+def classify_request():
+    '''Admission class for the current request, or None for requests that bypass admission'''
+    if not request.path.startswith('/api/'):
+        return None
+    if request.endpoint in HEAVY_ENDPOINTS:
+        return 'heavy'
+    if request.endpoint in AUTH_ENDPOINTS:
+        return 'auth'
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return 'read'
+    return 'write'
+
+
+# Under gthread the thread pool is the limit; under gevent greenlets are
+# plentiful and the admission slots themselves are what runs out
+ADMISSION_CAPACITY = min(WORKER_CONCURRENCY, sum(cls.limit for cls in ADMISSION_CLASSES.values()))
+
+
+def pressure():
+    '''Admitted plus queued API requests relative to what the worker can run at once'''
+    busy = sum(cls.in_flight + cls.waiting for cls in ADMISSION_CLASSES.values())
+    return busy / ADMISSION_CAPACITY
+
+
+def _admit():
+    name = classify_request()
+    if name is None:
+        return None
+
+    cls = ADMISSION_CLASSES[name]
+    waited = cls.acquire()
+    if waited is None:
+        admission_decisions.inc(name, 'rejected')
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, math.ceil(cls.queue_seconds)))
+        return response
+
+    g._admission_class = cls
+    admission_decisions.inc(name, 'admitted')
+    admission_wait.observe(name, value=waited)
+    return None
+
+
+def _release(exc):
+    cls = g.pop('_admission_class', None)
+    if cls is not None:
+        cls.release()
+
+
+def should_shed(event):
+    '''True when a socket event should be dropped at the current pressure'''
+    if event in LOW_PRIORITY_EVENTS:
+        return pressure() >= SHED_LOW_PRIORITY_AT
+    if event in PRESENCE_EVENTS:
+        return pressure() >= SHED_PRESENCE_AT
+    return False
+
+
+def _shedding_handler(event, handler):
+    @wraps(handler)
+    def guarded(*args, **kwargs):
+        if should_shed(event):
+            socketio_events_shed.inc(event)
+            return None
+        return handler(*args, **kwargs)
+    return guarded
+
+
+@register_collector
+def _collect_admission():
+    return [
+        ('admission_in_flight', 'gauge', 'Requests holding an admission slot', [
+            ({'class': name}, cls.in_flight) for name, cls in ADMISSION_CLASSES.items()
+        ]),
+        ('admission_waiting', 'gauge', 'Requests queued for an admission slot', [
+            ({'class': name}, cls.waiting) for name, cls in ADMISSION_CLASSES.items()
+        ]),
+        ('admission_limit', 'gauge', 'Concurrency limit per class', [
+            ({'class': name}, cls.limit) for name, cls in ADMISSION_CLASSES.items()
+        ]),
+        ('admission_pressure', 'gauge', 'Admitted plus queued requests per unit of worker capacity', [({}, round(pressure(), 4))])
+    ]
+
+
+def init_admission(app, socketio):
+    '''Register the admission hooks and wrap socketio.on with priority shedding
+
+    Must run before the @socketio.on handlers are defined.
+    '''
+    if not ADMISSION_ENABLED:
+        return
+
+    app.before_request(_admit)
+    app.teardown_request(_release)
+
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+
+        def wrap(handler):
+            if message in LOW_PRIORITY_EVENTS or message in PRESENCE_EVENTS:
+                decorator(_shedding_handler(message, handler))
+            else:
+                decorator(handler)
+            return handler
+        return wrap
+
+    socketio.on = on
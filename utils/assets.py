@@ -0,0 +1,223 @@
+'''Static asset pipeline and cached page shells
+
+Build step (run once per deploy, before starting gunicorn):
+
+    python -m utils.assets
+
+minifies static/js and static/css, writes content-hashed copies plus
+.gz/.br siblings to static/dist, and records them in static/dist/manifest.json.
+At runtime ``asset_url('js/kanban.js')`` resolves to the fingerprinted file,
+served from /assets/ with immutable caching. Without a manifest the
+templates keep pointing at the plain /static/ files.
+'''
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from flask import current_app, render_template, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without the brotli package
+    brotli = None
+
+try:
+    import rjsmin
+    import rcssmin
+except ImportError:  # Fall back to the conservative built-in minifiers
+    rjsmin = rcssmin = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+SOURCE_DIRS = ('js', 'css')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_manifest = {}
+_shells = {}
+_shells_lock = threading.Lock()
+
+
+# ==================== BUILD ====================
+
+def _minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def _minify_js(source):
+    '''Strip indentation, blank lines and full-line comments
+
+    Lines inside template literals are kept verbatim so embedded HTML and
+    strings are never altered.
+    '''
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def build_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    '''Minify, fingerprint and precompress every JS/CSS file; returns the manifest'''
+    manifest = {}
+
+    for subdir in SOURCE_DIRS:
+        source_dir = os.path.join(static_dir, subdir)
+        if not os.path.isdir(source_dir):
+            continue
+
+        os.makedirs(os.path.join(dist_dir, subdir), exist_ok=True)
+
+        for filename in sorted(os.listdir(source_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext not in ('.js', '.css'):
+                continue
+
+            with open(os.path.join(source_dir, filename), encoding='utf-8') as source_file:
+                source = source_file.read()
+
+            minified = (_minify_js(source) if ext == '.js' else _minify_css(source)).encode('utf-8')
+            digest = hashlib.sha256(minified).hexdigest()[:12]
+            hashed_name = f'{subdir}/{name}.{digest}{ext}'
+            target = os.path.join(dist_dir, hashed_name)
+
+            with open(target, 'wb') as out:
+                out.write(minified)
+            with open(target + '.gz', 'wb') as out:
+                out.write(gzip.compress(minified, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as out:
+                    out.write(brotli.compress(minified, quality=11))
+
+            manifest[f'{subdir}/{filename}'] = hashed_name
+            print(f"✓ {subdir}/{filename}: {len(source)} → {len(minified)} bytes → {hashed_name}")
+
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w') as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+
+    return manifest
+
+
+# ==================== RUNTIME ====================
+
+def load_manifest(path=MANIFEST_PATH):
+    '''Load the build manifest; missing manifest means unfingerprinted assets'''
+    global _manifest
+
+    try:
+        with open(path) as manifest_file:
+            _manifest = json.load(manifest_file)
+        print(f"✓ Loaded {len(_manifest)} fingerprinted assets")
+    except FileNotFoundError:
+        _manifest = {}
+
+    return _manifest
+
+
+def asset_url(path):
+    '''URL for a static asset, fingerprinted when the build manifest knows it'''
+    hashed = _manifest.get(path)
+    if hashed:
+        return f'/assets/{hashed}'
+    return f'/static/{path}'
+
+
+def _preferred_encoding(available):
+    '''Pick br, then gzip, among the encodings both we and the client support'''
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted[encoding]:
+            return encoding
+    return None
+
+
+def serve_asset(filename):
+    '''Serve a fingerprinted asset, precompressed when the client allows it'''
+    if filename not in _manifest.values():
+        return current_app.response_class('Not found', status=404)
+
+    available = [
+        encoding for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+        if os.path.exists(os.path.join(DIST_DIR, filename + suffix))
+    ]
+    encoding = _preferred_encoding(available)
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+
+    if encoding:
+        suffix = '.br' if encoding == 'br' else '.gz'
+        response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+
+def render_shell(template_name):
+    '''Serve a page shell rendered once per process
+
+    Page templates take no per-request context (IDs are read from the URL
+    client-side), so the rendered HTML is cached along with its gzip form
+    and an ETag. Debug mode always re-renders so template edits show up.
+    '''
+    if current_app.debug:
+        return render_template(template_name)
+
+    shell = _shells.get(template_name)
+    if shell is None:
+        with _shells_lock:
+            shell = _shells.get(template_name)
+            if shell is None:
+                html = render_template(template_name).encode('utf-8')
+                shell = {
+                    'html': html,
+                    'gzip': gzip.compress(html, compresslevel=6, mtime=0),
+                    'etag': hashlib.sha256(html).hexdigest()[:16]
+                }
+                _shells[template_name] = shell
+
+    if request.if_none_match.contains(shell['etag']):
+        response = current_app.response_class(status=304)
+    elif _preferred_encoding(['gzip']):
+        response = current_app.response_class(shell['gzip'], mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(shell['html'], mimetype='text/html')
+
+    response.set_etag(shell['etag'])
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.no_cache = True
+    return response
+
+
+def init_assets(app):
+    '''Wire the manifest, the asset_url template helper and the /assets route'''
+    load_manifest()
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+
+
+if __name__ == '__main__':
+    build_assets()
@@ -3,10 +3,43 @@ import os
 from functools import wraps
 from flask import request, jsonify
 from bson import ObjectId
-from utils.db import get_db
+from utils.db import WatchedCache, get_db
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 
+# Kept until the change watcher sees the underlying document change
+_users = WatchedCache('users', 'users')
+_memberships = WatchedCache('workspace_members', 'workspaces')
+_member_workspaces = WatchedCache('member_workspaces', 'workspaces', per_document=False)
+
+def load_user(user_id):
+    '''User document by id, from the in-process cache when possible'''
+    if not ObjectId.is_valid(user_id):
+        return None
+    return _users.get(user_id, 'user', lambda: get_db().users.find_one({'_id': ObjectId(user_id)}))
+
+def is_workspace_member(workspace_id, user_id):
+    '''Whether user_id belongs to the workspace; cached per workspace'''
+    if not ObjectId.is_valid(workspace_id):
+        return False
+    return _memberships.get(workspace_id, user_id, lambda: get_db().workspaces.find_one(
+        {'_id': ObjectId(workspace_id), 'members.user_id': user_id}, {'_id': 1}
+    ) is not None)
+
+def member_workspace_ids(user_id):
+    '''Ids of every workspace the user belongs to'''
+    return _member_workspaces.get(None, user_id, lambda: [
+        str(workspace['_id']) for workspace in get_db().workspaces.find({'members.user_id': user_id}, {'_id': 1})
+    ])
+
+def invalidate_membership(workspace_id):
+    '''Drop this worker's cached memberships of a workspace right after changing them
+
+    Other workers catch up through the change watcher.
+    '''
+    _memberships.invalidate(workspace_id)
+    _member_workspaces.invalidate()
+
 def token_required(f):
     '''Decorator to protect routes that require authentication'''
     @wraps(f)
@@ -29,8 +62,7 @@ def token_required(f):
             payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
             
             # Get user from database
-            db = get_db()
-            user = db.users.find_one({'_id': ObjectId(payload['user_id'])})
+            user = load_user(payload['user_id'])
             
             if not user:
                 return jsonify({'error': 'User not found'}), 401
@@ -38,7 +70,7 @@ def token_required(f):
             # Add user info to request
             request.user_id = str(user['_id'])
             request.user_email = user['email']
-            request.user_role = user['role']
+            request.user_role = user.get('role', 'member')
             request.user_name = user['name']
             
         except jwt.ExpiredSignatureError:
@@ -96,18 +128,17 @@ def admin_required(f):
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
             
-            db = get_db()
-            user = db.users.find_one({'_id': ObjectId(payload['user_id'])})
+            user = load_user(payload['user_id'])
             
             if not user:
                 return jsonify({'error': 'User not found'}), 401
             
-            if user['role'] != 'admin':
+            if user.get('role') != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
             
             request.user_id = str(user['_id'])
             request.user_email = user['email']
-            request.user_role = user['role']
+            request.user_role = user.get('role', 'member')
             request.user_name = user['name']
             
         except jwt.ExpiredSignatureError:
@@ -1,8 +1,14 @@
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
+import hmac
 import os
+import time
 from werkzeug.utils import secure_filename
 
+RESOURCE_TYPES = ('image', 'video', 'raw')
+
 def upload_to_cloudinary(file):
     '''Upload a file to Cloudinary and return the result'''
     try:
@@ -106,3 +112,104 @@ def validate_file(file, allowed_extensions=None, max_size_mb=16):
             return False, f'File type not allowed. Allowed types: {", ".join(allowed_extensions)}'
     
     return True, 'Valid file'
+
+def workspace_folder(workspace_id):
+    '''Cloudinary folder that holds a workspace's uploads'''
+    return f"syncspace/{workspace_id}"
+
+def get_upload_url(resource_type='auto'):
+    '''Endpoint clients upload to directly (CLOUDINARY_UPLOAD_URL overrides it for local stand-ins)'''
+    override = os.getenv('CLOUDINARY_UPLOAD_URL')
+    if override:
+        return override
+    return cloudinary.utils.cloudinary_api_url('upload', resource_type=resource_type)
+
+def sign_upload_params(folder, api_secret=None, timestamp=None):
+    '''Sign direct-upload parameters scoped to a folder
+
+    Cloudinary rejects uploads whose parameters differ from what was signed,
+    so the client can only store files under ``folder`` and only for the
+    lifetime of the timestamp (one hour on Cloudinary's side).
+    '''
+    config = cloudinary.config()
+    api_secret = api_secret or config.api_secret
+    if not api_secret:
+        raise Exception('Cloudinary API secret is not configured')
+
+    params = {
+        'folder': folder,
+        'timestamp': int(timestamp or time.time())
+    }
+    params['signature'] = cloudinary.utils.api_sign_request(
+        params,
+        api_secret,
+        config.signature_algorithm or 'sha1'
+    )
+    params['api_key'] = config.api_key
+    return params
+
+def verify_upload_result(result, folder, api_secret=None):
+    '''Check that an upload result reported by a client really came from storage
+
+    Cloudinary signs ``public_id`` and ``version`` of every upload response
+    with the account secret; the same check works against a local stand-in
+    that signs with a shared test secret.
+    '''
+    public_id = result.get('public_id')
+    version = result.get('version')
+    signature = result.get('signature')
+
+    if not public_id or not version or not signature:
+        return False, 'public_id, version and signature are required'
+
+    if not str(public_id).startswith(folder + '/'):
+        return False, 'Upload does not belong to this workspace'
+
+    config = cloudinary.config()
+    api_secret = api_secret or config.api_secret
+    if not api_secret:
+        raise Exception('Cloudinary API secret is not configured')
+
+    expected = cloudinary.utils.api_sign_request(
+        {'public_id': public_id, 'version': version},
+        api_secret,
+        config.signature_algorithm or 'sha1'
+    )
+
+    if not hmac.compare_digest(str(signature), expected):
+        return False, 'Invalid upload signature'
+
+    return True, 'Valid upload'
+
+def describe_upload(public_id, version, resource_type='image'):
+    '''Stored metadata of a verified upload: url, size, format and resource type
+
+    Only public_id and version are signed in an upload result, so nothing
+    else the client reports is kept. Size, format and type come from the
+    Admin API, and the delivery URL is built here from the signed pair.
+    resource_type only tells the Admin API where to look; raises
+    ValueError for an unknown type and cloudinary.exceptions.NotFound if
+    storage has no such upload.
+    '''
+    if resource_type not in RESOURCE_TYPES:
+        raise ValueError(f'resource_type must be one of {", ".join(RESOURCE_TYPES)}')
+
+    resource = cloudinary.api.resource(public_id, resource_type=resource_type)
+    resource_type = resource.get('resource_type', resource_type)
+
+    # Raw public ids carry their extension; images and videos are delivered in their stored format
+    url_format = None if resource_type == 'raw' else resource.get('format')
+    url, _ = cloudinary.utils.cloudinary_url(
+        public_id,
+        version=version,
+        resource_type=resource_type,
+        format=url_format,
+        secure=True
+    )
+
+    return {
+        'url': url,
+        'size': int(resource.get('bytes') or 0),
+        'format': resource.get('format', ''),
+        'resource_type': resource_type
+    }
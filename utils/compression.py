@@ -0,0 +1,198 @@
+'''Negotiated compression for API responses and Socket.IO websocket frames
+
+Both paths have their own threshold and level, and record how many bytes
+went in and out and how much CPU time compression cost.
+
+    API_COMPRESSION_MIN_BYTES  (1024)  smallest JSON body worth compressing
+    API_GZIP_LEVEL             (6)
+    API_BROTLI_QUALITY         (4)     low qualities are fast enough per request
+    WS_COMPRESSION_MIN_BYTES   (1024)  smaller frames go out uncompressed
+    WS_DEFLATE_LEVEL           (6)
+    POLLING_COMPRESSION_MIN_BYTES (1024)  Engine.IO long-polling payloads
+'''
+import gzip
+import os
+import threading
+import time
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip only without the brotli package
+    brotli = None
+
+API_COMPRESSION_MIN_BYTES = int(os.getenv('API_COMPRESSION_MIN_BYTES', 1024))
+API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', 6))
+API_BROTLI_QUALITY = int(os.getenv('API_BROTLI_QUALITY', 4))
+WS_COMPRESSION_MIN_BYTES = int(os.getenv('WS_COMPRESSION_MIN_BYTES', 1024))
+WS_DEFLATE_LEVEL = int(os.getenv('WS_DEFLATE_LEVEL', 6))
+POLLING_COMPRESSION_MIN_BYTES = int(os.getenv('POLLING_COMPRESSION_MIN_BYTES', 1024))
+
+COMPRESSIBLE_MIMETYPES = ('application/json',)
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(channel, raw_bytes, compressed_bytes, cpu_seconds):
+    with _stats_lock:
+        stats = _stats.setdefault(channel, {
+            'count': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0
+        })
+        stats['count'] += 1
+        stats['bytes_in'] += raw_bytes
+        stats['bytes_out'] += compressed_bytes
+        stats['cpu_seconds'] += cpu_seconds
+
+
+def get_compression_stats():
+    '''Totals per channel plus the overall compression ratio'''
+    with _stats_lock:
+        snapshot = {channel: dict(stats) for channel, stats in _stats.items()}
+
+    for stats in snapshot.values():
+        stats['ratio'] = round(stats['bytes_in'] / stats['bytes_out'], 2) if stats['bytes_out'] else None
+    return snapshot
+
+
+# ==================== HTTP ====================
+
+def _negotiate():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=API_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=API_GZIP_LEVEL, mtime=0)
+
+
+def _compress_stream(chunks, encoding):
+    '''Compress a streamed body chunk by chunk, flushing so bytes keep flowing'''
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=API_BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(API_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    raw_bytes = compressed_bytes = 0
+    cpu_seconds = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            started = time.thread_time()
+            out = compress(chunk) + flush()
+            cpu_seconds += time.thread_time() - started
+            raw_bytes += len(chunk)
+            compressed_bytes += len(out)
+            if out:
+                yield out
+
+        started = time.thread_time()
+        out = finish()
+        cpu_seconds += time.thread_time() - started
+        compressed_bytes += len(out)
+        if out:
+            yield out
+    finally:
+        _record('api_stream', raw_bytes, compressed_bytes, cpu_seconds)
+
+
+def _weaken_etag(response):
+    '''Mark the ETag weak: it names the resource, not these encoded bytes
+
+    A strong tag promises byte-identical bodies, which gzip, brotli and the
+    streamed variants of a body do not share with each other.
+    '''
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    '''after_request hook: gzip/brotli JSON bodies the client can decode'''
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        _weaken_etag(response)
+        return response
+
+    data = response.get_data()
+    if len(data) < API_COMPRESSION_MIN_BYTES:
+        return response
+
+    started = time.thread_time()
+    compressed = _compress(data, encoding)
+    _record('api', len(data), len(compressed), time.thread_time() - started)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    _weaken_etag(response)
+    return response
+
+
+# ==================== WEBSOCKET ====================
+
+def _threshold_deflate_class():
+    '''permessage-deflate that leaves small frames uncompressed
+
+    RFC 7692 lets a sender skip compression per message by leaving RSV1
+    unset, so tiny cursor/typing frames avoid the zlib overhead while large
+    document_updated payloads still shrink.
+    '''
+    from wsproto.extensions import PerMessageDeflate
+    from wsproto.frame_protocol import Opcode
+
+    class ThresholdDeflate(PerMessageDeflate):
+        _skip_message = False
+
+        def frame_outbound(self, proto, opcode, rsv, data, fin):
+            if opcode is not Opcode.CONTINUATION:
+                self._skip_message = len(data) < WS_COMPRESSION_MIN_BYTES
+            if self._skip_message or not self._compressible_opcode(opcode):
+                return rsv, data
+
+            if self._compressor is None and opcode is not Opcode.CONTINUATION:
+                bits = self.client_max_window_bits if proto.client else self.server_max_window_bits
+                self._compressor = zlib.compressobj(WS_DEFLATE_LEVEL, zlib.DEFLATED, -int(bits or 15))
+
+            started = time.thread_time()
+            rsv, out = super().frame_outbound(proto, opcode, rsv, data, fin)
+            _record('websocket', len(data), len(out), time.thread_time() - started)
+            return rsv, out
+
+    return ThresholdDeflate
+
+
+def init_compression(app):
+    '''Register HTTP compression and the thresholded websocket deflate'''
+    app.after_request(compress_response)
+
+    try:
+        import simple_websocket.ws
+        simple_websocket.ws.PerMessageDeflate = _threshold_deflate_class()
+    except ImportError:
+        print("⚠️ simple-websocket not installed; websocket frames stay uncompressed")
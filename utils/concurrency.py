@@ -0,0 +1,15 @@
+import os
+
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+
+def run_blocking(func, *args, **kwargs):
+    '''Run CPU-bound work (bcrypt, compression) without stalling the event loop
+
+    In gevent mode the call is handed to the hub's native thread pool so other
+    greenlets keep running; in threading mode it simply runs inline.
+    '''
+    if ASYNC_MODE == 'gevent':
+        from gevent import get_hub
+        return get_hub().threadpool.apply(func, args, kwargs)
+
+    return func(*args, **kwargs)
@@ -1,8 +1,22 @@
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError, ConnectionFailure, ConfigurationError
+from pymongo import MongoClient, ReadPreference, WriteConcern, monitoring
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.errors import BulkWriteError, CollectionInvalid, ConfigurationError, ConnectionFailure, OperationFailure
+from collections import deque
+from datetime import datetime
+import hashlib
+import math
+import json
 import os
+import queue
+import socket
+import threading
 import time
 from dotenv import load_dotenv
+from utils.metrics import Counter, Gauge, pool_listener
+from utils.search import search_index_specs
+from utils.task_query import task_query_index_specs
+from utils.activity import activity_collection_spec, activity_index_specs
+import pymongo
 
 # Load environment variables
 load_dotenv()
@@ -10,119 +24,279 @@ load_dotenv()
 # Global database connection
 _db = None
 _client = None
+_bulk_db = None
+_bulk_client = None
+_mongo_uri = None
+_init_lock = threading.Lock()
+_tiered = {}
+_migrations_pending = False
 
+DB_NAME = 'syncspace'
 
-def init_db(mongo_uri=None, max_retries=3, retry_delay=2):
+# Two connection pools so heavy work cannot starve request handlers:
+#   interactive  REST routes, socket handlers, auth; sized to the worker's threads
+#   bulk         cascading deletes, bulk updates and aggregations; small, patient
+POOL_SETTINGS = {
+    'interactive': {
+        'maxPoolSize': int(os.getenv('MONGO_POOL_MAX', os.getenv('THREADS', 100))),
+        'minPoolSize': int(os.getenv('MONGO_POOL_MIN', 10)),
+        'waitQueueTimeoutMS': int(os.getenv('MONGO_POOL_WAIT_MS', 2000)),
+        'socketTimeoutMS': 10000
+    },
+    'bulk': {
+        'maxPoolSize': int(os.getenv('MONGO_BULK_POOL_MAX', 8)),
+        'minPoolSize': 0,
+        'waitQueueTimeoutMS': int(os.getenv('MONGO_BULK_POOL_WAIT_MS', 30000)),
+        'socketTimeoutMS': int(os.getenv('MONGO_BULK_SOCKET_TIMEOUT_MS', 120000))
+    }
+}
+
+# Every index the app relies on, as (collection, keys, options). Adding,
+# removing or changing an entry is enough: startup builds whatever is not yet
+# recorded in schema_migrations and skips the rest.
+INDEX_SPECS = [
+    # Users
+    ('users', [('email', 1)], {'unique': True}),
+    ('users', [('created_at', 1)], {}),
+
+    # Workspaces
+    ('workspaces', [('created_by', 1)], {}),
+    ('workspaces', [('members.user_id', 1)], {}),
+    ('workspaces', [('created_at', 1)], {}),
+
+    # Tasks
+    ('tasks', [('workspace_id', 1)], {}),
+    ('tasks', [('project_id', 1)], {}),
+    ('tasks', [('assigned_to', 1)], {}),
+    ('tasks', [('workspace_id', 1), ('status', 1)], {}),
+
+    # Documents
+    ('documents', [('workspace_id', 1)], {}),
+    ('documents', [('created_by', 1)], {}),
+    ('documents', [('updated_at', 1)], {}),
+
+    # Messages
+    ('messages', [('workspace_id', 1)], {}),
+    ('messages', [('workspace_id', 1), ('created_at', -1)], {}),
+
+    # Files
+    ('files', [('workspace_id', 1)], {}),
+    ('files', [('uploaded_by', 1)], {}),
+    ('files', [('public_id', 1)], {'unique': True}),
+    ('files', [('created_at', 1)], {}),
+
+    # Notifications
+    ('notifications', [('user_id', 1)], {}),
+    ('notifications', [('user_id', 1), ('read', 1)], {}),
+    ('notifications', [('created_at', 1)], {}),
+
+    # Shapes the query profiler flagged: board/my-tasks sort, chat history, @mentions
+    ('tasks', [('workspace_id', 1), ('created_at', -1)], {}),
+    ('chat_messages', [('workspace_id', 1), ('timestamp', -1)], {}),
+    ('users', [('name', 1)], {}),
+
+    # Resource versions for ETags; (key, version) makes lookups covered
+    ('resource_versions', [('key', 1)], {'unique': True}),
+    ('resource_versions', [('key', 1), ('version', 1)], {}),
+
+    # Kanban card order within a column (fractional ranks)
+    ('tasks', [('workspace_id', 1), ('status', 1), ('rank', 1)], {}),
+
+    # Workspace search: one text index per source, prefixed by workspace_id
+    *search_index_specs(),
+
+    # Task query plans (assignee / workspace filters, keyset sort)
+    *task_query_index_specs(),
+
+    # Due-date reminders: window loads, sent-reminder claims, cross-worker change queue
+    ('tasks', [('due_date', 1), ('status', 1)], {}),
+    ('task_reminders', [('sent_at', 1)], {'expireAfterSeconds': 7 * 24 * 3600}),
+    ('reminder_updates', [('created_at', 1)], {'expireAfterSeconds': 24 * 3600}),
+
+    # Workspace activity stream, paged by per-workspace sequence number
+    *activity_index_specs(),
+
+    # Change stream resume tokens of processes that are gone; live watchers re-save theirs every few seconds
+    ('change_stream_tokens', [('saved_at', 1)], {'expireAfterSeconds': 24 * 3600}),
+]
+
+# Collections that need creation options (capped, ...); created before their indexes
+COLLECTION_SPECS = [
+    activity_collection_spec(),
+]
+
+
+def configure_db(mongo_uri=None):
+    """
+    Remember the connection string without connecting.
+    The client is created on the first get_db() call.
+    """
+    global _mongo_uri
+    _mongo_uri = mongo_uri
+
+
+# Durability tiers for writes; the client default is 'critical'
+#   critical   majority + journal: accounts, workspaces, membership, anything not re-creatable
+#   standard   primary journal: tasks, documents, chat; survive a primary restart,
+#              may roll back if the primary fails over before replicating
+#   ephemeral  primary only, no journal wait: presence, last_seen, active editors
+WRITE_TIERS = {
+    'critical': WriteConcern(w='majority', j=True),
+    'standard': WriteConcern(w=1, j=True),
+    'ephemeral': WriteConcern(w=1, j=False)
+}
+
+# Read tiers. 'secondary' suits listings and history that tolerate a little
+# lag; never use it where a response is validated against an ETag version.
+MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 90))  # server minimum is 90
+READ_TIERS = {
+    'primary': ReadPreference.PRIMARY,
+    'secondary': SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)
+}
+
+
+def _create_client(mongo_uri, pool):
+    """MongoClient for one of POOL_SETTINGS; connects in the background"""
+    settings = POOL_SETTINGS[pool]
+
+    try:
+        return MongoClient(
+            mongo_uri,
+            serverSelectionTimeoutMS=10000,
+            connectTimeoutMS=10000,
+            retryWrites=True,
+            retryReads=True,
+            w='majority',
+            journal=True,
+            connect=False,
+            appname=f'syncspace-{pool}',
+            event_listeners=[pool_listener(pool), breaker_listener] + ([query_profiler] if PROFILER_ENABLED else []),
+            **settings
+        )
+    except ConfigurationError as e:
+        print(f"❌ MongoDB configuration error: {str(e)}")
+        raise ConfigurationError(f"Invalid MongoDB URI or configuration: {str(e)}")
+
+
+def _resolve_uri(mongo_uri=None):
+    # Parameter, then configure_db(), then environment
+    return mongo_uri or _mongo_uri or os.getenv('MONGO_URI', 'mongodb://localhost:27017/syncspace')
+
+
+def init_db(mongo_uri=None, build_indexes=True):
     """
-    Initialize database connection with retry logic
+    Create the interactive MongoDB client (once, thread-safe) and schedule index migrations.
+
+    The client connects in the background, so this never blocks on the
+    network; the first query waits for server selection instead.
     """
     global _db, _client
-    
+
     if _db is not None:
         return _db
-    
-    # Get MongoDB URI from environment or parameter
-    if mongo_uri is None:
-        mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/syncspace')
-    
-    # SIMPLIFIED FIX: Just use 'syncspace' as database name
-    # Don't try to parse it from URI - it's unreliable
-    db_name = 'syncspace'
-    
-    print(f"📂 Using database: {db_name}")
-    
-    # Connection with retry logic
-    for attempt in range(max_retries):
-        try:
-            print(f"🔄 Connecting to MongoDB (Attempt {attempt + 1}/{max_retries})...")
-            
-            # Create MongoDB client with production-ready settings
-            _client = MongoClient(
-                mongo_uri,
-                serverSelectionTimeoutMS=10000,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=10000,
-                maxPoolSize=50,
-                minPoolSize=10,
-                retryWrites=True,
-                retryReads=True,
-                w='majority',
-                journal=True
-            )
-            
-            # Test connection
-            _client.admin.command('ping')
-            
-            # Get database instance - ALWAYS use 'syncspace'
-            _db = _client[db_name]
-            
-            print(f"✅ MongoDB connected successfully!")
-            print(f"📂 Database: {db_name}")
-            print(f"🌍 Server: MongoDB Atlas")
-            
-            # Create indexes for performance
-            try:
-                create_indexes()
-            except Exception as idx_error:
-                print(f"⚠️ Index creation warning: {idx_error}")
-            
+
+    with _init_lock:
+        if _db is not None:
             return _db
-            
-        except (ServerSelectionTimeoutError, ConnectionFailure) as e:
-            if attempt < max_retries - 1:
-                print(f"⚠️ Connection attempt {attempt + 1} failed. Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
-            else:
-                print(f"❌ Failed to connect to MongoDB after {max_retries} attempts")
-                print(f"❌ Error: {str(e)}")
-                raise ConnectionError(f"Could not connect to MongoDB: {str(e)}")
-        
-        except ConfigurationError as e:
-            print(f"❌ MongoDB configuration error: {str(e)}")
-            raise ConfigurationError(f"Invalid MongoDB URI or configuration: {str(e)}")
-        
-        except Exception as e:
-            print(f"❌ Unexpected database error: {str(e)}")
-            raise RuntimeError(f"Database initialization failed: {str(e)}")
-    
-    return None
 
+        client = _create_client(_resolve_uri(mongo_uri), 'interactive')
+        _client = client
+        _db = client[DB_NAME]
+        print(f"📂 Using database: {DB_NAME}")
+
+    if build_indexes:
+        threading.Thread(target=create_indexes, name='index-migrations', daemon=True).start()
+
+    return _db
+
+
+def _init_bulk_db():
+    """Create the bulk-pool client on first use"""
+    global _bulk_db, _bulk_client
+
+    with _init_lock:
+        if _bulk_db is None:
+            _bulk_client = _create_client(_resolve_uri(), 'bulk')
+            _bulk_db = _bulk_client[DB_NAME]
+
+    return _bulk_db
+
+
+def get_db(pool='interactive', write=None, read=None):
+    """
+    Get database instance (lazy initialization).
+
+    Pass pool='bulk' for deletes, bulk updates and aggregations that touch
+    many documents; they then queue on their own small pool instead of
+    holding connections request handlers need.
+
+    write selects a WRITE_TIERS durability level and read a READ_TIERS
+    preference, e.g. get_db(write='ephemeral') for presence updates or
+    get_db(read='secondary') for chat history.
+
+    Raises DatabaseUnavailable immediately while the circuit breaker is open,
+    so callers fail fast instead of waiting out server selection.
+    """
+    if not db_breaker.allow():
+        raise DatabaseUnavailable(f"Database unavailable (circuit {db_breaker.state})")
+
+    if write is not None or read is not None:
+        return _get_tiered_db(pool, write, read)
+
+    if pool == 'bulk':
+        return _bulk_db if _bulk_db is not None else _init_bulk_db()
 
-def get_db():
-    """Get database instance (lazy initialization)"""
-    global _db
-    
     if _db is None:
         try:
             return init_db()
         except Exception as e:
             print(f"❌ Error getting database: {str(e)}")
             raise RuntimeError(f"Database not initialized. Error: {str(e)}")
-    
+
     return _db
 
 
+def _get_tiered_db(pool, write, read):
+    """Database handle with a tier's write concern / read preference, cached per client"""
+    base = get_db(pool)
+    key = (id(base), write, read)
+
+    db = _tiered.get(key)
+    if db is None:
+        db = base.with_options(
+            write_concern=WRITE_TIERS[write] if write else None,
+            read_preference=READ_TIERS[read] if read else None
+        )
+        _tiered[key] = db
+
+    return db
+
+
 def close_db():
     """Close database connection gracefully"""
-    global _db, _client
-    
-    if _client is not None:
-        try:
-            _client.close()
-            _db = None
-            _client = None
-            print("✅ Database connection closed successfully")
-        except Exception as e:
-            print(f"⚠️ Error closing database: {str(e)}")
+    global _db, _client, _bulk_db, _bulk_client
+
+    with _init_lock:
+        for client in (_client, _bulk_client):
+            if client is None:
+                continue
+            try:
+                client.close()
+                print("✅ Database connection closed successfully")
+            except Exception as e:
+                print(f"⚠️ Error closing database: {str(e)}")
+        _db = _client = None
+        _bulk_db = _bulk_client = None
+        _tiered.clear()
 
 
 def check_connection():
     """Check if database connection is alive"""
     global _client
-    
+
     if _client is None:
         return False
-    
+
     try:
         _client.admin.command('ping')
         return True
@@ -132,70 +306,122 @@ def check_connection():
 
 def reconnect():
     """Reconnect to database"""
-    global _db, _client
-    
     print("🔄 Reconnecting to database...")
     close_db()
-    _db = None
-    _client = None
-    return init_db()
+    return init_db(build_indexes=False)
+
+
+def index_spec_id(collection, keys, options):
+    """Stable identifier of an index spec; changes whenever the spec changes"""
+    spec = json.dumps([collection, keys, options], sort_keys=True)
+    return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+
+def create_collection_spec(db, name, options):
+    """Create a collection with options, converting it if it already exists uncapped"""
+    try:
+        db.create_collection(name, **options)
+    except CollectionInvalid:
+        # Written to before this migration ran, e.g. by a request during the first boot
+        if options.get('capped') and not db[name].options().get('capped'):
+            db.command('convertToCapped', name, size=options['size'])
+
+
+def create_index_spec(db, collection, keys, options):
+    """Create an index, rebuilding one on the same keys whose options changed"""
+    try:
+        return db[collection].create_index(keys, **options)
+    except OperationFailure as e:
+        # IndexOptionsConflict / IndexKeySpecsConflict, e.g. an index made unique
+        if e.code not in (85, 86):
+            raise
+        db[collection].drop_index(keys)
+        return db[collection].create_index(keys, **options)
+
+
+def _record_migration(db, spec_id, document):
+    db.schema_migrations.replace_one(
+        {'_id': spec_id},
+        {'_id': spec_id, **document, 'applied_at': datetime.utcnow()},
+        upsert=True
+    )
 
 
 def create_indexes():
-    """Create database indexes for performance optimization"""
-    global _db
-    
-    if _db is None:
+    """
+    Apply pending collection and index migrations.
+
+    Each spec in COLLECTION_SPECS and INDEX_SPECS is recorded in
+    schema_migrations once applied, so a normal boot costs a single find()
+    instead of a create_index per index. A spec that fails is logged and
+    skipped without holding up the others; whatever is left pending is
+    retried the next time the circuit breaker closes.
+    """
+    global _migrations_pending
+
+    db = _db
+    if db is None:
         return
-    
+
+    _migrations_pending = False
     try:
-        # Users collection indexes
-        _db.users.create_index('email', unique=True)
-        _db.users.create_index('created_at')
-        
-        # Workspaces collection indexes
-        _db.workspaces.create_index('created_by')
-        _db.workspaces.create_index('members.user_id')
-        _db.workspaces.create_index('created_at')
-        
-        # Tasks collection indexes
-        _db.tasks.create_index('workspace_id')
-        _db.tasks.create_index('project_id')
-        _db.tasks.create_index('assigned_to')
-        _db.tasks.create_index([('workspace_id', 1), ('status', 1)])
-        
-        # Documents collection indexes
-        _db.documents.create_index('workspace_id')
-        _db.documents.create_index('created_by')
-        _db.documents.create_index('updated_at')
-        
-        # Messages collection indexes
-        _db.messages.create_index('workspace_id')
-        _db.messages.create_index([('workspace_id', 1), ('created_at', -1)])
-        
-        # Files collection indexes
-        _db.files.create_index('workspace_id')
-        _db.files.create_index('uploaded_by')
-        _db.files.create_index('created_at')
-        
-        # Notifications collection indexes
-        _db.notifications.create_index('user_id')
-        _db.notifications.create_index([('user_id', 1), ('read', 1)])
-        _db.notifications.create_index('created_at')
-        
-        print("✅ Database indexes created successfully")
-        
+        applied = {doc['_id'] for doc in db.schema_migrations.find({}, {'_id': 1})}
     except Exception as e:
-        print(f"⚠️ Index creation warning: {str(e)}")
+        _migrations_pending = True
+        print(f"⚠️ Could not read schema migrations: {e}")
+        return
+
+    pending_collections = [
+        (index_spec_id(name, 'collection', options), name, options) for name, options in COLLECTION_SPECS
+        if index_spec_id(name, 'collection', options) not in applied
+    ]
+    pending = [
+        (index_spec_id(*spec), spec) for spec in INDEX_SPECS
+        if index_spec_id(*spec) not in applied
+    ]
+
+    if not pending and not pending_collections:
+        print("✅ Database indexes up to date")
+        return
+
+    failed = 0
+    for spec_id, name, options in pending_collections:
+        try:
+            create_collection_spec(db, name, options)
+            _record_migration(db, spec_id, {'collection': name, 'options': options})
+        except Exception as e:
+            failed += 1
+            print(f"⚠️ Collection migration for {name} failed: {e}")
+
+    for spec_id, (collection, keys, options) in pending:
+        try:
+            name = create_index_spec(db, collection, keys, options)
+            _record_migration(db, spec_id, {'collection': collection, 'keys': keys, 'options': options, 'name': name})
+        except Exception as e:
+            failed += 1
+            print(f"⚠️ Index migration {collection} {keys} failed: {e}")
+
+    applied_count = len(pending_collections) + len(pending) - failed
+    if failed:
+        _migrations_pending = True
+        print(f"⚠️ Applied {applied_count} migrations; {failed} failed and will be retried once the database recovers")
+    else:
+        print(f"✅ Applied {len(pending_collections)} collection and {len(pending)} index migrations")
+
+
+def retry_pending_migrations():
+    """Re-run create_indexes in the background if an earlier run left specs pending"""
+    if _migrations_pending:
+        threading.Thread(target=create_indexes, name='index-migrations', daemon=True).start()
 
 
 def get_stats():
     """Get database statistics"""
     global _db, _client
-    
+
     if _db is None or _client is None:
         return {"error": "Database not connected"}
-    
+
     try:
         stats = {
             "connected": check_connection(),
@@ -206,3 +432,759 @@ def get_stats():
         return stats
     except Exception as e:
         return {"error": str(e)}
+
+
+# ==================== CIRCUIT BREAKER ====================
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('DB_BREAKER_FAILURES', 3))
+BREAKER_RESET_SECONDS = float(os.getenv('DB_BREAKER_RESET_SECONDS', 2))
+BREAKER_MAX_RESET_SECONDS = float(os.getenv('DB_BREAKER_MAX_RESET_SECONDS', 30))
+BREAKER_PROBE_TIMEOUT = float(os.getenv('DB_BREAKER_PROBE_TIMEOUT', 2))
+BREAKER_RECONNECT_EVERY = int(os.getenv('DB_BREAKER_RECONNECT_EVERY', 5))
+DEFERRED_WRITES_MAX = int(os.getenv('DB_DEFERRED_WRITES_MAX', 10000))
+
+NETWORK_ERRORS = {'AutoReconnect', 'ConnectionFailure', 'NetworkTimeout', 'ServerSelectionTimeoutError'}
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+circuit_state = Gauge('mongo_circuit_state', 'MongoDB circuit breaker state (0 closed, 1 half-open, 2 open)')
+circuit_transitions = Counter(
+    'mongo_circuit_transitions_total', 'MongoDB circuit breaker state changes', ('from_state', 'to_state')
+)
+deferred_writes = Counter('mongo_deferred_writes_total', 'Writes queued while the database was unavailable', ('outcome',))
+
+
+class DatabaseUnavailable(RuntimeError):
+    """Raised by get_db() while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed → open after BREAKER_FAILURE_THRESHOLD consecutive failures (or at
+    once when the driver loses the primary). While open, a single background
+    thread sleeps with exponential backoff, moves to half-open and pings; a
+    successful ping closes the circuit, flushes deferred writes and retries
+    migrations that failed while the database was away.
+
+    allow() is a plain attribute read so the closed path costs nothing.
+    """
+
+    def __init__(self):
+        self.state = 'closed'
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        circuit_state.set(value=0)
+
+    def allow(self):
+        return self.state == 'closed'
+
+    def retry_after(self):
+        """Seconds until the next probe, for Retry-After headers"""
+        return max(1, math.ceil(self._retry_at - time.monotonic()))
+
+    def record_success(self):
+        if self._failures:
+            self._failures = 0
+
+    def record_failure(self, reason):
+        with self._lock:
+            if self.state != 'closed':
+                return
+            self._failures += 1
+            if self._failures >= BREAKER_FAILURE_THRESHOLD:
+                self._open(reason)
+
+    def trip(self, reason):
+        with self._lock:
+            if self.state == 'closed':
+                self._open(reason)
+
+    def _transition(self, state, reason):
+        previous, self.state = self.state, state
+        circuit_state.set(value=CIRCUIT_STATE_VALUES[state])
+        circuit_transitions.inc(previous, state)
+        print(f"🔌 Database circuit {previous} → {state}: {reason}")
+
+    def _open(self, reason):
+        self._transition('open', reason)
+        self._retry_at = time.monotonic() + BREAKER_RESET_SECONDS
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='db-circuit-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        delay = BREAKER_RESET_SECONDS
+        attempts = 0
+
+        while True:
+            self._retry_at = time.monotonic() + delay
+            time.sleep(delay)
+
+            with self._lock:
+                self._transition('half_open', 'probing')
+
+            attempts += 1
+            try:
+                if _client is None or attempts % BREAKER_RECONNECT_EVERY == 0:
+                    reconnect()
+                with pymongo.timeout(BREAKER_PROBE_TIMEOUT):
+                    _client.admin.command('ping')
+            except Exception as e:
+                delay = min(delay * 2, BREAKER_MAX_RESET_SECONDS)
+                with self._lock:
+                    self._transition('open', f'probe failed ({type(e).__name__})')
+                continue
+
+            with self._lock:
+                self._failures = 0
+                self._probe_thread = None
+                self._transition('closed', f'probe succeeded after {attempts} attempts')
+            flush_deferred_writes()
+            retry_pending_migrations()
+            return
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'deferred_writes': len(_deferred)
+        }
+
+
+class BreakerListener(monitoring.ServerHeartbeatListener, monitoring.TopologyListener, monitoring.CommandListener):
+    """Feeds driver-level failures into the circuit breaker"""
+
+    # Heartbeats catch an unreachable server even when no request is running
+    def failed(self, event):
+        if isinstance(event, monitoring.ServerHeartbeatFailedEvent):
+            db_breaker.record_failure(f'heartbeat failed ({type(event.reply).__name__})')
+        elif event.failure.get('errtype') in NETWORK_ERRORS:
+            db_breaker.record_failure(f'{event.command_name} failed ({event.failure["errtype"]})')
+
+    def succeeded(self, event):
+        db_breaker.record_success()
+
+    def description_changed(self, event):
+        if event.previous_description.has_writable_server() and not event.new_description.has_writable_server():
+            db_breaker.trip('no writable server in topology')
+
+    def started(self, event):
+        pass
+
+    def opened(self, event):
+        pass
+
+    def closed(self, event):
+        pass
+
+
+db_breaker = CircuitBreaker()
+breaker_listener = BreakerListener()
+
+_deferred = deque()
+_deferred_lock = threading.Lock()
+
+
+def defer_write(collection, document):
+    """
+    Queue an insert to replay once the circuit closes.
+
+    Documents keep their _id, so a replay of a write that actually landed is
+    dropped as a duplicate instead of inserted twice.
+    """
+    with _deferred_lock:
+        if len(_deferred) >= DEFERRED_WRITES_MAX:
+            _deferred.popleft()
+            deferred_writes.inc('dropped')
+        _deferred.append((collection, document))
+    deferred_writes.inc('queued')
+
+
+def flush_deferred_writes():
+    """Replay inserts queued by defer_write(); called when the circuit closes"""
+    with _deferred_lock:
+        pending = list(_deferred)
+        _deferred.clear()
+
+    if not pending:
+        return
+
+    by_collection = {}
+    for collection, document in pending:
+        by_collection.setdefault(collection, []).append(document)
+
+    for collection, documents in by_collection.items():
+        try:
+            _db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean the original write made it after all
+            if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+                print(f"⚠️ Deferred writes to {collection} partially failed: {e.details.get('writeErrors', [])[:3]}")
+        except ConnectionFailure as e:
+            print(f"⚠️ Database dropped again while flushing deferred writes: {e}")
+            with _deferred_lock:
+                _deferred.extendleft(reversed(pending))
+            return
+
+    deferred_writes.inc('flushed', amount=len(pending))
+    print(f"✅ Flushed {len(pending)} deferred writes")
+
+
+# ==================== QUERY PROFILER ====================
+
+PROFILER_ENABLED = os.getenv('QUERY_PROFILER', 'true').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 50))
+EXPLAIN_INTERVAL_SECONDS = int(os.getenv('EXPLAIN_INTERVAL_SECONDS', 300))
+MAX_QUERY_SHAPES = 500
+
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists', '$regex'}
+IGNORED_COMMANDS = {
+    'hello', 'ismaster', 'isMaster', 'ping', 'buildInfo', 'endSessions',
+    'explain', 'killCursors', 'saslStart', 'saslContinue', 'listIndexes',
+    'listCollections', 'createIndexes', 'serverStatus'
+}
+
+
+def _classify_filter(query, fields, prefix=''):
+    """Map each filtered field to 'eq' or 'range' (values are dropped)"""
+    for key, value in (query or {}).items():
+        if key in ('$or', '$and', '$nor'):
+            for clause in value:
+                _classify_filter(clause, fields, prefix)
+        elif key.startswith('$'):
+            continue
+        elif isinstance(value, dict) and any(op.startswith('$') for op in value):
+            kind = 'range' if RANGE_OPERATORS & set(value) else 'eq'
+            fields[prefix + key] = kind if fields.get(prefix + key) != 'range' else 'range'
+        else:
+            fields.setdefault(prefix + key, 'eq')
+    return fields
+
+
+def _command_shape(command_name, command):
+    """Extract (collection, filter, sort) from a command, or None if not a query"""
+    if command_name == 'find':
+        return command['find'], command.get('filter') or {}, command.get('sort')
+    if command_name == 'findAndModify':
+        return command['findAndModify'], command.get('query') or {}, command.get('sort')
+    if command_name == 'update' and command.get('updates'):
+        return command['update'], command['updates'][0].get('q') or {}, None
+    if command_name == 'delete' and command.get('deletes'):
+        return command['delete'], command['deletes'][0].get('q') or {}, None
+    if command_name in ('count', 'distinct'):
+        return command[command_name], command.get('query') or {}, None
+    if command_name == 'aggregate' and isinstance(command.get('aggregate'), str):
+        query, sort = {}, None
+        for stage in command.get('pipeline', []):
+            if '$match' in stage and not query:
+                query = stage['$match']
+            elif '$sort' in stage and sort is None:
+                sort = stage['$sort']
+            elif '$match' not in stage and '$sort' not in stage:
+                break
+        return command['aggregate'], query, sort
+    return None
+
+
+def _walk_plan(plan, stages):
+    if not isinstance(plan, dict):
+        return stages
+    stage = plan.get('stage')
+    if stage:
+        stages.append((stage, plan.get('indexName')))
+    for child in ('inputStage', 'queryPlan'):
+        _walk_plan(plan.get(child), stages)
+    for child in plan.get('inputStages', []):
+        _walk_plan(child, stages)
+    return stages
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Command listener that aggregates latency per query shape.
+
+    A shape is the collection, command, filtered fields (equality vs. range)
+    and sort keys, with values removed. Shapes slower than SLOW_QUERY_MS get
+    an explain('executionStats') sampled on a background thread at most
+    every EXPLAIN_INTERVAL_SECONDS, which supplies keys/docs examined and
+    the winning plan for the index advisor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._cursors = {}
+        self._shapes = {}
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._explain_thread = None
+
+    # -------- listener callbacks (run inline with every command) --------
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+
+        if event.command_name == 'getMore':
+            cursor_id = event.command.get('getMore')
+            shape_key = self._cursors.get(cursor_id)
+            if shape_key:
+                self._inflight[(event.connection_id, event.request_id)] = (shape_key, None, cursor_id)
+            return
+
+        extracted = _command_shape(event.command_name, event.command)
+        if extracted is None:
+            return
+
+        collection, query, sort = extracted
+        fields = _classify_filter(query, {})
+        sort_keys = list(sort.items()) if isinstance(sort, dict) else (sort or [])
+        shape_key = json.dumps([collection, event.command_name, sorted(fields.items()), sort_keys])
+
+        with self._lock:
+            if shape_key not in self._shapes:
+                if len(self._shapes) >= MAX_QUERY_SHAPES:
+                    return
+                self._shapes[shape_key] = {
+                    'collection': collection,
+                    'command': event.command_name,
+                    'filter_fields': fields,
+                    'sort': sort_keys,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'slow_count': 0,
+                    'docs_returned': 0,
+                    'sample_filter': query,
+                    'explain': None,
+                    'explained_at': 0
+                }
+
+        self._inflight[(event.connection_id, event.request_id)] = (shape_key, event.database_name, None)
+
+    def succeeded(self, event):
+        inflight = self._inflight.pop((event.connection_id, event.request_id), None)
+        if inflight is None:
+            return
+
+        shape_key, database_name, cursor_id = inflight
+        duration_ms = event.duration_micros / 1000.0
+        reply = event.reply or {}
+        cursor = reply.get('cursor') or {}
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        returned = len(batch) if batch is not None else reply.get('n', 0)
+
+        # Remember open cursors so getMore batches count towards their shape
+        if cursor.get('id'):
+            if len(self._cursors) > 10000:
+                self._cursors.clear()
+            self._cursors[cursor['id']] = shape_key
+        elif cursor_id is not None:
+            self._cursors.pop(cursor_id, None)
+
+        with self._lock:
+            shape = self._shapes.get(shape_key)
+            if shape is None:
+                return
+            if database_name is not None:
+                shape['count'] += 1
+            shape['total_ms'] += duration_ms
+            shape['max_ms'] = max(shape['max_ms'], duration_ms)
+            shape['docs_returned'] += returned
+
+            needs_explain = (
+                duration_ms >= SLOW_QUERY_MS
+                and database_name is not None
+                and time.time() - shape['explained_at'] > EXPLAIN_INTERVAL_SECONDS
+            )
+            if duration_ms >= SLOW_QUERY_MS:
+                shape['slow_count'] += 1
+            if needs_explain:
+                shape['explained_at'] = time.time()
+
+        if needs_explain:
+            self._schedule_explain(shape_key, database_name)
+
+    def failed(self, event):
+        self._inflight.pop((event.connection_id, event.request_id), None)
+
+    # -------- explain sampling --------
+
+    def _schedule_explain(self, shape_key, database_name):
+        try:
+            self._explain_queue.put_nowait((shape_key, database_name))
+        except queue.Full:
+            return
+
+        if self._explain_thread is None or not self._explain_thread.is_alive():
+            self._explain_thread = threading.Thread(
+                target=self._explain_worker, name='query-explain', daemon=True
+            )
+            self._explain_thread.start()
+
+    def _explain_worker(self):
+        while True:
+            shape_key, database_name = self._explain_queue.get()
+            shape = self._shapes.get(shape_key)
+            if shape is None or _client is None:
+                continue
+
+            find = {'find': shape['collection'], 'filter': shape['sample_filter']}
+            if shape['sort']:
+                find['sort'] = dict(shape['sort'])
+
+            try:
+                result = _client[database_name].command(
+                    {'explain': find, 'verbosity': 'executionStats'}
+                )
+            except Exception as e:
+                print(f"⚠️ Explain failed for {shape['collection']}: {e}")
+                continue
+
+            stats = result.get('executionStats', {})
+            stages = _walk_plan(result.get('queryPlanner', {}).get('winningPlan'), [])
+
+            with self._lock:
+                shape['explain'] = {
+                    'keys_examined': stats.get('totalKeysExamined'),
+                    'docs_examined': stats.get('totalDocsExamined'),
+                    'returned': stats.get('nReturned'),
+                    'execution_ms': stats.get('executionTimeMillis'),
+                    'stages': [stage for stage, _ in stages],
+                    'indexes': [index for _, index in stages if index]
+                }
+
+    # -------- reporting --------
+
+    def snapshot(self):
+        with self._lock:
+            shapes = [dict(shape) for shape in self._shapes.values()]
+        for shape in shapes:
+            shape.pop('sample_filter', None)
+            shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 2) if shape['count'] else 0
+        return sorted(shapes, key=lambda shape: shape['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+
+
+query_profiler = QueryProfiler()
+
+
+def recommend_index(shape, existing_indexes=()):
+    """
+    Suggest an index for a shape using the Equality, Sort, Range rule.
+
+    Returns None when the shape needs no index or an existing index already
+    starts with the suggested key prefix.
+    """
+    fields = shape['filter_fields']
+    keys = [(field, 1) for field, kind in sorted(fields.items()) if kind == 'eq']
+    keys += [(field, direction) for field, direction in shape['sort'] if field not in dict(keys)]
+    keys += [(field, 1) for field, kind in sorted(fields.items()) if kind == 'range' and field not in dict(keys)]
+
+    if not keys or keys == [('_id', 1)]:
+        return None
+
+    for existing in existing_indexes:
+        if list(existing[:len(keys)]) == keys:
+            return None
+
+    explain = shape.get('explain') or {}
+    stages = explain.get('stages', [])
+    reasons = []
+    if 'COLLSCAN' in stages:
+        reasons.append('collection scan')
+    if 'SORT' in stages:
+        reasons.append('in-memory sort')
+    if explain.get('returned') and (explain.get('docs_examined') or 0) > 10 * explain['returned']:
+        reasons.append(f"examined {explain['docs_examined']} docs for {explain['returned']} returned")
+
+    if explain and not reasons:
+        return None
+
+    return {
+        'collection': shape['collection'],
+        'keys': keys,
+        'reason': ', '.join(reasons) or 'no explain sample yet'
+    }
+
+
+def get_query_report(slow_only=False):
+    """Per-shape latency report with index recommendations"""
+    shapes = query_profiler.snapshot()
+    if slow_only:
+        shapes = [shape for shape in shapes if shape['slow_count']]
+
+    existing = {}
+    recommendations = []
+
+    for shape in shapes:
+        if not shape['slow_count'] or shape['command'] not in ('find', 'findAndModify', 'update', 'delete', 'count', 'aggregate'):
+            continue
+
+        collection = shape['collection']
+        if collection not in existing and _db is not None:
+            try:
+                existing[collection] = [
+                    [tuple(key) for key in info['key']]
+                    for info in _db[collection].index_information().values()
+                ]
+            except Exception:
+                existing[collection] = []
+
+        recommendation = recommend_index(shape, existing.get(collection, []))
+        if recommendation and recommendation not in recommendations:
+            recommendations.append(recommendation)
+
+    return {
+        'slow_query_ms': SLOW_QUERY_MS,
+        'shapes': shapes,
+        'recommendations': recommendations
+    }
+
+
+# ==================== CHANGE STREAM INVALIDATION ====================
+
+# Resume tokens are kept per process (host:pid by default), so workers on one host never share one.
+# A restarted process only resumes if this is set to a stable id per worker (e.g. host plus worker slot).
+CHANGE_WATCHER_ID = os.getenv('CHANGE_WATCHER_ID')
+CHANGE_TOKEN_SAVE_SECONDS = 10
+CHANGE_RETRY_SECONDS = 5
+# "The $changeStream stage is only supported on replica sets" (standalone server)
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# Operations after which nothing about the collection can be trusted
+FLUSH_OPERATIONS = {'drop', 'rename', 'dropDatabase', 'invalidate'}
+
+cache_lookups = Counter('cache_lookups_total', 'In-process cache lookups', ('cache', 'outcome'))
+cache_invalidations = Counter('cache_invalidations_total', 'In-process cache entries invalidated by change events', ('cache',))
+change_events = Counter('mongo_change_events_total', 'Change stream events dispatched to caches', ('collection', 'operation'))
+change_watcher_active = Gauge('mongo_change_watcher_active', 'Whether the change stream watcher is following the database')
+
+
+class ChangeWatcher:
+    """
+    Follows one change stream over every collection that has a registered
+    cache and calls its invalidation callbacks.
+
+    Callbacks get the changed document's _id, or None when the whole
+    collection must be dropped: after a drop or rename, and whenever the
+    stream was down, since changes may have been missed meanwhile. While the
+    watcher is not active, WatchedCache bypasses itself, so a deployment
+    without a replica set (change streams need one) still reads fresh data.
+
+    The resume token is stored in change_stream_tokens every
+    CHANGE_TOKEN_SAVE_SECONDS. Resuming after a restart needs
+    CHANGE_WATCHER_ID set to a stable id per worker: the default includes
+    the pid, so a new process starts from now (after flushing its caches,
+    which are empty anyway). Tokens nobody saved for a day expire. If the
+    oplog no longer reaches back to a token, the watcher starts from now.
+
+    To try it locally, run a single-node replica set
+    (mongod --replSet rs0, then rs.initiate()) and point MONGO_URI at it.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.watcher_id = None
+        self._callbacks = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        change_watcher_active.set(value=0)
+
+    def register(self, collection, callback):
+        with self._lock:
+            self._callbacks.setdefault(collection, []).append(callback)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self._callbacks:
+                return
+            self._thread = threading.Thread(target=self._run, name='change-watcher', daemon=True)
+            self._thread.start()
+
+    def _set_active(self, active):
+        if active != self.active:
+            self.active = active
+            change_watcher_active.set(value=int(active))
+            print(f"{'👁️ Change watcher following' if active else '⚠️ Change watcher stopped following'} {', '.join(self._callbacks)}")
+        if not active:
+            self._flush_all()
+
+    def _flush_all(self):
+        for callbacks in self._callbacks.values():
+            for callback in callbacks:
+                callback(None)
+
+    def _dispatch(self, change):
+        collection = change.get('ns', {}).get('coll')
+        operation = change['operationType']
+        change_events.inc(collection or '*', operation)
+
+        if operation in FLUSH_OPERATIONS:
+            targets = self._callbacks.values() if collection is None else [self._callbacks.get(collection, [])]
+            for callbacks in targets:
+                for callback in callbacks:
+                    callback(None)
+            return
+
+        document_id = change.get('documentKey', {}).get('_id')
+        for callback in self._callbacks.get(collection, []):
+            callback(document_id)
+
+    def _save_token(self, db, token):
+        db.change_stream_tokens.replace_one(
+            {'_id': self.watcher_id},
+            {'_id': self.watcher_id, 'token': token, 'saved_at': datetime.utcnow()},
+            upsert=True
+        )
+
+    def _follow(self, db, token):
+        pipeline = [
+            {'$match': {'$or': [{'ns.coll': {'$in': list(self._callbacks)}}, {'operationType': {'$in': list(FLUSH_OPERATIONS)}}]}},
+            {'$project': {'operationType': 1, 'ns': 1, 'documentKey': 1}}
+        ]
+        with db.watch(pipeline, resume_after=token, max_await_time_ms=1000) as stream:
+            self._set_active(True)
+            saved_at = time.monotonic()
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    self._dispatch(change)
+                    if change['operationType'] == 'invalidate':
+                        return None
+                if time.monotonic() - saved_at >= CHANGE_TOKEN_SAVE_SECONDS and stream.resume_token:
+                    self._save_token(db, stream.resume_token)
+                    saved_at = time.monotonic()
+            return stream.resume_token
+
+    def _run(self):
+        # Taken in the worker itself; the module may have been imported before the fork
+        self.watcher_id = CHANGE_WATCHER_ID or f'{socket.gethostname()}:{os.getpid()}'
+        token = None
+        try:
+            stored = get_db().change_stream_tokens.find_one({'_id': self.watcher_id})
+            token = stored['token'] if stored else None
+        except Exception as e:
+            print(f"⚠️ Could not load change stream resume token: {e}")
+
+        while True:
+            try:
+                token = self._follow(get_db(), token)
+            except pymongo.errors.OperationFailure as e:
+                self._set_active(False)
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    print(f"⚠️ Change streams unavailable ({e}); in-process caches disabled")
+                    return
+                if token is not None:
+                    # Resume point fell off the oplog (or is otherwise unusable): start from now
+                    print(f"⚠️ Change stream could not resume ({e.code}); starting from now")
+                    token = None
+                    continue
+                print(f"⚠️ Change stream failed ({e}); retrying")
+            except Exception as e:
+                if not isinstance(e, DatabaseUnavailable):
+                    print(f"⚠️ Change stream interrupted: {e}")
+                self._set_active(False)
+            else:
+                self._set_active(False)
+            time.sleep(CHANGE_RETRY_SECONDS)
+
+
+change_watcher = ChangeWatcher()
+
+
+class WatchedCache:
+    """
+    In-process cache whose entries are dropped when their document changes.
+
+    Entries are grouped by the _id of the document they were derived from
+    (get(document_id, key, load)); a change to that document drops the
+    group. With per_document=False any change in the collection clears the
+    whole cache, for values such as "workspaces of a user" that no single
+    document id identifies.
+
+    A generation counter per group stops a load that raced with an
+    invalidation from storing what it read before the change. Counters are
+    only kept while a load of the group is in flight, so documents that
+    change without ever being cached leave nothing behind.
+    """
+
+    def __init__(self, name, collection, per_document=True, max_entries=10000):
+        self.name = name
+        self.per_document = per_document
+        self.max_entries = max_entries
+        self._groups = {}
+        self._generations = {}
+        self._loading = {}
+        self._generation = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        change_watcher.register(collection, self.invalidate)
+
+    def _group_id(self, document_id):
+        return str(document_id) if self.per_document else None
+
+    def get(self, document_id, key, load):
+        if not change_watcher.active:
+            cache_lookups.inc(self.name, 'bypass')
+            return load()
+
+        group_id = self._group_id(document_id)
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is not None and key in group:
+                cache_lookups.inc(self.name, 'hit')
+                return group[key]
+            generation = (self._generation, self._generations.get(group_id, 0))
+            self._loading[group_id] = self._loading.get(group_id, 0) + 1
+
+        cache_lookups.inc(self.name, 'miss')
+        try:
+            value = load()
+        except Exception:
+            with self._lock:
+                self._finish_load(group_id)
+            raise
+
+        with self._lock:
+            if change_watcher.active and generation == (self._generation, self._generations.get(group_id, 0)):
+                if self._size >= self.max_entries:
+                    self._clear()
+                group = self._groups.setdefault(group_id, {})
+                if key not in group:
+                    self._size += 1
+                group[key] = value
+            self._finish_load(group_id)
+        return value
+
+    def _finish_load(self, group_id):
+        remaining = self._loading.get(group_id, 0) - 1
+        if remaining > 0:
+            self._loading[group_id] = remaining
+        else:
+            self._loading.pop(group_id, None)
+            self._generations.pop(group_id, None)
+
+    def _clear(self):
+        self._groups.clear()
+        self._generations.clear()
+        self._generation += 1
+        self._size = 0
+
+    def invalidate(self, document_id=None):
+        with self._lock:
+            if document_id is None or not self.per_document:
+                dropped = self._size
+                self._clear()
+            else:
+                group_id = self._group_id(document_id)
+                group = self._groups.pop(group_id, None)
+                dropped = len(group) if group else 0
+                self._size -= dropped
+                # Only a load already in flight can store a value read before this change
+                if group_id in self._loading:
+                    self._generations[group_id] = self._generations.get(group_id, 0) + 1
+        if dropped:
+            cache_invalidations.inc(self.name, amount=dropped)
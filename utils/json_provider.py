@@ -0,0 +1,70 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId, Binary, Decimal128, Timestamp
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+
+def encode_bson(obj):
+    '''Encode BSON and other non-JSON types the way the API has always sent them'''
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Timestamp):
+        return obj.as_datetime().isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Binary):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    '''JSON provider that understands Mongo documents
+
+    Routes can hand raw cursor documents to ``jsonify``: ObjectIds become
+    strings and datetimes become ISO 8601, nested fields included. orjson
+    does the encoding when installed (it handles datetime natively and only
+    calls back for BSON types); otherwise the stdlib encoder is used.
+    '''
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=encode_bson).decode('utf-8')
+
+        kwargs.setdefault('default', encode_bson)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def dumps_bytes(self, obj):
+        '''Encode straight to UTF-8 bytes, skipping the str round trip'''
+        if orjson is not None:
+            return orjson.dumps(obj, default=encode_bson)
+        return self.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=encode_bson, option=orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype
+        )
@@ -0,0 +1,328 @@
+'''In-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are plain Python objects guarded by one lock
+each, so recording a sample costs a dict lookup, a bisect and an addition.
+Values that are cheap to read on demand (room sizes, in-flight requests,
+other modules' stats) are collected only when /metrics is scraped.
+'''
+import bisect
+import inspect
+import os
+import threading
+import time
+from functools import wraps
+from flask import g, request
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, labels, [], value) for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+
+        samples = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f'{self.name}_bucket', labels, [('le', le)], cumulative))
+            samples.append((f'{self.name}_sum', labels, [], total))
+            samples.append((f'{self.name}_count', labels, [], count))
+        return samples
+
+
+def register_collector(func):
+    '''Register a callable returning [(name, kind, help, [(labels_dict, value)])] at scrape time'''
+    _collectors.append(func)
+    return func
+
+
+def render_metrics():
+    '''Everything registered, in Prometheus text exposition format 0.0.4'''
+    lines = []
+
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, extra, value in metric.samples():
+            lines.append(f'{name}{_format_labels(metric.labelnames, labels, extra)} {value}')
+
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"⚠️ Metrics collector {collector.__name__} failed: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== HTTP ====================
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ('method', 'route', 'status')
+)
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests currently being handled')
+
+# Requests one worker can run at once (see gunicorn.conf.py): the gthread
+# pool size, or worker_connections greenlets under gevent. In-flight /
+# concurrency is saturation.
+WORKER_THREADS = int(os.getenv('THREADS', 100))
+WORKER_CONCURRENCY = (
+    int(os.getenv('WORKER_CONNECTIONS', 5000))
+    if os.getenv('SOCKETIO_ASYNC_MODE', 'threading') == 'gevent'
+    else WORKER_THREADS
+)
+
+
+def _before_request():
+    g._metrics_started = time.perf_counter()
+    g._metrics_in_flight = True
+    http_requests_in_flight.inc()
+
+
+def _after_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_duration.observe(
+            request.method, route, str(response.status_code),
+            value=time.perf_counter() - started
+        )
+    return response
+
+
+def _teardown_request(exc):
+    # Socket.IO events push request contexts too; only count real requests
+    if g.pop('_metrics_in_flight', False):
+        http_requests_in_flight.dec()
+
+
+@register_collector
+def _collect_worker_saturation():
+    in_flight = http_requests_in_flight.samples()
+    busy = in_flight[0][3] if in_flight else 0
+    return [
+        ('http_worker_threads', 'gauge', 'Concurrent requests (threads or greenlets) per worker', [({}, WORKER_CONCURRENCY)]),
+        ('http_worker_saturation', 'gauge', 'Fraction of request concurrency busy', [({}, round(busy / WORKER_CONCURRENCY, 4))])
+    ]
+
+
+# ==================== SOCKET.IO ====================
+
+socketio_events = Counter('socketio_events_total', 'Socket.IO events received', ('event',))
+socketio_event_errors = Counter('socketio_event_errors_total', 'Socket.IO handlers that raised', ('event',))
+socketio_event_duration = Histogram(
+    'socketio_event_duration_seconds', 'Socket.IO handler latency', ('event',)
+)
+socketio_emitted_packets = Counter('socketio_emitted_packets_total', 'Packets sent to clients')
+socketio_emitted_bytes = Counter('socketio_emitted_bytes_total', 'Payload bytes sent to clients')
+
+
+def _timed_handler(event, handler):
+    # Flask-SocketIO calls connect handlers with auth first and retries
+    # without it on TypeError; let that probe fail before anything is counted
+    signature = inspect.signature(handler) if event == 'connect' else None
+
+    @wraps(handler)
+    def timed(*args, **kwargs):
+        if signature is not None:
+            signature.bind(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            socketio_event_errors.inc(event)
+            raise
+        finally:
+            socketio_events.inc(event)
+            socketio_event_duration.observe(event, value=time.perf_counter() - started)
+    return timed
+
+
+def instrument_socketio(socketio):
+    '''Time every handler registered through socketio.on and count outgoing bytes
+
+    Must run before the @socketio.on handlers are defined.
+    '''
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+
+        def wrap(handler):
+            decorator(_timed_handler(message, handler))
+            return handler
+        return wrap
+
+    socketio.on = on
+
+    # Every packet, broadcast or direct, goes through engineio send_packet once per recipient
+    eio = socketio.server.eio
+    send_packet = eio.send_packet
+
+    def counting_send_packet(sid, pkt):
+        data = pkt.data
+        if isinstance(data, (str, bytes)):
+            socketio_emitted_bytes.inc(amount=len(data))
+        socketio_emitted_packets.inc()
+        return send_packet(sid, pkt)
+
+    eio.send_packet = counting_send_packet
+
+    @register_collector
+    def _collect_rooms():
+        rooms = socketio.server.manager.rooms.get('/', {})
+        clients = len(rooms.get(None, {}))
+        # Every client is alone in a room named after its sid; skip those
+        sizes = [len(members) for room, members in list(rooms.items()) if room is not None and room not in members]
+        return [
+            ('socketio_connected_clients', 'gauge', 'Connected Socket.IO clients', [({}, clients)]),
+            ('socketio_rooms', 'gauge', 'Rooms with at least one member', [({}, len(sizes))]),
+            ('socketio_room_members_max', 'gauge', 'Members in the largest room', [({}, max(sizes, default=0))]),
+            ('socketio_room_members_total', 'gauge', 'Room memberships across all rooms', [({}, sum(sizes))])
+        ]
+
+
+# ==================== MONGO POOL ====================
+
+mongo_checkout_wait = Histogram(
+    'mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', ('pool',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+mongo_checkout_failures = Counter(
+    'mongo_pool_checkout_failures_total', 'Connection checkouts that failed, by reason (timeout, connectionError, poolClosed)',
+    ('pool', 'reason')
+)
+mongo_connections_in_use = Gauge('mongo_pool_connections_in_use', 'Connections checked out right now', ('pool',))
+mongo_connections_open = Gauge('mongo_pool_connections_open', 'Connections open, idle or in use', ('pool',))
+mongo_pool_max_size = Gauge('mongo_pool_max_size', 'Configured maxPoolSize per server', ('pool',))
+mongo_pool_cleared = Counter('mongo_pool_cleared_total', 'Times the driver cleared a pool after an error', ('pool',))
+
+
+def pool_listener(pool='interactive'):
+    '''PyMongo ConnectionPoolListener feeding the pool metrics under the given pool label'''
+    from pymongo import monitoring
+
+    started = threading.local()
+
+    class PoolListener(monitoring.ConnectionPoolListener):
+        def connection_check_out_started(self, event):
+            started.at = time.perf_counter()
+
+        def connection_checked_out(self, event):
+            at = getattr(started, 'at', None)
+            if at is not None:
+                mongo_checkout_wait.observe(pool, value=time.perf_counter() - at)
+                started.at = None
+            mongo_connections_in_use.inc(pool)
+
+        def connection_check_out_failed(self, event):
+            at = getattr(started, 'at', None)
+            if at is not None:
+                mongo_checkout_wait.observe(pool, value=time.perf_counter() - at)
+                started.at = None
+            mongo_checkout_failures.inc(pool, event.reason)
+
+        def connection_checked_in(self, event):
+            mongo_connections_in_use.dec(pool)
+
+        def connection_created(self, event):
+            mongo_connections_open.inc(pool)
+
+        def connection_closed(self, event):
+            mongo_connections_open.dec(pool)
+
+        def pool_created(self, event):
+            mongo_pool_max_size.set(pool, value=event.options.get('maxPoolSize', 100))
+
+        def pool_cleared(self, event):
+            mongo_pool_cleared.inc(pool)
+
+        def pool_ready(self, event): pass
+        def pool_closed(self, event): pass
+        def connection_ready(self, event): pass
+
+    return PoolListener()
+
+
+def init_metrics(app):
+    '''Register request timing hooks on the Flask app'''
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
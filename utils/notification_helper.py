@@ -1,5 +1,6 @@
 from datetime import datetime
 from utils.db import get_db
+from utils.etag import bump_version, bump_versions
 
 def notify_workspace_members(workspace_id, message, notification_type='info', exclude_user_id=None):
     '''Send notification to all workspace members'''
@@ -34,6 +35,7 @@ def notify_workspace_members(workspace_id, message, notification_type='info', ex
             }
             
             db.notifications.insert_one(notification)
+            bump_version('notifications', user_id)
         
         return True
         
@@ -56,6 +58,7 @@ def notify_user(user_id, message, notification_type='info', workspace_id=None):
         }
         
         db.notifications.insert_one(notification)
+        bump_version('notifications', user_id)
         return True
         
     except Exception as e:
@@ -64,16 +67,17 @@ def notify_user(user_id, message, notification_type='info', workspace_id=None):
 
 def clear_old_notifications(days=30):
     '''Clear notifications older than specified days'''
-    db = get_db()
+    db = get_db(pool='bulk')
     
     try:
         from datetime import timedelta
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
+        query = {'created_at': {'$lt': cutoff_date}}
         
-        result = db.notifications.delete_many({
-            'created_at': {'$lt': cutoff_date}
-        })
+        user_ids = db.notifications.distinct('user_id', query)
+        result = db.notifications.delete_many(query)
+        bump_versions('notifications', user_ids)
         
         print(f'✓ Cleared {result.deleted_count} old notifications')
         return result.deleted_count
@@ -0,0 +1,172 @@
+'''Fractional ranks for ordering kanban cards within a column
+
+A rank is a base-62 string read as a fraction after the point ("V" ≈ 0.5),
+compared lexicographically. There is always a rank strictly between two
+others, so moving a card writes only that card. Ranks never end in "0",
+which keeps the space between any two of them open.
+
+Repeated inserts at the same spot make ranks grow about one character per
+six moves; once a rank passes REBALANCE_LENGTH its column is respaced in
+the background.
+
+A rank is only meaningful next to ranks of the same spacing, so every
+column has a version in kanban_columns. A rebalance bumps it and holds a
+short lock while it rewrites the column, then bumps it again; a move reads
+the version before placing its card and checks it afterwards, and places
+the card again if a rebalance ran in between (see place_card).
+'''
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from utils.db import get_db
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+REBALANCE_LENGTH = 12
+# A rebalance that dies mid-way stops blocking moves after this long
+REBALANCE_LOCK_SECONDS = 60
+MOVE_ATTEMPTS = 5
+MOVE_RETRY_SECONDS = 0.05
+
+# Column order for get_kanban; unranked (legacy) cards keep their old newest-first order
+COLUMN_SORT = [('status', 1), ('rank', 1), ('created_at', -1)]
+
+_rebalancing = set()
+_rebalancing_lock = threading.Lock()
+
+
+def _midpoint(low, high):
+    '''Key strictly between low ('' = 0) and high (None = 1)'''
+    if high is not None:
+        # Carry the common prefix over; low is padded with '0'
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else '0') == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+
+    # Adjacent digits: a longer high can be cut short, otherwise go one digit deeper
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def rank_between(before=None, after=None):
+    '''Rank for a card placed below ``before`` and above ``after`` (either may be None)'''
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f'rank {before!r} is not below {after!r}')
+    return _midpoint(before or '', after)
+
+
+def evenly_spaced_ranks(count):
+    '''``count`` ascending ranks spread over the whole key space, all equally short'''
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    step = BASE ** width / (count + 1)
+
+    ranks = []
+    for index in range(1, count + 1):
+        value = int(step * index)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append(''.join(reversed(digits)).rstrip('0'))
+    return ranks
+
+
+def _column_id(workspace_id, status):
+    return f'{workspace_id}:{status}'
+
+
+def column_version(db, workspace_id, status):
+    '''(version, rebalancing) of a column; compare before and after placing a card'''
+    column = db.kanban_columns.find_one({'_id': _column_id(workspace_id, status)})
+    if not column:
+        return 0, False
+    locked_until = column.get('locked_until')
+    return column.get('version', 0), locked_until is not None and locked_until > datetime.now()
+
+
+def place_card(db, workspace_id, status, place):
+    '''Run place() until no rebalance of the column overlapped it
+
+    place() reads the neighbouring ranks, writes the card and returns its
+    result, or None when the column is not ready (e.g. unranked cards) and
+    the attempt should simply be repeated. Returns the last result, or None
+    if every attempt overlapped a rebalance.
+    '''
+    for attempt in range(MOVE_ATTEMPTS):
+        if attempt:
+            time.sleep(MOVE_RETRY_SECONDS * 2 ** (attempt - 1))
+        version, rebalancing = column_version(db, workspace_id, status)
+        if rebalancing:
+            continue
+        result = place()
+        if result is not None and column_version(db, workspace_id, status) == (version, False):
+            return result
+    return None
+
+
+def rebalance_column(workspace_id, status):
+    '''Respace every card in a column, keeping the current order; ranks unranked cards'''
+    db = get_db(pool='bulk', write='standard')
+    column = {'_id': _column_id(workspace_id, status)}
+    db.kanban_columns.update_one(
+        column,
+        {
+            '$inc': {'version': 1},
+            '$set': {'locked_until': datetime.now() + timedelta(seconds=REBALANCE_LOCK_SECONDS)},
+            '$setOnInsert': {'workspace_id': workspace_id, 'status': status}
+        },
+        upsert=True
+    )
+
+    try:
+        cards = list(db.tasks.find(
+            {'workspace_id': workspace_id, 'status': status},
+            {'rank': 1}
+        ).sort([('rank', 1), ('created_at', -1)]))
+
+        if not cards:
+            return 0
+
+        # Match on the old rank; a card moved meanwhile is placed again by its move
+        db.tasks.bulk_write([
+            UpdateOne({'_id': card['_id'], 'rank': card.get('rank')}, {'$set': {'rank': rank}})
+            for card, rank in zip(cards, evenly_spaced_ranks(len(cards)))
+        ], ordered=False)
+        return len(cards)
+    finally:
+        db.kanban_columns.update_one(column, {'$inc': {'version': 1}, '$unset': {'locked_until': ''}})
+
+
+def schedule_rebalance(workspace_id, status, on_done=None):
+    '''Rebalance a column on a background thread, at most one run per column at a time'''
+    key = (workspace_id, status)
+    with _rebalancing_lock:
+        if key in _rebalancing:
+            return
+        _rebalancing.add(key)
+
+    def run():
+        try:
+            count = rebalance_column(workspace_id, status)
+            print(f"✓ Rebalanced {count} cards in {workspace_id}/{status}")
+            if on_done:
+                on_done()
+        except Exception as e:
+            print(f"⚠️ Rebalancing {workspace_id}/{status} failed: {e}")
+        finally:
+            with _rebalancing_lock:
+                _rebalancing.discard(key)
+
+    threading.Thread(target=run, name='kanban-rebalance', daemon=True).start()
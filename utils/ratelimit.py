@@ -0,0 +1,225 @@
+'''Token-bucket rate limits for Socket.IO events, per socket and per user
+
+Every limited event belongs to a class with its own bucket. A client must
+have a token in both its per-socket bucket and its per-user bucket; user
+buckets refill faster because one user may have several tabs open. The user
+is the one the socket authenticated as when it connected (identify()), never
+a user_id taken from an event payload; anonymous sockets only have their
+per-socket buckets.
+
+Events over the limit are either dropped (the sender gets a `rate_limited`
+event with a retry hint) or coalesced: the latest payload is kept and
+replayed once a token is free, so full-document and cursor updates still
+end on the final state while intermediate frames are skipped. Replays are
+dispatched through the registered handler, so they are timed, counted and
+shed like any other event.
+
+    RATE_LIMIT_<CLASS>="rate/burst"   e.g. RATE_LIMIT_CHAT="2/10"
+'''
+import os
+import threading
+import time
+from functools import wraps
+from flask import request
+from flask_socketio import emit
+from utils.metrics import Counter, register_collector
+
+# class: (tokens per second, burst, policy)
+_DEFAULT_LIMITS = {
+    'chat': (2, 10, 'drop'),
+    'edit': (10, 20, 'coalesce'),
+    'cursor': (15, 30, 'coalesce'),
+    'typing': (4, 8, 'drop'),
+    'kanban': (5, 10, 'drop')
+}
+
+EVENT_CLASSES = {
+    'chat_message': 'chat',
+    'document_content_change': 'edit',
+    'document_cursor_position': 'cursor',
+    'typing_start': 'typing',
+    'typing_stop': 'typing',
+    'document_typing': 'typing',
+    'document_stop_typing': 'typing',
+    'kanban_update': 'kanban'
+}
+
+USER_RATE_MULTIPLIER = float(os.getenv('RATE_LIMIT_USER_MULTIPLIER', 2))
+MAX_IDLE_SECONDS = 300
+TOP_THROTTLED = 20
+
+
+def _load_limits():
+    limits = {}
+    for name, (rate, burst, policy) in _DEFAULT_LIMITS.items():
+        override = os.getenv(f'RATE_LIMIT_{name.upper()}')
+        if override:
+            rate, burst = (float(part) for part in override.split('/'))
+        limits[name] = {'rate': float(rate), 'burst': float(burst), 'policy': policy}
+    return limits
+
+
+RATE_LIMITS = _load_limits()
+
+rate_limited_events = Counter('socketio_rate_limited_total', 'Socket.IO events over their rate limit', ('event', 'action'))
+
+_buckets = {}
+_pending = {}
+_granted = set()
+_identities = {}
+_throttled = {}
+_lock = threading.Lock()
+
+
+def _take(key, rate, burst, now):
+    '''Take one token from a bucket; returns 0 if granted, else seconds until a token is free'''
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = [burst, now]
+    else:
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+
+    if bucket[0] >= 1:
+        bucket[0] -= 1
+        return 0.0
+    return (1 - bucket[0]) / rate
+
+
+def identify(sid, user_id):
+    '''Remember who a socket authenticated as at connect time (None for anonymous)'''
+    with _lock:
+        if user_id:
+            _identities[sid] = user_id
+        else:
+            _identities.pop(sid, None)
+
+
+def check(event_class, sid):
+    '''Consume a token for sid (and its user); returns 0 when allowed, else the wait in seconds'''
+    limit = RATE_LIMITS[event_class]
+    now = time.monotonic()
+
+    with _lock:
+        user_id = _identities.get(sid)
+        wait = _take(('sid', sid, event_class), limit['rate'], limit['burst'], now)
+        if wait == 0 and user_id:
+            wait = _take(
+                ('user', user_id, event_class),
+                limit['rate'] * USER_RATE_MULTIPLIER, limit['burst'] * USER_RATE_MULTIPLIER, now
+            )
+            if wait:
+                # Give back the socket token so the two buckets stay in step
+                _buckets[('sid', sid, event_class)][0] += 1
+
+        if wait:
+            client = f'user:{user_id}' if user_id else f'sid:{sid}'
+            _throttled[client] = _throttled.get(client, 0) + 1
+
+        if len(_buckets) > 10000:
+            _prune(now)
+
+    return wait
+
+
+def _prune(now):
+    for key in [key for key, (_, updated) in _buckets.items() if now - updated > MAX_IDLE_SECONDS]:
+        del _buckets[key]
+    if len(_throttled) > 10000:
+        _throttled.clear()
+
+
+def forget_client(sid):
+    '''Drop a disconnected socket's buckets and pending coalesced events'''
+    with _lock:
+        _identities.pop(sid, None)
+        for key in [key for key in _buckets if key[0] == 'sid' and key[1] == sid]:
+            del _buckets[key]
+        for key in [key for key in _pending if key[0] == sid]:
+            del _pending[key]
+        _granted.difference_update({key for key in _granted if key[0] == sid})
+
+
+def _limited_handler(socketio, event, handler):
+    event_class = EVENT_CLASSES[event]
+    policy = RATE_LIMITS[event_class]['policy']
+
+    def replay(sid, namespace, delay):
+        '''Deliver the latest coalesced payload once the bucket has refilled'''
+        while True:
+            socketio.sleep(delay)
+            with _lock:
+                args = _pending.get((sid, event))
+            if args is None:
+                return
+            delay = check(event_class, sid)
+            if delay:
+                continue
+            with _lock:
+                args = _pending.pop((sid, event), args)
+                # The token is already taken; let limited() pass the replay straight through
+                _granted.add((sid, event))
+            # The server's own dispatcher for the event: metrics, shedding, then limited()
+            socketio.server.handlers[namespace][event](sid, *args)
+            return
+
+    @wraps(handler)
+    def limited(*args):
+        sid = request.sid
+        with _lock:
+            granted = (sid, event) in _granted
+            _granted.discard((sid, event))
+        if granted:
+            return handler(*args)
+
+        wait = check(event_class, sid)
+        if not wait:
+            return handler(*args)
+
+        if policy == 'coalesce':
+            with _lock:
+                scheduled = (sid, event) in _pending
+                _pending[(sid, event)] = args
+            if not scheduled:
+                socketio.start_background_task(replay, sid, request.namespace, wait)
+            rate_limited_events.inc(event, 'coalesced')
+        else:
+            rate_limited_events.inc(event, 'dropped')
+            emit('rate_limited', {'event': event, 'retry_after': round(wait, 2)})
+        return None
+
+    return limited
+
+
+@register_collector
+def _collect_throttled():
+    with _lock:
+        top = sorted(_throttled.items(), key=lambda item: item[1], reverse=True)[:TOP_THROTTLED]
+        pending = len(_pending)
+    return [
+        ('socketio_throttled_client_events', 'gauge', f'Rate-limited events for the {TOP_THROTTLED} most throttled clients', [
+            ({'client': client}, count) for client, count in top
+        ]),
+        ('socketio_coalesced_pending', 'gauge', 'Coalesced events waiting for a token', [({}, pending)])
+    ]
+
+
+def init_rate_limits(socketio):
+    '''Wrap socketio.on so limited events pass through their token buckets
+
+    Must run before the @socketio.on handlers are defined.
+    '''
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+
+        def wrap(handler):
+            if message in EVENT_CLASSES:
+                decorator(_limited_handler(socketio, message, handler))
+            else:
+                decorator(handler)
+            return handler
+        return wrap
+
+    socketio.on = on
@@ -0,0 +1,333 @@
+'''Due-date reminders: an index-fed timing wheel run by one elected worker
+
+The leader loads tasks whose reminders fall in the next REMINDER_WINDOW
+through the (due_date, status) index and files them into a timing wheel of
+REMINDER_TICK_SECONDS slots; the window slides forward as time passes, so
+the collection is never rescanned. Each task gets two reminders: "due soon"
+REMINDER_LEAD before its due date, and "overdue" at it.
+
+Routes report changed or deleted tasks with task_changed(). On the leader
+the task ids are queued in memory; on other workers they go through the
+reminder_updates collection, which the leader drains every tick. Either way
+the leader reloads just those tasks and reschedules them.
+
+Reminders in one tick are sent as a batch. A reminder is first claimed in
+task_reminders under an id made of task, kind and due date, so a failover
+or a rescheduled duplicate never notifies twice, while moving the due date
+yields fresh reminders.
+
+Only the worker holding the scheduler_leases document fires; the lease is
+renewed every tick and taken over once it expires.
+
+    REMINDERS_ENABLED      (true)
+    REMINDER_LEAD_MINUTES  (60)
+'''
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from utils.db import DatabaseUnavailable, get_db
+from utils.etag import bump_version
+from utils.metrics import Counter, register_collector
+
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+REMINDER_LEAD = timedelta(minutes=int(os.getenv('REMINDER_LEAD_MINUTES', 60)))
+REMINDER_TICK_SECONDS = 5
+REMINDER_WINDOW = timedelta(minutes=15)
+# On taking the lead, reminders missed this far back are still sent
+REMINDER_CATCHUP = timedelta(hours=24)
+LEASE_SECONDS = 30
+LEASE_ID = 'due_date_reminders'
+
+REMINDER_KINDS = ('due_soon', 'overdue')
+
+reminders_sent = Counter('task_reminders_sent_total', 'Due-date reminder notifications sent', ('kind',))
+
+
+class TimingWheel:
+    '''Hashed timing wheel of fixed-width slots keyed by (task_id, kind)
+
+    Entries may sit in a slot for a later round; advance() only pops those
+    whose fire time has come.
+    '''
+
+    def __init__(self, tick, slot_count, now):
+        self.tick = tick
+        self.slots = [{} for _ in range(slot_count)]
+        self.current = int(now // tick)
+        self._slot_of = {}
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def add(self, key, fire_at, payload):
+        self.remove(key)
+        # Anything already due goes into the slot being processed next
+        slot = max(int(fire_at // self.tick), self.current) % len(self.slots)
+        self.slots[slot][key] = (fire_at, payload)
+        self._slot_of[key] = slot
+
+    def remove(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self.slots[slot].pop(key, None)
+
+    def advance(self, now):
+        '''Pop every entry due by ``now``'''
+        due = []
+        last = int(now // self.tick)
+        for tick in range(self.current, min(last, self.current + len(self.slots) - 1) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key, (fire_at, payload) in list(slot.items()):
+                if fire_at <= now:
+                    del slot[key]
+                    del self._slot_of[key]
+                    due.append(payload)
+        self.current = last
+        return due
+
+
+class ReminderScheduler:
+    def __init__(self, socketio):
+        self.socketio = socketio
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.is_leader = False
+        self.wheel = None
+        self.loaded_until = None
+        self._changed = set()
+        self._changed_lock = threading.Lock()
+
+    # ----- leadership -----
+
+    def _renew_lease(self, db):
+        now = datetime.now()
+        try:
+            db.scheduler_leases.find_one_and_update(
+                {'_id': LEASE_ID, '$or': [{'holder': self.holder}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'holder': self.holder, 'expires_at': now + timedelta(seconds=LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease
+            return False
+
+    def _take_lead(self, now):
+        print(f"✓ Reminder scheduler leading on {self.holder}")
+        self.is_leader = True
+        window_ticks = int(REMINDER_WINDOW.total_seconds() // REMINDER_TICK_SECONDS)
+        self.wheel = TimingWheel(REMINDER_TICK_SECONDS, 2 * window_ticks, now.timestamp())
+        self.loaded_until = now - REMINDER_CATCHUP
+
+    def _lose_lead(self):
+        print(f"⚠️ Reminder scheduler lost the lease on {self.holder}")
+        self.is_leader = False
+        self.wheel = None
+        self.loaded_until = None
+
+    # ----- scheduling -----
+
+    def _schedule(self, task, window_end, window_start=None):
+        '''(Re)file a task's reminders that fire in [window_start, window_end)'''
+        task_id = str(task['_id'])
+        for kind in REMINDER_KINDS:
+            self.wheel.remove((task_id, kind))
+
+        due_date = task.get('due_date')
+        if not isinstance(due_date, datetime) or task.get('status') == 'done' or not task.get('assigned_to'):
+            return
+
+        for kind, fire_at in (('due_soon', due_date - REMINDER_LEAD), ('overdue', due_date)):
+            if kind == 'due_soon' and due_date <= datetime.now():
+                # Already overdue; only the overdue reminder still makes sense
+                continue
+            if fire_at < window_end and (window_start is None or fire_at >= window_start):
+                self.wheel.add((task_id, kind), fire_at.timestamp(), (task_id, kind, due_date))
+
+    def _load_window(self, db, now):
+        '''Slide the loaded window so it reaches REMINDER_WINDOW past now'''
+        if self.loaded_until - now >= REMINDER_WINDOW / 2:
+            return
+
+        start, end = self.loaded_until, now + REMINDER_WINDOW
+        tasks = db.tasks.find(
+            {'due_date': {'$gte': start, '$lt': end + REMINDER_LEAD}, 'status': {'$ne': 'done'}},
+            {'due_date': 1, 'status': 1, 'assigned_to': 1}
+        ).hint([('due_date', 1), ('status', 1)])
+
+        for task in tasks:
+            # Reminders before start were filed by the previous window
+            self._schedule(task, end, start)
+        self.loaded_until = end
+
+    def _apply_changes(self, db):
+        '''Reschedule tasks reported through task_changed()'''
+        with self._changed_lock:
+            task_ids = self._changed
+            self._changed = set()
+
+        queued = list(db.reminder_updates.find({}, {'task_id': 1}))
+        if queued:
+            db.reminder_updates.delete_many({'_id': {'$in': [doc['_id'] for doc in queued]}})
+            task_ids.update(doc['task_id'] for doc in queued)
+
+        if not task_ids:
+            return
+
+        found = {
+            str(task['_id']): task
+            for task in db.tasks.find(
+                {'_id': {'$in': [ObjectId(task_id) for task_id in task_ids if ObjectId.is_valid(task_id)]}},
+                {'due_date': 1, 'status': 1, 'assigned_to': 1}
+            )
+        }
+        for task_id in task_ids:
+            self._schedule(found.get(task_id, {'_id': task_id}), self.loaded_until)
+
+    def task_changed(self, *task_ids):
+        '''Report tasks whose due date, status, assignees or existence changed'''
+        if self.is_leader:
+            with self._changed_lock:
+                self._changed.update(task_ids)
+            return
+
+        try:
+            db = get_db(write='ephemeral')
+            db.reminder_updates.insert_many([
+                {'task_id': task_id, 'created_at': datetime.now()} for task_id in task_ids
+            ])
+        except Exception as e:
+            print(f"⚠️ Could not queue reminder update: {e}")
+
+    # ----- firing -----
+
+    def _fire(self, db, due):
+        '''Send one batch of reminders, skipping stale and already-claimed ones'''
+        tasks = {
+            str(task['_id']): task
+            for task in db.tasks.find(
+                {'_id': {'$in': list({ObjectId(task_id) for task_id, _, _ in due})}},
+                {'title': 1, 'due_date': 1, 'status': 1, 'assigned_to': 1, 'workspace_id': 1}
+            )
+        }
+
+        # A task edited on another worker may not have reached us yet; the database wins
+        fresh = [
+            (tasks[task_id], kind) for task_id, kind, due_date in due
+            if task_id in tasks
+            and tasks[task_id].get('due_date') == due_date
+            and tasks[task_id].get('status') != 'done'
+            and tasks[task_id].get('assigned_to')
+        ]
+        if not fresh:
+            return
+
+        claims = [
+            {'_id': f"{task['_id']}:{kind}:{task['due_date'].isoformat()}", 'task_id': str(task['_id']), 'kind': kind, 'sent_at': datetime.now()}
+            for task, kind in fresh
+        ]
+        claimed = set(range(len(claims)))
+        try:
+            db.task_reminders.insert_many(claims, ordered=False)
+        except BulkWriteError as e:
+            claimed -= {error['index'] for error in e.details.get('writeErrors', [])}
+
+        notifications = []
+        for index in sorted(claimed):
+            task, kind = fresh[index]
+            if kind == 'due_soon':
+                message = f"Task \"{task.get('title')}\" is due {task['due_date']:%b %d, %H:%M}"
+            else:
+                message = f"Task \"{task.get('title')}\" is overdue"
+
+            for user_id in task['assigned_to']:
+                notifications.append({
+                    'user_id': user_id,
+                    'message': message,
+                    'type': 'task_reminder',
+                    'workspace_id': task.get('workspace_id'),
+                    'task_id': str(task['_id']),
+                    'read': False,
+                    'created_at': datetime.now()
+                })
+            reminders_sent.inc(kind)
+
+        if not notifications:
+            return
+
+        db.notifications.insert_many(notifications, ordered=False)
+        for user_id in {notification['user_id'] for notification in notifications}:
+            bump_version('notifications', user_id)
+        for notification in notifications:
+            self.socketio.emit('live_notification', {
+                'message': notification['message'],
+                'type': 'task_reminder',
+                'timestamp': notification['created_at'].isoformat()
+            }, room=f"user_{notification['user_id']}")
+
+        print(f"✓ Sent {len(notifications)} due-date reminders")
+
+    # ----- loop -----
+
+    def tick(self):
+        db = get_db()
+        now = datetime.now()
+
+        if not self._renew_lease(db):
+            if self.is_leader:
+                self._lose_lead()
+            return
+        if not self.is_leader:
+            self._take_lead(now)
+
+        self._load_window(db, now)
+        self._apply_changes(db)
+
+        due = self.wheel.advance(now.timestamp())
+        if due:
+            self._fire(db, due)
+
+    def run(self):
+        while True:
+            try:
+                self.tick()
+            except DatabaseUnavailable:
+                pass
+            except Exception as e:
+                print(f"⚠️ Reminder scheduler tick failed: {e}")
+            time.sleep(REMINDER_TICK_SECONDS)
+
+
+_scheduler = None
+
+
+def task_changed(*task_ids):
+    '''Tell the scheduler that tasks were created, rescheduled, reassigned, completed or deleted'''
+    if _scheduler is not None and task_ids:
+        _scheduler.task_changed(*(str(task_id) for task_id in task_ids))
+
+
+@register_collector
+def _collect_reminders():
+    if _scheduler is None:
+        return []
+    return [
+        ('task_reminders_leader', 'gauge', 'Whether this worker fires due-date reminders', [({}, int(_scheduler.is_leader))]),
+        ('task_reminders_scheduled', 'gauge', 'Reminders waiting in the timing wheel', [
+            ({}, len(_scheduler.wheel) if _scheduler.wheel is not None else 0)
+        ])
+    ]
+
+
+def init_reminders(socketio):
+    '''Start the reminder scheduler on a background thread'''
+    global _scheduler
+    if not REMINDERS_ENABLED or _scheduler is not None:
+        return
+
+    _scheduler = ReminderScheduler(socketio)
+    threading.Thread(target=_scheduler.run, name='due-date-reminders', daemon=True).start()
@@ -0,0 +1,154 @@
+'''Workspace search over documents, tasks, chat messages and files
+
+Each searchable collection has a compound text index whose prefix is
+workspace_id (see SEARCH_SOURCES and INDEX_SPECS in utils/db.py). MongoDB
+keeps that inverted index up to date on every insert/update, so routes and
+socket handlers need no extra write path, and a query only walks the
+postings of one workspace. Per-source hits are scored by textScore times the
+source weight, merged, and paginated; snippets are cut around the first
+matching term.
+'''
+import html
+import re
+from pymongo.errors import ExecutionTimeout
+
+SEARCH_MAX_TIME_MS = 2000
+SNIPPET_RADIUS = 80
+MAX_PAGE_SIZE = 50
+# Each source sorts page * limit hits by score; deeper pages would outgrow the in-memory sort
+MAX_PAGE = 20
+
+# kind: collection, searched fields → text index weights, title field, date field, source weight
+SEARCH_SOURCES = {
+    'document': {
+        'collection': 'documents',
+        'fields': {'title': 10, 'content': 1},
+        'title': 'title',
+        'date': 'updated_at',
+        'weight': 1.2
+    },
+    'task': {
+        'collection': 'tasks',
+        'fields': {'title': 10, 'description': 2},
+        'title': 'title',
+        # Task writes do not maintain updated_at
+        'date': 'created_at',
+        'weight': 1.1
+    },
+    'message': {
+        'collection': 'chat_messages',
+        'fields': {'message': 1},
+        'title': 'username',
+        'date': 'timestamp',
+        'weight': 1.0
+    },
+    'file': {
+        'collection': 'files',
+        'fields': {'name': 1},
+        'title': 'name',
+        'date': 'uploaded_at',
+        'weight': 1.0
+    }
+}
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_index_specs():
+    '''INDEX_SPECS entries: (collection, keys, options) for each source's text index'''
+    return [
+        (
+            source['collection'],
+            [('workspace_id', 1)] + [(field, 'text') for field in source['fields']],
+            {'weights': source['fields'], 'name': 'workspace_search', 'default_language': 'english'}
+        )
+        for source in SEARCH_SOURCES.values()
+    ]
+
+
+def _plain_text(value):
+    return html.unescape(_TAG_RE.sub(' ', value or ''))
+
+
+def make_snippet(text, terms):
+    '''About 2 * SNIPPET_RADIUS characters of text around the first query term'''
+    text = ' '.join(_plain_text(text).split())
+    if not text:
+        return ''
+
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - SNIPPET_RADIUS) if positions else 0
+    end = min(len(text), start + 2 * SNIPPET_RADIUS)
+
+    snippet = text[start:end]
+    if start > 0:
+        snippet = '…' + snippet.split(' ', 1)[-1]
+    if end < len(text):
+        snippet = snippet.rsplit(' ', 1)[0] + '…'
+    return snippet
+
+
+def search_workspace(db, workspace_id, query, kinds=None, page=1, limit=20):
+    '''Ranked hits across SEARCH_SOURCES for one workspace
+
+    Every source returns at most page * limit hits sorted by textScore, which
+    is all that can land on the requested page after merging. Sources that
+    time out are listed in timed_out and the results marked partial.
+    '''
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    page = max(1, min(page, MAX_PAGE))
+    depth = page * limit
+    terms = [term.lower() for term in _WORD_RE.findall(query)]
+
+    hits = []
+    timed_out = []
+    more = False
+    for kind in kinds or SEARCH_SOURCES:
+        source = SEARCH_SOURCES[kind]
+        projection = {field: 1 for field in source['fields']}
+        projection.update({
+            source['title']: 1,
+            source['date']: 1,
+            'score': {'$meta': 'textScore'}
+        })
+
+        try:
+            cursor = db[source['collection']].find(
+                {'workspace_id': workspace_id, '$text': {'$search': query}},
+                projection
+            ).sort([('score', {'$meta': 'textScore'})]).limit(depth + 1).max_time_ms(SEARCH_MAX_TIME_MS)
+            docs = list(cursor)
+        except ExecutionTimeout:
+            print(f"⚠️ Search in {source['collection']} timed out for workspace {workspace_id}")
+            timed_out.append(kind)
+            continue
+
+        if len(docs) > depth:
+            more = True
+            docs = docs[:depth]
+
+        for doc in docs:
+            body = ' '.join(str(doc.get(field) or '') for field in source['fields'] if field != source['title'])
+            hits.append({
+                'type': kind,
+                'id': doc['_id'],
+                'title': doc.get(source['title']) or '',
+                'snippet': make_snippet(body or doc.get(source['title']), terms),
+                'date': doc.get(source['date']),
+                'score': round(doc['score'] * source['weight'], 4)
+            })
+
+    hits.sort(key=lambda hit: hit['score'], reverse=True)
+    offset = (page - 1) * limit
+    return {
+        'query': query,
+        'page': page,
+        'limit': limit,
+        'results': hits[offset:offset + limit],
+        'has_more': more or len(hits) > offset + limit,
+        'partial': bool(timed_out),
+        'timed_out': timed_out
+    }
@@ -0,0 +1,72 @@
+import itertools
+import os
+from flask import current_app, request, stream_with_context
+
+# How many documents Mongo returns per getMore, and how many we encode per chunk
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 200))
+STREAM_BY_DEFAULT = os.getenv('STREAM_JSON_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+
+def wants_stream():
+    '''Whether this request should get a streamed body (?stream=0|1 overrides the default)'''
+    flag = request.args.get('stream')
+    if flag is None:
+        return STREAM_BY_DEFAULT
+    return flag.lower() in ('1', 'true', 'yes')
+
+
+def _json_array_chunks(docs, batch_size, prefix, suffix):
+    encode = current_app.json.dumps_bytes
+
+    yield prefix + b'['
+    separator = b''
+    batch = []
+
+    for doc in docs:
+        batch.append(encode(doc))
+        if len(batch) >= batch_size:
+            yield separator + b','.join(batch)
+            separator = b','
+            batch = []
+
+    if batch:
+        yield separator + b','.join(batch)
+
+    yield b']' + suffix
+
+
+def iter_json_array(cursor, batch_size=None, prefix=b'', suffix=b''):
+    '''Yield a JSON array of cursor documents one batch at a time
+
+    Only ``batch_size`` documents are held in memory at once, so peak memory
+    no longer grows with the size of the result.
+    '''
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    return _json_array_chunks(cursor.batch_size(batch_size), batch_size, prefix, suffix)
+
+
+def stream_json_array(cursor, batch_size=None, prefix=b'', suffix=b'', status=200):
+    '''Streamed response whose body is a JSON array of cursor documents
+
+    ``prefix``/``suffix`` wrap the array, e.g. ``b'{"tasks":'`` and ``b'}'``
+    to stream a field of an object.
+
+    The first batch is fetched before the response is returned, so a failing
+    query raises inside the route's error handling instead of after the 200
+    has gone out.
+    '''
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    cursor = cursor.batch_size(batch_size)
+    first = list(itertools.islice(cursor, batch_size))
+
+    def generate():
+        try:
+            yield from _json_array_chunks(itertools.chain(first, cursor), batch_size, prefix, suffix)
+        finally:
+            cursor.close()
+
+    return current_app.response_class(
+        stream_with_context(generate()),
+        status=status,
+        mimetype='application/json'
+    )
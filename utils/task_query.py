@@ -0,0 +1,171 @@
+'''Indexed task queries across workspaces: filters, plans and keyset pages
+
+Every supported query shape is served by a named compound index laid out
+equality fields first, then the sort key, then _id as a tie-breaker
+(QUERY_PLANS; built through INDEX_SPECS in utils/db.py). plan_task_query
+picks the plan covering the most equality filters and hints it, so MongoDB
+never falls back to a collection scan or an in-memory sort. Shapes no plan
+can serve, such as a due-date range sorted by creation date or a query
+without an assignee or workspace, are rejected rather than run slowly.
+
+Pages are keyset-based: the cursor is the (sort value, _id) of the last
+task returned, so page N costs the same as page 1.
+'''
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# sort name: (field, direction)
+TASK_SORTS = {
+    'created': ('created_at', -1),
+    'due': ('due_date', 1)
+}
+
+# name: (equality fields in index order, sort)
+QUERY_PLANS = {
+    'assignee_created': (('assigned_to',), 'created'),
+    'assignee_due': (('assigned_to',), 'due'),
+    'assignee_status_created': (('assigned_to', 'status'), 'created'),
+    'workspace_created': (('workspace_id',), 'created'),
+    'workspace_due': (('workspace_id',), 'due'),
+    'workspace_status_created': (('workspace_id', 'status'), 'created')
+}
+
+# Prefer the assignee when both anchors are given: a user's tasks are far fewer than a workspace's
+ANCHORS = ('assigned_to', 'workspace_id')
+FILTER_FIELDS = ('assigned_to', 'workspace_id', 'status', 'priority')
+
+
+class UnindexedQuery(ValueError):
+    '''No index in QUERY_PLANS can serve the requested filters and sort'''
+
+
+def _index_name(plan):
+    return f'task_query_{plan}'
+
+
+def task_query_index_specs():
+    '''INDEX_SPECS entries for every plan in QUERY_PLANS'''
+    specs = []
+    for plan, (fields, sort) in QUERY_PLANS.items():
+        sort_field, direction = TASK_SORTS[sort]
+        keys = [(field, 1) for field in fields] + [(sort_field, direction), ('_id', direction)]
+        specs.append(('tasks', keys, {'name': _index_name(plan)}))
+    return specs
+
+
+def plan_task_query(filters, sort=None):
+    '''Pick the plan for a set of equality filters (and due-date range) and a sort
+
+    Returns (plan name, sort name, residual fields); residual equality
+    filters are checked against the index entries' documents, which is cheap
+    because every plan is anchored on an assignee or a workspace.
+    '''
+    equality = {field for field in FILTER_FIELDS if filters.get(field) is not None}
+    has_range = filters.get('due_from') is not None or filters.get('due_to') is not None
+
+    if sort is None:
+        sort = 'due' if has_range else 'created'
+    if sort not in TASK_SORTS:
+        raise UnindexedQuery(f'sort must be one of {", ".join(TASK_SORTS)}')
+    if has_range and sort != 'due':
+        raise UnindexedQuery('Due-date ranges can only be sorted by due date')
+
+    best = None
+    for plan, (fields, plan_sort) in QUERY_PLANS.items():
+        if plan_sort != sort or not set(fields) <= equality:
+            continue
+        score = (len(fields), fields[0] == ANCHORS[0])
+        if best is None or score > best[0]:
+            best = (score, plan)
+
+    if best is None:
+        raise UnindexedQuery('Filter by assignee or workspace')
+
+    plan = best[1]
+    return plan, sort, sorted(equality - set(QUERY_PLANS[plan][0]))
+
+
+def encode_cursor(task, sort):
+    '''Opaque cursor pointing just past ``task`` in ``sort`` order'''
+    field, _ = TASK_SORTS[sort]
+    value = task.get(field)
+    payload = {
+        'v': value.isoformat() if isinstance(value, datetime) else value,
+        'id': str(task['_id'])
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    '''(sort value, _id) from encode_cursor; raises ValueError for anything else'''
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        value = datetime.fromisoformat(payload['v']) if payload['v'] is not None else None
+        return value, ObjectId(payload['id'])
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def build_task_query(filters, sort=None, cursor=None, member_workspaces=None):
+    '''Mongo filter, sort and index hint for a task query
+
+    member_workspaces limits results to the caller's workspaces when no single
+    workspace is requested.
+    '''
+    plan, sort, residual = plan_task_query(filters, sort)
+    field, direction = TASK_SORTS[sort]
+
+    query = {name: filters[name] for name in FILTER_FIELDS if filters.get(name) is not None}
+    if filters.get('workspace_id') is None and member_workspaces is not None:
+        query['workspace_id'] = {'$in': list(member_workspaces)}
+
+    if sort == 'due':
+        # Tasks without a due date have no place in a due-date ordering
+        bounds = {'$ne': None}
+        if filters.get('due_from') is not None:
+            bounds = {'$gte': filters['due_from']}
+        if filters.get('due_to') is not None:
+            bounds = {**bounds, '$lt': filters['due_to']}
+        query['due_date'] = bounds
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        past = '$lt' if direction < 0 else '$gt'
+        query = {'$and': [query, {'$or': [
+            {field: {past: value}},
+            {field: value, '_id': {past: last_id}}
+        ]}]}
+
+    return {
+        'plan': plan,
+        'sort': sort,
+        'residual': residual,
+        'filter': query,
+        'order': [(field, direction), ('_id', direction)],
+        'hint': _index_name(plan)
+    }
+
+
+def find_tasks(db, filters, sort=None, cursor=None, limit=DEFAULT_PAGE_SIZE, member_workspaces=None):
+    '''One keyset page of tasks; next_cursor is None on the last page'''
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    spec = build_task_query(filters, sort, cursor, member_workspaces)
+
+    tasks = list(
+        db.tasks.find(spec['filter'])
+        .sort(spec['order'])
+        .hint(spec['hint'])
+        .limit(limit + 1)
+    )
+
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1], spec['sort'])
+
+    return {'tasks': tasks, 'next_cursor': next_cursor, 'plan': spec['plan']}
@@ -25,6 +25,18 @@ def sanitize_input(text):
     
     return cleaned
 
+def extract_mentions(message):
+    '''Usernames @-mentioned in a chat message, in order, without duplicates'''
+    if not message or '@' not in message:
+        return []
+    
+    mentions = []
+    for word in message.split():
+        if word.startswith('@') and len(word) > 1 and word[1:] not in mentions:
+            mentions.append(word[1:])
+    
+    return mentions
+
 def validate_password(password):
     '''Validate password strength'''
     if len(password) < 6:
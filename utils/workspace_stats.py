@@ -0,0 +1,244 @@
+'''Per-workspace summary counters kept in one workspace_stats document
+
+Task, document and file write paths apply their effect with a single $inc
+(and a $max on last_activity_at), so the summary endpoint reads one
+document by _id instead of scanning tasks, documents and files.
+
+Overdue counts depend on the clock rather than on writes, so open tasks are
+counted per due day (tasks.open_due.<YYYY-MM-DD>); days before today are
+overdue. The map only holds days with open tasks.
+
+A counter update that fails is logged and left for reconciliation: once a
+night one worker claims the run in scheduler_leases and recomputes every
+workspace from the source collections on the bulk pool. Workspaces without
+a stats document are reconciled on first read.
+'''
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from utils.db import DatabaseUnavailable, get_db
+
+RECONCILE_HOUR = int(os.getenv('WORKSPACE_STATS_RECONCILE_HOUR', 3))
+RECONCILE_CHECK_SECONDS = 600
+RECONCILE_LEASE_ID = 'workspace_stats_reconcile'
+# Document edits arrive many times a minute; activity is recorded at most this often per workspace
+ACTIVITY_RESOLUTION_SECONDS = 60
+DAY_FORMAT = '%Y-%m-%d'
+
+_last_touched = {}
+_reconcile_started = False
+
+
+def _key(value):
+    '''A user-supplied value made safe for use in a field path'''
+    return str(value).replace('.', '_').replace('$', '_')
+
+
+def _task_increments(task, sign, increments):
+    if not task:
+        return
+    for path in (
+        'tasks.total',
+        f"tasks.by_status.{_key(task.get('status'))}",
+        f"tasks.by_priority.{_key(task.get('priority'))}"
+    ):
+        increments[path] = increments.get(path, 0) + sign
+
+    due_date = task.get('due_date')
+    if isinstance(due_date, datetime) and task.get('status') != 'done':
+        path = f'tasks.open_due.{due_date.strftime(DAY_FORMAT)}'
+        increments[path] = increments.get(path, 0) + sign
+
+
+def task_increments(changes):
+    '''$inc document for (before, after) task snapshots; None stands for no task'''
+    increments = {}
+    for before, after in changes:
+        _task_increments(before, -1, increments)
+        _task_increments(after, 1, increments)
+    return {path: value for path, value in increments.items() if value}
+
+
+def _apply(db, workspace_id, increments):
+    now = datetime.now()
+    update = {'$max': {'last_activity_at': now}}
+    if increments:
+        update['$inc'] = increments
+    try:
+        db.workspace_stats.update_one({'_id': workspace_id}, update, upsert=True)
+        _last_touched[workspace_id] = time.monotonic()
+    except Exception as e:
+        print(f"⚠️ Could not update stats for workspace {workspace_id}: {e}")
+
+
+def record_task_changes(db, workspace_id, changes):
+    '''Apply task (before, after) snapshots to a workspace's counters'''
+    _apply(db, workspace_id, task_increments(changes))
+
+
+def record_documents(db, workspace_id, count):
+    _apply(db, workspace_id, {'documents': count})
+
+
+def record_files(db, workspace_id, count, size):
+    _apply(db, workspace_id, {'files': count, 'storage_bytes': size})
+
+
+def touch_activity(db, workspace_id):
+    '''Move last_activity_at forward, at most once per ACTIVITY_RESOLUTION_SECONDS'''
+    if not workspace_id:
+        return
+    if time.monotonic() - _last_touched.get(workspace_id, 0) < ACTIVITY_RESOLUTION_SECONDS:
+        return
+    _apply(db, workspace_id, None)
+
+
+def reconcile_workspace(db, workspace_id):
+    '''Recompute a workspace's counters from tasks, documents and files'''
+    facets = list(db.tasks.aggregate([
+        {'$match': {'workspace_id': workspace_id}},
+        {'$facet': {
+            'total': [{'$count': 'n'}],
+            'by_status': [{'$group': {'_id': '$status', 'n': {'$sum': 1}}}],
+            'by_priority': [{'$group': {'_id': '$priority', 'n': {'$sum': 1}}}],
+            'open_due': [
+                {'$match': {'status': {'$ne': 'done'}, 'due_date': {'$type': 'date'}}},
+                {'$group': {'_id': {'$dateToString': {'format': DAY_FORMAT, 'date': '$due_date'}}, 'n': {'$sum': 1}}}
+            ],
+            'latest': [{'$group': {'_id': None, 'at': {'$max': '$created_at'}}}]
+        }}
+    ]))[0]
+
+    files = next(db.files.aggregate([
+        {'$match': {'workspace_id': workspace_id}},
+        {'$group': {'_id': None, 'count': {'$sum': 1}, 'bytes': {'$sum': '$size'}, 'at': {'$max': '$uploaded_at'}}}
+    ]), {'count': 0, 'bytes': 0, 'at': None})
+
+    latest_document = db.documents.find_one({'workspace_id': workspace_id}, {'updated_at': 1}, sort=[('updated_at', -1)])
+
+    stats = {
+        'tasks': {
+            'total': facets['total'][0]['n'] if facets['total'] else 0,
+            'by_status': {_key(group['_id']): group['n'] for group in facets['by_status']},
+            'by_priority': {_key(group['_id']): group['n'] for group in facets['by_priority']},
+            'open_due': {group['_id']: group['n'] for group in facets['open_due']}
+        },
+        'documents': db.documents.count_documents({'workspace_id': workspace_id}),
+        'files': files['count'],
+        'storage_bytes': files['bytes'],
+        'reconciled_at': datetime.now()
+    }
+
+    candidates = [
+        facets['latest'][0]['at'] if facets['latest'] else None,
+        files['at'],
+        latest_document.get('updated_at') if latest_document else None
+    ]
+    update = {'$set': stats}
+    activity = [at for at in candidates if isinstance(at, datetime)]
+    if activity:
+        update['$max'] = {'last_activity_at': max(activity)}
+
+    db.workspace_stats.update_one({'_id': workspace_id}, update, upsert=True)
+    return db.workspace_stats.find_one({'_id': workspace_id})
+
+
+def reconcile_all():
+    '''Recompute every workspace's counters; returns how many were reconciled'''
+    db = get_db(pool='bulk')
+    count = 0
+    for workspace in db.workspaces.find({}, {'_id': 1}):
+        try:
+            reconcile_workspace(db, str(workspace['_id']))
+            count += 1
+        except Exception as e:
+            print(f"⚠️ Reconciling stats for workspace {workspace['_id']} failed: {e}")
+
+    # Stats of workspaces deleted while a counter update was in flight
+    known = {str(workspace['_id']) for workspace in db.workspaces.find({}, {'_id': 1})}
+    orphans = [doc['_id'] for doc in db.workspace_stats.find({}, {'_id': 1}) if doc['_id'] not in known]
+    if orphans:
+        db.workspace_stats.delete_many({'_id': {'$in': orphans}})
+    return count
+
+
+def summarize(stats, now=None):
+    '''API view of a stats document, with overdue and due-today counts for today'''
+    today = (now or datetime.now()).strftime(DAY_FORMAT)
+    tasks = stats.get('tasks') or {}
+    open_due = tasks.get('open_due') or {}
+    return {
+        'workspace_id': stats['_id'],
+        'tasks': {
+            'total': tasks.get('total', 0),
+            'by_status': {status: n for status, n in (tasks.get('by_status') or {}).items() if n},
+            'by_priority': {priority: n for priority, n in (tasks.get('by_priority') or {}).items() if n}
+        },
+        'overdue': sum(n for day, n in open_due.items() if day < today),
+        'due_today': open_due.get(today, 0),
+        'documents': stats.get('documents', 0),
+        'files': stats.get('files', 0),
+        'storage_bytes': stats.get('storage_bytes', 0),
+        'last_activity_at': stats.get('last_activity_at'),
+        'reconciled_at': stats.get('reconciled_at')
+    }
+
+
+def get_workspace_summary(db, workspace_id):
+    stats = db.workspace_stats.find_one({'_id': workspace_id})
+    if stats is None or 'reconciled_at' not in stats:
+        stats = reconcile_workspace(get_db(pool='bulk'), workspace_id)
+    return summarize(stats)
+
+
+def _next_run(now):
+    run = now.replace(hour=RECONCILE_HOUR, minute=0, second=0, microsecond=0)
+    return run if run > now else run + timedelta(days=1)
+
+
+def _claim_run(db, holder):
+    '''True for the one worker that gets tonight's run'''
+    now = datetime.now()
+    try:
+        # The first check ever schedules the first run rather than running now
+        db.scheduler_leases.update_one(
+            {'_id': RECONCILE_LEASE_ID},
+            {'$setOnInsert': {'next_run_at': _next_run(now)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Seeded by another worker at the same moment
+        pass
+
+    claimed = db.scheduler_leases.find_one_and_update(
+        {'_id': RECONCILE_LEASE_ID, 'next_run_at': {'$lte': now}},
+        {'$set': {'holder': holder, 'next_run_at': _next_run(now)}}
+    )
+    return claimed is not None
+
+
+def _reconcile_loop():
+    holder = f'{socket.gethostname()}:{os.getpid()}'
+    while True:
+        try:
+            if _claim_run(get_db(), holder):
+                started = time.perf_counter()
+                count = reconcile_all()
+                print(f"✓ Reconciled stats for {count} workspaces in {time.perf_counter() - started:.1f}s")
+        except DatabaseUnavailable:
+            pass
+        except Exception as e:
+            print(f"⚠️ Workspace stats reconciliation failed: {e}")
+        time.sleep(RECONCILE_CHECK_SECONDS)
+
+
+def init_workspace_stats():
+    '''Start the nightly reconciliation check on a background thread'''
+    global _reconcile_started
+    if _reconcile_started:
+        return
+    _reconcile_started = True
+    threading.Thread(target=_reconcile_loop, name='workspace-stats-reconcile', daemon=True).start()